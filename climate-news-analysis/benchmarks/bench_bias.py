@@ -0,0 +1,110 @@
+# benchmarks/bench_bias.py
+"""
+Benchmark of the bias-score and weekly per-source series computation used by
+aggregate.analyze_bias_and_events: the previous per-source mask/copy/resample loop vs. the
+single grouped pass (aggregate.compute_bias_scores + aggregate.weekly_bias_matrix).
+Also times a refresh of the baselines (src/baseline.py) with one new month of articles, for each
+window: rebuilt from every article vs. added to the state of the earlier months.
+
+Run from the project root:
+    python benchmarks/bench_bias.py --rows 1000000
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import aggregate, baseline, utils
+
+
+def make_articles(n_rows, n_topics=60, seed=42):
+    rng = np.random.default_rng(seed)
+    sources = np.array(list(utils.SOURCE_TO_COUNTRY_MAP))
+    start = pd.Timestamp('2013-01-01')
+    df = pd.DataFrame({
+        'source': rng.choice(sources, n_rows),
+        'topic': rng.integers(-1, n_topics, n_rows),
+        'date_published': start + pd.to_timedelta(rng.integers(0, 3 * 365 * 86400, n_rows), unit='s'),
+        'vader_sentiment': rng.uniform(-1, 1, n_rows),
+    })
+    df['region'] = df['source'].map(utils.SOURCE_TO_COUNTRY_MAP).map(utils.COUNTRY_TO_REGION_MAP)
+    return df
+
+
+def legacy_weekly_bias(df):
+    """The pre-rewrite implementation of steps 1-3 (without changepoint detection)."""
+    df['month'] = df['date_published'].dt.to_period('M')
+    df['baseline_sentiment'] = df.groupby(['region', 'topic', 'month'])['vader_sentiment'].transform('mean')
+    df['bias_score'] = df['vader_sentiment'] - df['baseline_sentiment']
+    df.dropna(subset=['bias_score'], inplace=True)
+
+    series = {}
+    for source in df['source'].unique():
+        source_df = df[df['source'] == source].copy()
+        series[source] = source_df.set_index('date_published')['bias_score'].resample('W').mean().fillna(0)
+    return series
+
+
+def grouped_weekly_bias(df):
+    bias_df = aggregate.compute_bias_scores(df)
+    matrix = aggregate.weekly_bias_matrix(bias_df)
+    series = {}
+    for source in pd.unique(bias_df['source']):
+        column = matrix[source]
+        series[source] = column.loc[column.first_valid_index():column.last_valid_index()].fillna(0)
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_articles(args.rows)
+    print(f"{args.rows:,} articles, {df['source'].nunique()} sources")
+
+    timings = {}
+    results = {}
+    for name, func in [('legacy', legacy_weekly_bias), ('grouped', grouped_weekly_bias)]:
+        best = float('inf')
+        for _ in range(args.repeat):
+            frame = df.copy()
+            start = time.perf_counter()
+            results[name] = func(frame)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+        print(f"{name:>8}: {best:.3f}s")
+
+    for source, legacy_series in results['legacy'].items():
+        pd.testing.assert_series_equal(
+            legacy_series, results['grouped'][source], check_names=False, check_freq=False
+        )
+    print(f"Outputs match. Speedup: {timings['legacy'] / timings['grouped']:.1f}x")
+
+    month = baseline.month_numbers(df['date_published'])
+    new = month == month.max()
+    print(f"\nBaseline refresh with the last month ({int(new.sum()):,} articles):")
+    for window in baseline.WINDOWS:
+        config = {'window': window}
+        state = baseline.BaselineState.from_data(df[~new], config)
+        rebuild, incremental = float('inf'), float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            full = baseline.BaselineState.from_data(df, config)
+            rebuild = min(rebuild, time.perf_counter() - start)
+            updated = copy.deepcopy(state)
+            start = time.perf_counter()
+            updated.add(df[new])
+            incremental = min(incremental, time.perf_counter() - start)
+        pd.testing.assert_frame_equal(updated.baselines(), full.baselines(), check_exact=False)
+        print(f"{window:>8}: rebuild {rebuild:.3f}s, incremental {incremental:.3f}s ({rebuild / incremental:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
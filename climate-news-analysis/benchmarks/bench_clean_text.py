@@ -0,0 +1,68 @@
+# benchmarks/bench_clean_text.py
+"""
+Micro-benchmark: per-row utils.clean_text (via Series.apply) vs. utils.clean_text_series.
+
+Run from the project root:
+    python benchmarks/bench_clean_text.py --rows 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import utils
+
+WORDS = [
+    'climate', 'Carbon', 'emissions', 'COP21', 'warming', 'temperature', 'policy', "government's",
+    'renewable', 'energy', 'crisis', 'flood', 'drought', '2015', 'per-cent', 'U.S.', 'Paris',
+    'São', 'Paulo', 'naïve', 'Zürich', 'über', '—', '“quoted”', '<b>bold</b>', '<a href="x">link</a>',
+]
+SEPARATORS = [' ', ' ', ' ', ' ', '  ', '\n', '\t', '. ', ', ', '!\n\n', '\xa0']
+
+
+def make_corpus(n_rows, n_words, seed=42):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n_rows):
+        length = rng.randint(n_words // 2, n_words * 3 // 2)
+        parts = []
+        for _ in range(length):
+            parts.append(rng.choice(WORDS))
+            parts.append(rng.choice(SEPARATORS))
+        texts.append(''.join(parts))
+    return pd.Series(texts)
+
+
+def time_it(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[50, 500, 2000],
+                        help="Average article lengths in words.")
+    parser.add_argument('--jobs', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'words':>6} {'rows':>8} {'apply rows/s':>14} {'series rows/s':>14} {'speedup':>8}")
+    for n_words in args.lengths:
+        corpus = make_corpus(args.rows, n_words)
+        expected, baseline_time = time_it(lambda s: s.apply(utils.clean_text), corpus)
+        actual, fast_time = time_it(lambda s: utils.clean_text_series(s, n_jobs=args.jobs), corpus)
+
+        if not expected.equals(actual):
+            raise AssertionError(f"clean_text_series output differs from clean_text at {n_words} words")
+
+        print(f"{n_words:>6} {args.rows:>8} {args.rows / baseline_time:>14,.0f} "
+              f"{args.rows / fast_time:>14,.0f} {baseline_time / fast_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/bench_search.py
+"""
+Recall and latency of the semantic index (src/search.py) against brute-force search, on
+synthetic clustered unit vectors with the embedding model's dimension. Reports build time, the
+index size on disk, an nprobe sweep, filtered queries, query batch sizes and incremental adds.
+Recall@k is the share of the exact top-k that the index also returns.
+
+Run from the project root:
+    python benchmarks/bench_search.py --articles 1000000
+"""
+import argparse
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import search, utils
+
+
+def make_vectors(path, n_rows, dim, n_clusters=500, noise=1.0, seed=42):
+    """
+    Article-like embeddings: noisy copies of a few hundred topic directions, written to a
+    memory-mapped .npy file like the embedding cache.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    vectors = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(n_rows, dim))
+    for start in range(0, n_rows, 100_000):
+        stop = min(start + 100_000, n_rows)
+        vectors[start:stop] = centers[rng.integers(0, n_clusters, stop - start)]
+        vectors[start:stop] += noise * rng.normal(size=(stop - start, dim)).astype(np.float32)
+    return vectors
+
+
+def make_metadata(ids, seed=42):
+    rng = np.random.default_rng(seed)
+    sources = np.array(list(utils.SOURCE_TO_COUNTRY_MAP))
+    df = pd.DataFrame({
+        'article_id': ids,
+        'source': rng.choice(sources, len(ids)),
+        'date_published': pd.Timestamp('2013-01-01') + pd.to_timedelta(rng.integers(0, 3 * 365, len(ids)), unit='D'),
+    })
+    df['region'] = df['source'].map(utils.SOURCE_TO_COUNTRY_MAP).map(utils.COUNTRY_TO_REGION_MAP)
+    return df
+
+
+def recall(found, exact):
+    hits = [len(set(f[~np.isnan(s)]) & set(e[~np.isnan(t)])) / max((~np.isnan(t)).sum(), 1)
+            for f, s, e, t in zip(found[0], found[1], exact[0], exact[1])]
+    return float(np.mean(hits))
+
+
+def timed(call):
+    start = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=200_000)
+    parser.add_argument('--dim', type=int, default=384, help="Embedding size (all-MiniLM-L6-v2 has 384).")
+    parser.add_argument('--noise', type=float, default=1.0,
+                        help="Spread of the articles around their topic (higher makes the search harder).")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'float16'],
+                        help="How the index stores the vectors.")
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument('--add-fraction', type=float, default=0.05,
+                        help="Share of the articles inserted incrementally after the index is built.")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='climate-search-')
+    try:
+        rng = np.random.default_rng(args.seed)
+        vectors = make_vectors(os.path.join(tmp, 'embeddings.npy'), args.articles, args.dim, noise=args.noise,
+                               seed=args.seed)
+        ids = np.arange(1, args.articles + 1, dtype=np.uint64)
+        metadata = make_metadata(ids, seed=args.seed)
+        # Queries near, but not equal to, indexed articles
+        queries = vectors[np.sort(rng.integers(0, args.articles, args.queries))]
+        queries = queries + 0.3 * rng.normal(size=queries.shape).astype(np.float32)
+
+        n_initial = args.articles - int(args.articles * args.add_fraction)
+        index, seconds = timed(lambda: search.SemanticIndex.build(ids[:n_initial], vectors[:n_initial], metadata,
+                                                                  dtype=args.dtype, seed=args.seed))
+        print(f"build: {n_initial:,} articles x {args.dim} in {seconds:.2f}s ({index.meta['n_lists']} lists)")
+        added, seconds = timed(lambda: index.add(ids[n_initial:], vectors[n_initial:], metadata))
+        print(f"add:   {added:,} articles in {seconds:.2f}s "
+              f"({len(index) - index.meta['n_sorted']:,} in the unsorted tail)")
+
+        index_path = os.path.join(tmp, 'index')
+        index.save(index_path)
+        size_mb = sum(os.path.getsize(os.path.join(index_path, f)) for f in os.listdir(index_path)) / 1e6
+        del index
+        index, seconds = timed(lambda: search.SemanticIndex.load(index_path))
+        print(f"index: {size_mb:.0f} MB on disk, opened in {seconds * 1000:.1f}ms (vectors memory-mapped)")
+
+        exact, seconds = timed(lambda: index.brute_force(queries, k=args.k))
+        brute_ms = seconds / args.queries * 1000
+        print(f"\n{'case':<34} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speed-up':>9}")
+        print(f"{'brute force':<34} {1.0:>10.3f} {brute_ms:>10.2f} {1.0:>8.1f}x")
+        for nprobe in args.nprobe:
+            found, seconds = timed(lambda: index.search(queries, k=args.k, nprobe=nprobe))
+            ms = seconds / args.queries * 1000
+            print(f"{'nprobe=' + str(nprobe):<34} {recall(found, exact):>10.3f} {ms:>10.2f} {brute_ms / ms:>8.1f}x")
+
+        source = metadata['source'].iloc[0]
+        region = metadata['region'].iloc[0]
+        for name, filters in [
+            ('source', {'source': source}),
+            ('region', {'region': region}),
+            ('year', {'start': '2014-01-01', 'end': '2014-12-31'}),
+            ('source + month', {'source': source, 'start': '2014-06-01', 'end': '2014-06-30'}),
+        ]:
+            exact, seconds = timed(lambda: index.brute_force(queries, k=args.k, **filters))
+            filtered_brute_ms = seconds / args.queries * 1000
+            found, seconds = timed(lambda: index.search(queries, k=args.k, **filters))
+            ms = seconds / args.queries * 1000
+            print(f"{'filter ' + name + ' (nprobe=' + str(search.DEFAULT_NPROBE) + ')':<34} "
+                  f"{recall(found, exact):>10.3f} {ms:>10.2f} {filtered_brute_ms / ms:>8.1f}x")
+
+        print(f"\n{'batch size':<34} {'ms/query':>10}")
+        for batch in sorted({min(batch, args.queries) for batch in [1, 10, 100, args.queries]}):
+            _, seconds = timed(lambda: [index.search(queries[i:i + batch], k=args.k)
+                                        for i in range(0, args.queries, batch)])
+            print(f"{batch:<34} {seconds / args.queries * 1000:>10.2f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_storage.py
+"""
+Size on disk and read time of the final data in the previous layout (one Parquet file written
+with pandas' defaults, always read whole) against utils.save_data's layout (partitioned by
+source and year, per-column encodings and compression, row-group statistics) read with
+utils.load_data's column projections and filters. The articles are synthetic, with cleaned
+text of the given length built from the synthetic corpus vocabulary.
+
+Run from the project root:
+    python benchmarks/bench_storage.py --articles 500000
+"""
+import argparse
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import cube, schema, utils
+from synthetic_corpus import THEMES, COMMON, POSITIVE, NEGATIVE
+
+
+def make_final_data(n_articles, words=300, seed=42):
+    """A frame with the columns and dtypes of the pipeline's final data."""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(' '.join(THEMES.values()).lower().split() + COMMON + POSITIVE + NEGATIVE)
+    sources = np.array(list(utils.SOURCE_TO_COUNTRY_MAP))
+    words_per_body = rng.integers(words // 2, words * 3 // 2 + 1, n_articles)
+    bodies = [' '.join(rng.choice(vocabulary, n)) for n in words_per_body]
+    headlines = [' '.join(rng.choice(vocabulary, n)) for n in rng.integers(5, 11, n_articles)]
+
+    df = pd.DataFrame({
+        'date_published': pd.Timestamp('2013-01-01') + pd.to_timedelta(rng.integers(0, 7 * 365 * 86400, n_articles), unit='s'),
+        'source': rng.choice(sources, n_articles),
+        'source_offset': rng.integers(0, 10 ** 9, n_articles),
+        'article_id': rng.integers(0, 2 ** 63, n_articles, dtype=np.uint64),
+        'cleaned_body': pd.array(bodies, dtype=schema.TEXT_DTYPE),
+        'cleaned_headline': pd.array(headlines, dtype=schema.TEXT_DTYPE),
+    })
+    df['country'] = df['source'].map(utils.SOURCE_TO_COUNTRY_MAP)
+    df['region'] = df['country'].map(utils.COUNTRY_TO_REGION_MAP)
+    vader = rng.dirichlet([2, 6, 2], n_articles)
+    df['vader_neg'], df['vader_neu'], df['vader_pos'] = vader[:, 0], vader[:, 1], vader[:, 2]
+    df['vader_sentiment'] = np.clip(rng.normal(0, 0.6, n_articles), -1, 1)
+    df['topic'] = rng.integers(-1, 60, n_articles)
+    return schema.apply_schema(df)
+
+
+def size_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1e6
+    return sum(os.path.getsize(os.path.join(folder, name))
+               for folder, _, names in os.walk(path) for name in names) / 1e6
+
+
+def timed(call, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=200_000)
+    parser.add_argument('--words', type=int, default=300, help="Average words per cleaned body.")
+    parser.add_argument('--repeat', type=int, default=3, help="Reads per case; the fastest is reported.")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    df = make_final_data(args.articles, args.words, seed=args.seed)
+    source = df['source'].value_counts().index[0]
+    tmp = tempfile.mkdtemp(prefix='climate-storage-')
+    try:
+        legacy_path = os.path.join(tmp, 'legacy.parquet')
+        path = os.path.join(tmp, 'final_data.parquet')
+        _, legacy_write = timed(lambda: df.to_parquet(legacy_path, index=False), 1)
+        _, write = timed(lambda: utils.save_data(df, path, partition_cols=utils.PARTITION_COLUMNS), 1)
+        del df
+
+        print(f"{args.articles:,} articles, ~{args.words} words each\n")
+        print(f"{'layout':<34} {'MB':>9} {'write s':>9}")
+        print(f"{'single file, pandas defaults':<34} {size_mb(legacy_path):>9.1f} {legacy_write:>9.2f}")
+        print(f"{'partitioned, tuned encodings':<34} {size_mb(path):>9.1f} {write:>9.2f}")
+
+        aggregation = cube.ARTICLE_COLUMNS
+        cases = [
+            ('every column', None, None),
+            ('aggregation columns', aggregation, None),
+            ('sentiment + date', ['vader_sentiment', 'date_published'], None),
+            ('aggregation, 2016 onwards', aggregation, [('year', '>=', 2016)]),
+            ('aggregation, one source', aggregation, [('source', '=', source)]),
+            # Partitions are only skipped on partition columns, so the year narrows a date range
+            ('aggregation, one month', aggregation,
+             [('year', '=', 2015), ('date_published', '>=', pd.Timestamp('2015-06-01')),
+              ('date_published', '<', pd.Timestamp('2015-07-01'))]),
+        ]
+        # Before, every load read the whole file and anything narrower was selected in memory
+        legacy, legacy_seconds = timed(lambda: pd.read_parquet(legacy_path), args.repeat)
+        del legacy
+        print(f"\n{'read':<34} {'rows':>9} {'ms':>9} {'speed-up':>9}")
+        print(f"{'single file, whole (before)':<34} {args.articles:>9,} {legacy_seconds * 1000:>9.0f} {1.0:>8.1f}x")
+        for name, columns, filters in cases:
+            result, seconds = timed(lambda: utils.load_data(path, columns=columns, filters=filters), args.repeat)
+            print(f"{name:<34} {len(result):>9,} {seconds * 1000:>9.0f} {legacy_seconds / seconds:>8.1f}x")
+            del result
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# benchmarks/import_time.py
+"""
+Import time of the package's entry points, each measured in a fresh interpreter started with
+`python -X importtime`, so nothing is already cached in sys.modules. Also records the peak RSS
+after the import and fails (exit code 1) when an entry point imports one of the HEAVY libraries,
+which should only be loaded by the stage that uses them.
+
+Results go to benchmarks/results/imports/<commit>.json; --compare works as in run_suite.py.
+Run from the project root:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --compare <baseline commit or results file>
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from run_suite import PROJECT_DIR, RESULTS_DIR, git_revision, load_results, compare
+
+IMPORT_RESULTS_DIR = os.path.join(RESULTS_DIR, 'imports')
+
+ENTRY_POINTS = [
+    'src', 'src.reports', 'src.aggregate', 'src.cube', 'src.query', 'src.visualize', 'src.sentiment',
+    'src.topics', 'src.chunked', 'src.search', 'main',
+]
+HEAVY = [
+    'torch', 'transformers', 'bertopic', 'sentence_transformers', 'umap', 'hdbscan', 'sklearn',
+    'matplotlib', 'seaborn', 'ruptures', 'scipy',
+]
+
+# Runs in the child interpreter: imports one module and reports what that cost
+CHILD = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+rss_mb = None
+try:
+    # VmHWM starts afresh at exec; ru_maxrss on Linux would include the parent's RSS at fork
+    with open('/proc/self/status') as f:
+        rss_mb = next(int(line.split()[1]) / 1e3 for line in f if line.startswith('VmHWM:'))
+except OSError:
+    try:
+        import resource
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1e6 if sys.platform == 'darwin' else 1e3)
+    except ImportError:
+        pass
+heavy = sorted(m for m in sys.argv[2:] if m in sys.modules)
+print(json.dumps({'seconds': seconds, 'rss_mb': rss_mb, 'heavy': heavy}))
+"""
+
+
+def parse_importtime(stderr):
+    """(module, self seconds, cumulative seconds) per line of `python -X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def measure(module):
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD, module] + HEAVY,
+        cwd=PROJECT_DIR, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1]), parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', default=None, help="Entry points to measure (default: all).")
+    parser.add_argument('--top', type=int, default=5, help="Slowest imports (self time) listed per entry point.")
+    parser.add_argument('--output', default=None,
+                        help="Results file (default: benchmarks/results/imports/<commit>.json).")
+    parser.add_argument('--compare', default=None, help="Commit or results file to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative change reported as a regression/improvement in --compare.")
+    args = parser.parse_args()
+
+    results = {}
+    offenders = {}
+    for module in args.only or ENTRY_POINTS:
+        timings, rss = [], []
+        for _ in range(args.repeat):
+            child, imports = measure(module)
+            timings.append(child['seconds'])
+            rss.append(child['rss_mb'])
+        results[module] = {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.fmean(timings),
+            'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            'repeat': len(timings),
+            'rss_mb': max(rss) if None not in rss else None,
+            'heavy': child['heavy'],
+        }
+        if child['heavy']:
+            offenders[module] = child['heavy']
+        slowest = sorted(imports, key=lambda row: row[1], reverse=True)[:args.top]
+        print(f"{module:<16} {min(timings):>7.3f}s  (median {statistics.median(timings):.3f}s, "
+              f"peak RSS {results[module]['rss_mb'] or 0:.0f} MB)")
+        print('    slowest: ' + ', '.join(f"{name} {self_s * 1000:.0f}ms" for name, self_s, _ in slowest))
+
+    commit, dirty = git_revision()
+    run = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': {'repeat': args.repeat},
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'results': results,
+    }
+    output = args.output or os.path.join(IMPORT_RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    failed = False
+    for module, heavy in offenders.items():
+        print(f"Importing {module} loads {', '.join(heavy)}; import them inside the function that uses them.")
+        failed = True
+    if args.compare:
+        base, path = load_results(args.compare, results_dir=IMPORT_RESULTS_DIR)
+        print(f"Comparing with {path} (commit {base['commit']}{', dirty' if base['dirty'] else ''})")
+        failed = compare(base, run, args.threshold) > 0 or failed
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/load_test_query.py
+"""
+Load test of the query service (src/query.py) on a synthetic final_data.parquet: index build
+time, then latency percentiles of random dashboard queries, cold and from the LRU cache.
+With --http the same queries go through the local HTTP endpoint from concurrent clients.
+
+Run from the project root:
+    python benchmarks/load_test_query.py --rows 2000000 --queries 2000 --http --clients 8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import query, utils
+from bench_bias import make_articles
+
+
+def random_queries(df, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    sources = df['source'].unique()
+    regions = df['region'].dropna().unique()
+    topics = df['topic'].unique()
+    years = df['date_published'].dt.year.unique()
+    queries = []
+    for _ in range(n_queries):
+        kind = rng.choice(['sentiment', 'bias', 'top_topics'])
+        params = {}
+        if rng.random() < 0.7:
+            params['source'] = str(rng.choice(sources))
+        elif rng.random() < 0.5:
+            params['region'] = str(rng.choice(regions))
+        if kind != 'top_topics' and rng.random() < 0.5:
+            params['topic'] = int(rng.choice(topics))
+        if rng.random() < 0.7:
+            params['period'] = f"{rng.choice(years)}Q{rng.integers(1, 5)}"
+        elif kind != 'top_topics' and rng.random() < 0.5:
+            params['freq'] = 'W'
+        queries.append((kind, params))
+    return queries
+
+
+def run_api(engine, queries):
+    latencies = []
+    for kind, params in queries:
+        start = time.perf_counter()
+        getattr(engine, kind)(**params)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_http(url, queries, clients):
+    def fetch(item):
+        kind, params = item
+        start = time.perf_counter()
+        with urllib.request.urlopen(f"{url}/{kind}?{urlencode(params)}") as response:
+            json.load(response)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        return list(executor.map(fetch, queries))
+
+
+def report(name, latencies, wall=None):
+    ms = np.asarray(latencies) * 1000
+    line = (f"{name:>12}: p50 {np.percentile(ms, 50):7.2f} ms  p95 {np.percentile(ms, 95):7.2f} ms  "
+            f"p99 {np.percentile(ms, 99):7.2f} ms")
+    if wall:
+        line += f"  {len(latencies) / wall:,.0f} queries/s"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--http', action='store_true', help="Also load-test the HTTP endpoint.")
+    parser.add_argument('--clients', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, 'final_data.parquet')
+        df = make_articles(args.rows)
+        utils.save_data(df, data_path, partition_cols=utils.PARTITION_COLUMNS)
+
+        start = time.perf_counter()
+        engine = query.QueryEngine(data_path, cache_size=args.queries * 2)
+        print(f"Loaded and indexed {args.rows:,} rows in {time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        engine.bias()
+        print(f"Bias scores computed in {time.perf_counter() - start:.2f}s (once, on first bias query)")
+
+        queries = random_queries(df, args.queries)
+        report('api cold', run_api(engine, queries))
+        report('api cached', run_api(engine, queries))
+
+        if args.http:
+            engine._cached.cache_clear()
+            server = query.make_server(engine, port=0)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            for name in ['http cold', 'http cached']:
+                start = time.perf_counter()
+                latencies = run_http(url, queries, args.clients)
+                report(name, latencies, time.perf_counter() - start)
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/profile_chunked.py
+"""
+Peak RSS of the in-memory pipeline (ingest -> clean -> dedup -> VADER -> cube) vs. --chunked
+mode (src/chunked.py) on synthetic corpora of growing size. In chunked mode peak RSS should stay
+roughly flat as the corpus grows, set by --batch-size rather than by the number of articles.
+Topics are left at -1 in both modes, since no topic model is fitted here.
+
+Run from the project root:
+    python benchmarks/profile_chunked.py --articles 20000 40000 80000 --batch-size 10000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Same allocator as main.py (see the note there)
+os.environ.setdefault('ARROW_DEFAULT_MEMORY_POOL', 'jemalloc')
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import ingest, preprocess, sentiment, utils, cube, chunked
+from profile_memory import make_corpus
+
+
+def run_mode(mode, data_folder, output_folder, batch_size):
+    start = time.perf_counter()
+    if mode == 'in-memory':
+        df = utils.add_article_ids(ingest.load_all_articles(data_folder))
+        df = preprocess.clean_articles(df)
+        df = preprocess.drop_duplicate_articles(df)
+        df = sentiment.apply_vader(df)
+        df['topic'] = np.full(len(df), -1, dtype=np.int16)
+        rows = len(df)
+        sentiment_cube = cube.build_cube(df)
+    else:
+        dataset_path = os.path.join(output_folder, 'articles')
+        totals = chunked.run_chunked(
+            data_folder, dataset_path, os.path.join(output_folder, 'seen_hashes.sqlite'), batch_size=batch_size
+        )
+        rows = totals['written']
+        sentiment_cube = chunked.build_dataset_cube(dataset_path)
+    return {
+        'mode': mode,
+        'rows': rows,
+        'cells': len(sentiment_cube),
+        'seconds': time.perf_counter() - start,
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, nargs='+', default=[20_000, 40_000, 80_000])
+    parser.add_argument('--words', type=int, default=100, help="Mean words per article (VADER time grows with it).")
+    parser.add_argument('--batch-size', type=int, default=10_000)
+    parser.add_argument('--mode', choices=['in-memory', 'chunked'], help=argparse.SUPPRESS)
+    parser.add_argument('--data', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.data, args.output, args.batch_size)))
+        return
+
+    results = []
+    for n_articles in args.articles:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_folder = os.path.join(tmp, 'data')
+            os.makedirs(data_folder)
+            make_corpus(data_folder, n_articles, n_words=args.words)
+            for mode in ['in-memory', 'chunked']:
+                output_folder = os.path.join(tmp, mode)
+                os.makedirs(output_folder)
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--mode', mode, '--data', data_folder,
+                     '--output', output_folder, '--batch-size', str(args.batch_size)],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                results.append(dict(json.loads(output.strip().splitlines()[-1]), articles=n_articles))
+
+    print(f"\n{'articles':>9} {'mode':<10} {'rows':>9} {'cube cells':>11} {'time (s)':>9} {'peak RSS (MB)':>14}")
+    for r in results:
+        print(f"{r['articles']:>9,} {r['mode']:<10} {r['rows']:>9,} {r['cells']:>11,} "
+              f"{r['seconds']:>9.1f} {r['peak_rss_mb']:>14,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/profile_memory.py
+"""
+Peak-RSS profile of the article frame flowing through ingest -> preprocess -> sentiment ->
+topics, with the previous dtype plan (object strings, float64/int64, raw text kept, copy after
+filtering) vs. the compact schema in src/schema.py. Each plan runs in its own process on the
+same synthetic corpus. VADER and BERTopic are replaced by random scores and topic ids of the
+dtypes the real stages produce, since only the frame's memory is being measured.
+
+Run from the project root:
+    python benchmarks/profile_memory.py --articles 300000
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import ingest, preprocess, schema, utils
+
+WORDS = ['climate', 'carbon', 'emissions', 'warming', 'temperature', 'policy', 'government',
+         'renewable', 'energy', 'crisis', 'flood', 'drought', 'summit', 'paris', 'agreement',
+         'coal', 'solar', 'wind', 'ocean', 'ice', 'record', 'heat', 'scientists', 'report']
+
+
+def make_corpus(folder, n_articles, n_words=300, seed=42):
+    rng = random.Random(seed)
+    sources = list(utils.SOURCE_TO_COUNTRY_MAP)
+    per_source = n_articles // len(sources)
+    for source in sources:
+        with open(os.path.join(folder, f'{source}.jsonl'), 'w', encoding='utf-8') as f:
+            for i in range(per_source):
+                body = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(n_words // 2, n_words * 3 // 2)))
+                article = {
+                    'headline': ' '.join(rng.choice(WORDS) for _ in range(8)).title(),
+                    'body': f'<p>{body}</p>',
+                    'date_published': f'20{rng.randint(13, 19)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00',
+                    'url': f'https://{source}.example/{i}',
+                }
+                f.write(json.dumps(article) + '\n')
+
+
+def legacy_clean(df):
+    """The preprocessing step as it was before the schema layer."""
+    df.dropna(subset=['headline', 'body', 'date_published', 'source'], inplace=True)
+    df['cleaned_body'] = utils.clean_text_series(df['body'])
+    df['cleaned_headline'] = utils.clean_text_series(df['headline'])
+    df['date_published'] = pd.to_datetime(df['date_published'], errors='coerce')
+    df.dropna(subset=['date_published'], inplace=True)
+    df['country'] = df['source'].map(utils.SOURCE_TO_COUNTRY_MAP).fillna('Unknown')
+    df['region'] = df['country'].map(utils.COUNTRY_TO_REGION_MAP).fillna('Unknown')
+    return df[df['cleaned_body'].str.len() > 100].copy()
+
+
+def run_plan(plan, data_folder):
+    start = time.perf_counter()
+    rng = np.random.default_rng(0)
+    if plan == 'legacy':
+        table = pa.Table.from_batches(list(ingest.iter_article_batches(data_folder)))
+        df = table.to_pandas()
+        del table
+        df = legacy_clean(df)
+        df = preprocess.drop_duplicate_articles(df)
+        for column in ['vader_neg', 'vader_neu', 'vader_pos', 'vader_sentiment']:
+            df[column] = rng.uniform(-1, 1, len(df))
+        df['topic'] = rng.integers(-1, 200, len(df))
+    else:
+        df = ingest.load_all_articles(data_folder)
+        df = preprocess.clean_articles(df)
+        df = schema.drop_raw_text(df)
+        df = preprocess.drop_duplicate_articles(df)
+        for column in ['vader_neg', 'vader_neu', 'vader_pos', 'vader_sentiment']:
+            df[column] = rng.uniform(-1, 1, len(df)).astype(np.float32)
+        df['topic'] = rng.integers(-1, 200, len(df)).astype(np.int16)
+
+    frame_mb = df.memory_usage(deep=True).sum() / 1e6
+    return {
+        'plan': plan,
+        'rows': len(df),
+        'seconds': time.perf_counter() - start,
+        'frame_mb': frame_mb,
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3,
+        'columns': {c: str(t) for c, t in df.dtypes.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=300_000)
+    parser.add_argument('--plan', choices=['legacy', 'compact'], help=argparse.SUPPRESS)
+    parser.add_argument('--data', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.plan:
+        print(json.dumps(run_plan(args.plan, args.data)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_corpus(tmp, args.articles)
+        size_mb = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / 1e6
+        print(f"Synthetic corpus: {args.articles:,} articles, {size_mb:,.0f} MB of JSONL")
+
+        results = {}
+        for plan in ['legacy', 'compact']:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--plan', plan, '--data', tmp],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[plan] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"\n{'plan':<8} {'rows':>9} {'time (s)':>9} {'frame (MB)':>11} {'peak RSS (MB)':>14}")
+    for plan, r in results.items():
+        print(f"{plan:<8} {r['rows']:>9,} {r['seconds']:>9.1f} {r['frame_mb']:>11,.0f} {r['peak_rss_mb']:>14,.0f}")
+    print("\nCompact column dtypes:")
+    for column, dtype in results['compact']['columns'].items():
+        print(f"  {column:<18} {dtype}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+# benchmarks/run_suite.py
+"""
+Benchmark suite over the pipeline stages on a synthetic corpus (see synthetic_corpus.py):
+ingestion, preprocessing, VADER, the sentiment cube, every aggregate.py function and the plots.
+BERTopic is benchmarked with a hashing stand-in for the sentence-transformer (skipped if BERTopic
+is not installed), and zero-shot sentiment with --zero-shot-model, e.g. a small local NLI model.
+
+Each case runs --repeat times. Results go to benchmarks/results/<commit>.json, so runs on
+different commits (same arguments, same machine) can be compared with --compare.
+
+Run from the project root:
+    python benchmarks/run_suite.py --articles 10000
+    python benchmarks/run_suite.py --articles 10000 --compare <baseline commit or results file>
+"""
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARKS_DIR)
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+
+sys.path.insert(0, PROJECT_DIR)
+from src import ingest, preprocess, sentiment, aggregate, visualize, cube, utils
+from synthetic_corpus import generate_corpus, THEMES
+
+
+class HashingEmbedder:
+    """
+    Stand-in for the sentence-transformer: an L2-normalised hashed bag of words. Needs no
+    download or GPU, and still separates the synthetic corpus's themes.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in text.split():
+                embeddings[i, zlib.crc32(token.encode('utf-8')) % self.dim] += 1
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+
+def time_case(make_call, repeat):
+    """Runs make_call() (untimed setup returning the call to time) and its call `repeat` times."""
+    timings, result = [], None
+    for _ in range(repeat):
+        call = make_call()
+        start = time.perf_counter()
+        result = call()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def run_cases(args, tmp, only):
+    results = {}
+
+    def bench(name, make_call, rows=None, repeat=None):
+        if only and not any(pattern in name for pattern in only):
+            return None
+        timings, result = time_case(make_call, repeat or args.repeat)
+        results[name] = {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.fmean(timings),
+            'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            'repeat': len(timings),
+            'rows': rows,
+        }
+        print(f"{name:<42} {min(timings):>9.3f}s  (median {statistics.median(timings):.3f}s, rows {rows})")
+        return result
+
+    data = os.path.join(tmp, 'data')
+    generate_corpus(data, args.articles, words=args.words, seed=args.seed)
+
+    # Every case below also builds the input of the next one, so filtered runs still work
+    raw = bench('ingest.load_all_articles', lambda: partial(ingest.load_all_articles, data), rows=args.articles)
+    if raw is None:
+        raw = ingest.load_all_articles(data)
+    raw = utils.add_article_ids(raw)
+
+    processed = bench('preprocess.preprocess_data', lambda: partial(preprocess.preprocess_data, raw.copy()),
+                      rows=len(raw))
+    if processed is None:
+        processed = preprocess.preprocess_data(raw.copy())
+    del raw
+
+    scored = bench('sentiment.apply_vader', lambda: partial(sentiment.apply_vader, processed.copy()),
+                   rows=len(processed))
+    if scored is None:
+        scored = sentiment.apply_vader(processed.copy())
+
+    topic_info = None
+    # src.topics imports BERTopic only when a model is fitted, so check that it is installed first
+    if importlib.util.find_spec('bertopic') is None:
+        print(f"{'topics.model_topics':<42} skipped (BERTopic is not installed)")
+    else:
+        from src import topics
+        embeddings = HashingEmbedder().encode(scored['cleaned_body'].tolist())
+        fitted = bench('topics.model_topics (stand-in embeddings)',
+                       lambda: partial(topics.model_topics, scored.copy(), embeddings=embeddings, embedding_model=None),
+                       rows=len(scored), repeat=1)
+        if fitted is not None:
+            topic_info = fitted[1].get_topic_info()
+            scored = fitted[0]
+    if 'topic' not in scored.columns:
+        # Stand-in topic ids with the real dtype when no topic model was fitted
+        scored['topic'] = np.random.default_rng(args.seed).integers(-1, len(THEMES), len(scored)).astype(np.int16)
+    if topic_info is None:
+        topic_ids = sorted(scored['topic'].unique())
+        topic_info = pd.DataFrame({'Topic': topic_ids, 'Name': [f"{t}_stand_in" for t in topic_ids]})
+
+    if args.zero_shot_model:
+        sample = scored.sample(n=min(args.zero_shot_articles, len(scored)), random_state=args.seed)
+        bench('sentiment.apply_zero_shot', lambda: partial(
+            sentiment.apply_zero_shot, sample.copy(), model_name=args.zero_shot_model, device=-1
+        ), rows=len(sample), repeat=1)
+
+    sentiment_cube = bench('cube.build_cube', lambda: partial(cube.build_cube, scored), rows=len(scored))
+    if sentiment_cube is None:
+        sentiment_cube = cube.build_cube(scored)
+
+    agg_time = bench('aggregate.aggregate_by_time', lambda: partial(aggregate.aggregate_by_time, sentiment_cube),
+                     rows=len(sentiment_cube))
+    by_region = bench('aggregate.aggregate_by_region', lambda: partial(aggregate.aggregate_by_region, sentiment_cube),
+                      rows=len(sentiment_cube))
+    by_source = bench('aggregate.aggregate_by_source', lambda: partial(aggregate.aggregate_by_source, sentiment_cube),
+                      rows=len(sentiment_cube))
+    report_path = os.path.join(tmp, 'top_topics.txt')
+    bench('aggregate.generate_top_topics_report',
+          lambda: partial(aggregate.generate_top_topics_report, sentiment_cube, topic_info, report_path))
+    bias_df = bench('aggregate.compute_bias_scores', lambda: partial(aggregate.compute_bias_scores, scored),
+                    rows=len(scored))
+    if bias_df is None:
+        bias_df = aggregate.compute_bias_scores(scored)
+    bench('aggregate.weekly_bias_matrix', lambda: partial(aggregate.weekly_bias_matrix, bias_df), rows=len(bias_df))
+    bench('aggregate.analyze_bias_and_events', lambda: partial(aggregate.analyze_bias_and_events, scored),
+          rows=len(scored))
+
+    # Plots go to a fresh folder each time, so nothing is skipped as unchanged
+    def fresh_folder():
+        return tempfile.mkdtemp(dir=tmp)
+
+    agg_time = agg_time if agg_time is not None else aggregate.aggregate_by_time(sentiment_cube)
+    by_region = by_region if by_region is not None else aggregate.aggregate_by_region(sentiment_cube)
+    by_source = by_source if by_source is not None else aggregate.aggregate_by_source(sentiment_cube)
+    bench('visualize.plot_sentiment_over_time',
+          lambda: partial(visualize.plot_sentiment_over_time, agg_time, fresh_folder()))
+    bench('visualize.plot_sentiment_by_region',
+          lambda: partial(visualize.plot_sentiment_by_region, by_region[0], fresh_folder()))
+    bench('visualize.plot_topics_by_region',
+          lambda: partial(visualize.plot_topics_by_region, by_region[1], fresh_folder()))
+    bench('visualize.plot_sentiment_by_source',
+          lambda: partial(visualize.plot_sentiment_by_source, by_source, fresh_folder()))
+    bench('visualize.plot_timelines',
+          lambda: partial(visualize.plot_timelines, sentiment_cube, fresh_folder(), n_jobs=args.workers))
+    return results
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short=12', 'HEAD'], cwd=PROJECT_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD', '--', '.'], cwd=PROJECT_DIR).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def load_results(ref, results_dir=RESULTS_DIR):
+    """Results from a file path, or the latest results file whose name starts with `ref` (a commit)."""
+    if os.path.isfile(ref):
+        path = ref
+    else:
+        matches = sorted(glob.glob(os.path.join(results_dir, f'{ref}*.json')), key=os.path.getmtime)
+        if not matches:
+            raise FileNotFoundError(f"No results for '{ref}' in {results_dir}")
+        path = matches[-1]
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f), path
+
+
+def compare(base, current, threshold):
+    if base['params'] != current['params'] or base['machine'] != current['machine']:
+        print("Warning: the two runs used different arguments or machines; timings are not comparable.")
+    print(f"\n{'case':<42} {'base (s)':>9} {'this (s)':>9} {'change':>8}")
+    regressions = 0
+    for name, result in current['results'].items():
+        if name not in base['results']:
+            print(f"{name:<42} {'-':>9} {result['min']:>9.3f}")
+            continue
+        before = base['results'][name]['min']
+        change = result['min'] / before - 1 if before > 0 else 0.0
+        flag = ''
+        if change > threshold:
+            flag, regressions = '  slower', regressions + 1
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{name:<42} {before:>9.3f} {result['min']:>9.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=10_000)
+    parser.add_argument('--words', type=int, default=300, help="Mean words per synthetic article.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=1, help="n_jobs for the plots' process pool.")
+    parser.add_argument('--only', nargs='+', default=None, help="Only run cases whose name contains one of these.")
+    parser.add_argument('--zero-shot-model', default=None,
+                        help="Local path or name of a small NLI model to benchmark apply_zero_shot with.")
+    parser.add_argument('--zero-shot-articles', type=int, default=200)
+    parser.add_argument('--output', default=None, help="Results file (default: benchmarks/results/<commit>.json).")
+    parser.add_argument('--compare', default=None, help="Commit or results file to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Relative change reported as a regression/improvement in --compare.")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='climate-bench-')
+    try:
+        results = run_cases(args, tmp, args.only)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    commit, dirty = git_revision()
+    run = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': {'articles': args.articles, 'words': args.words, 'seed': args.seed, 'repeat': args.repeat,
+                   'workers': args.workers},
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpus': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                    'pyarrow': pa.__version__},
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        base, path = load_results(args.compare)
+        print(f"Comparing with {path} (commit {base['commit']}{', dirty' if base['dirty'] else ''})")
+        regressions = compare(base, run, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+# benchmarks/synthetic_corpus.py
+"""
+Synthetic news corpus in the layout of data/: one <source>.jsonl per source in
+utils.SOURCE_TO_COUNTRY_MAP, one article per line with 'headline', 'body' (HTML paragraphs),
+'date_published' and 'url'. Articles are built from a few climate themes plus sentiment words
+whose balance differs by source and drifts over time, so topics, bias scores and changepoints
+have something to find. A configurable share of syndicated copies (exact and lightly edited),
+too-short bodies, missing fields and malformed lines exercises the cleaning and dedup steps.
+
+Also usable as a script, e.g. to run the whole pipeline without the real data:
+    python benchmarks/synthetic_corpus.py data --articles 50000 --start 2013-01-01 --end 2019-12-31
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import utils
+
+THEMES = {
+    'floods': 'flood flooding rainfall river levee evacuation storm surge monsoon rescue homes',
+    'wildfires': 'wildfire blaze firefighters drought heatwave smoke acres evacuation forest dry',
+    'summits': 'summit negotiators agreement pledge delegates treaty COP paris targets talks',
+    'coal': 'coal mine miners plant power jobs closure emissions industry union',
+    'renewables': 'solar wind turbines renewable energy grid battery investment capacity power',
+    'arctic': 'arctic ice sheet glacier melting polar bears sea level greenland antarctic',
+    'farming': 'farmers crops harvest drought irrigation food prices livestock soil yields',
+    'carbon tax': 'carbon tax price levy emissions trading market policy businesses cost',
+    'vehicles': 'electric vehicles cars charging batteries petrol diesel sales automakers',
+    'oceans': 'ocean coral reef acidification fisheries warming marine species bleaching',
+    'protests': 'protesters activists march strike students demonstration rally youth',
+    'science': 'scientists study research temperature record data models warming report',
+}
+COMMON = ('climate change government minister people year world country new said report '
+          'global warming environment public million according officials week').split()
+POSITIVE = ('hope progress success breakthrough support improve benefit celebrate win strong '
+            'clean growth opportunity safe praise').split()
+NEGATIVE = ('crisis disaster threat damage fear failure worst deadly catastrophe risk '
+            'devastating loss blame collapse warning').split()
+
+
+def _source_weights(sources, rng):
+    # Uneven source sizes, as in the real corpus
+    weights = 1 / np.arange(1, len(sources) + 1) ** 0.7
+    return rng.permutation(weights / weights.sum())
+
+
+def _paragraphs(words, rng):
+    sentences, start = [], 0
+    while start < len(words):
+        end = start + int(rng.integers(8, 20))
+        sentence = ' '.join(words[start:end])
+        sentences.append(sentence[:1].upper() + sentence[1:] + '.')
+        start = end
+    paragraphs = [' '.join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+    return ''.join(f'<p>{p}</p>' for p in paragraphs)
+
+
+def generate_corpus(folder, n_articles, start='2013-01-01', end='2019-12-31', sources=None,
+                    words=300, duplicate_rate=0.03, short_rate=0.02, missing_rate=0.01,
+                    malformed_rate=0.0005, seed=42):
+    """
+    Writes about `n_articles` articles (copies included) to `folder`, spread over `sources`
+    (default: every source in utils.SOURCE_TO_COUNTRY_MAP). Returns {filename: articles written}.
+    The same arguments always produce the same files.
+    """
+    rng = np.random.default_rng(seed)
+    sources = list(sources or utils.SOURCE_TO_COUNTRY_MAP)
+    os.makedirs(folder, exist_ok=True)
+
+    theme_words = [np.array(vocabulary.split()) for vocabulary in THEMES.values()]
+    common, positive, negative = np.array(COMMON), np.array(POSITIVE), np.array(NEGATIVE)
+    start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
+    span_seconds = int((end_ts - start_ts).total_seconds())
+
+    counts = rng.multinomial(n_articles, _source_weights(sources, rng))
+    # Each source leans positive or negative, and that lean drifts once during the period
+    lean = rng.uniform(0.25, 0.75, len(sources))
+    lean_after = np.clip(lean + rng.normal(0, 0.2, len(sources)), 0.05, 0.95)
+    shift_at = rng.uniform(0.3, 0.7, len(sources))
+
+    published = []  # (headline, body) of earlier articles, for syndicated copies
+    written = {}
+    files = {source: open(os.path.join(folder, f'{source}.jsonl'), 'w', encoding='utf-8') for source in sources}
+    try:
+        order = rng.permutation(np.repeat(np.arange(len(sources)), counts))
+        for i, s in enumerate(order):
+            source = sources[s]
+            offset = int(rng.integers(0, span_seconds + 1))
+            date = start_ts + pd.Timedelta(seconds=offset)
+
+            if published and rng.random() < duplicate_rate:
+                headline, body = published[int(rng.integers(0, len(published)))]
+                if rng.random() < 0.5:
+                    # Lightly edited copy: a different closing sentence
+                    body = body.replace('</p>', f' {rng.choice(common).capitalize()} {rng.choice(common)}.</p>', 1)
+            else:
+                theme = theme_words[int(rng.integers(0, len(theme_words)))]
+                n_words = int(rng.integers(words // 2, words * 3 // 2 + 1))
+                if rng.random() < short_rate:
+                    n_words = int(rng.integers(3, 15))
+                p_positive = lean[s] if offset < shift_at[s] * span_seconds else lean_after[s]
+                kind = rng.random(n_words)
+                tone = np.where(rng.random(n_words) < p_positive,
+                                rng.choice(positive, n_words), rng.choice(negative, n_words))
+                text = np.where(kind < 0.6, rng.choice(theme, n_words),
+                                np.where(kind < 0.9, rng.choice(common, n_words), tone))
+                headline = ' '.join(rng.choice(theme, int(rng.integers(5, 11)))).title()
+                body = _paragraphs(text.tolist(), rng)
+                if len(published) < 10000:
+                    published.append((headline, body))
+                elif rng.random() < 0.1:
+                    published[int(rng.integers(0, len(published)))] = (headline, body)
+
+            article = {
+                'headline': headline,
+                'body': body,
+                'date_published': date.strftime('%Y-%m-%dT%H:%M:%S'),
+                'url': f'https://www.{source}.example/{date:%Y/%m/%d}/article-{i}',
+            }
+            if rng.random() < missing_rate:
+                article[str(rng.choice(['headline', 'body', 'date_published']))] = None
+
+            line = json.dumps(article, ensure_ascii=False)
+            if rng.random() < malformed_rate:
+                line = line[:len(line) // 2]
+            files[source].write(line + '\n')
+            written[f'{source}.jsonl'] = written.get(f'{source}.jsonl', 0) + 1
+    finally:
+        for f in files.values():
+            f.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic corpus of per-source .jsonl files.")
+    parser.add_argument('folder')
+    parser.add_argument('--articles', type=int, default=20000)
+    parser.add_argument('--start', default='2013-01-01')
+    parser.add_argument('--end', default='2019-12-31')
+    parser.add_argument('--sources', nargs='+', default=None, help="Default: all sources in utils.SOURCE_TO_COUNTRY_MAP.")
+    parser.add_argument('--words', type=int, default=300, help="Mean words per article.")
+    parser.add_argument('--duplicate-rate', type=float, default=0.03)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    written = generate_corpus(args.folder, args.articles, start=args.start, end=args.end, sources=args.sources,
+                              words=args.words, duplicate_rate=args.duplicate_rate, seed=args.seed)
+    size_mb = sum(os.path.getsize(os.path.join(args.folder, f)) for f in written) / 1e6
+    print(f"Wrote {sum(written.values()):,} articles to {len(written)} files in {args.folder} ({size_mb:,.0f} MB).")
+
+
+if __name__ == '__main__':
+    main()
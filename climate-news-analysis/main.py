@@ -1,68 +1,346 @@
 import os
+# jemalloc returns freed Arrow buffers to the OS; with the default allocator RSS keeps growing
+# from batch to batch in --chunked mode. Only takes effect if set before pyarrow is imported.
+os.environ.setdefault('ARROW_DEFAULT_MEMORY_POOL', 'jemalloc')
+import logging
+import argparse
+from functools import partial
 import pandas as pd
-from src import ingest, preprocess, sentiment, topics, aggregate, visualize, utils, reports
+from src import ingest, preprocess, sentiment, topics, aggregate, visualize, utils, reports, cache, dedup, events, cube, schema, chunked, metrics, dag, search, baseline
+
+logger = logging.getLogger('pipeline')
+
+# Stages of the pipeline graph built in main() ('chunked' replaces ingest..merge in --chunked mode)
+STAGE_NAMES = [
+    'ingest', 'preprocess', 'dedup', 'sentiment', 'topics', 'merge', 'chunked', 'cube', 'aggregate',
+    'top_topics_report', 'baseline', 'bias', 'plot_over_time', 'plot_by_region', 'plot_topics_by_region',
+    'plot_by_source', 'plot_timelines', 'search_index',
+]
+# Arguments that do not change the results, so a run can be resumed with different values
+RUN_ONLY_ARGS = {'force', 'from_stage', 'only', 'until', 'resume', 'stage_workers', 'log_level', 'profile'}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Climate news discourse analysis pipeline.")
+    parser.add_argument('--force', action='store_true',
+                        help="Ignore all cached stage results and recompute everything.")
+    parser.add_argument('--from-stage', choices=cache.STAGES, default=None,
+                        help="Recompute this stage and every stage after it, ignoring their cache.")
+    parser.add_argument('--workers', type=int, default=-1,
+                        help="Worker processes for parallel stages (-1 uses all cores).")
+    parser.add_argument('--topic-mode', choices=['fit', 'transform', 'online'], default='fit',
+                        help="'fit' refits BERTopic on the whole corpus; 'transform' assigns new articles "
+                             "with the saved model; 'online' also adds new topics when drift is detected.")
+    parser.add_argument('--near-dup-threshold', type=float, default=0.8,
+                        help="Estimated Jaccard similarity above which articles count as near-duplicates "
+                             "(0 disables near-duplicate detection).")
+    parser.add_argument('--events', default=None,
+                        help="CSV or Parquet event catalogue (name, start, end) to correlate with "
+                             "bias changepoints. Defaults to the built-in major events.")
+    parser.add_argument('--baseline-window', choices=baseline.WINDOWS, default=baseline.DEFAULT_CONFIG['window'],
+                        help="Regional baseline the bias scores are measured against: the same calendar month, "
+                             "a rolling window of --baseline-months months or an EWMA with a half-life of "
+                             "--baseline-halflife months.")
+    parser.add_argument('--baseline-months', type=int, default=baseline.DEFAULT_CONFIG['rolling_months'])
+    parser.add_argument('--baseline-halflife', type=float, default=baseline.DEFAULT_CONFIG['halflife'])
+    parser.add_argument('--bias-measure', choices=list(aggregate.BIAS_MEASURES), default='raw',
+                        help="'raw' bias is the difference from the baseline mean, 'zscore' divides it by the "
+                             "baseline's standard deviation.")
+    parser.add_argument('--plot-formats', nargs='+', default=['png'], choices=['png', 'svg'],
+                        help="Output formats for the per-source and regional timeline charts.")
+    parser.add_argument('--plot-dpi', type=int, default=None,
+                        help="Resolution of raster timeline charts (defaults to matplotlib's setting).")
+    parser.add_argument('--keep-near-duplicates', action='store_true',
+                        help="Only record near-duplicate cluster ids instead of dropping the copies.")
+    parser.add_argument('--chunked', action='store_true',
+                        help="Out-of-core mode: stream articles in batches to a partitioned Parquet dataset "
+                             "with bounded memory. Skips near-duplicate detection and topic fitting (the "
+                             "saved topic model is used if there is one). Use --force after changing the code.")
+    parser.add_argument('--batch-size', type=int, default=chunked.DEFAULT_BATCH_SIZE,
+                        help="Articles per batch in --chunked mode.")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="WARNING silences progress messages; DEBUG also logs each stage's metrics as JSON.")
+    parser.add_argument('--profile', choices=STAGE_NAMES, default=None,
+                        help="Run this stage under cProfile and tracemalloc and save both to outputs/profiles/ "
+                             "(tracemalloc slows the stage down considerably). Stages then run one at a time.")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument('--only', nargs='+', choices=STAGE_NAMES, default=None,
+                           help="Run only these stages. The outputs they need are loaded from the last run "
+                                "where they were saved, and recomputed otherwise.")
+    selection.add_argument('--until', choices=STAGE_NAMES, default=None,
+                           help="Run this stage and the stages it depends on, and stop.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip the stages a failed or interrupted run with the same settings completed.")
+    parser.add_argument('--stage-workers', type=int, default=None,
+                        help="Independent stages run at the same time (default: up to 4).")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    # Stages run in threads named after them, so concurrent stages' messages can be told apart
+    logging.basicConfig(level=args.log_level, format='%(asctime)s %(levelname)-7s [%(threadName)s] %(message)s',
+                        datefmt='%H:%M:%S')
 
-    #  1. Define Paths 
+    #  1. Define Paths
     DATA_FOLDER = 'data'
     OUTPUT_FOLDER = 'outputs'
     REPORTS_FOLDER = os.path.join(OUTPUT_FOLDER, 'reports')
-    
+    CACHE_FOLDER = os.path.join(OUTPUT_FOLDER, 'cache')
+    EMBEDDINGS_FOLDER = os.path.join(OUTPUT_FOLDER, 'embeddings')
+    NEAR_DUP_INDEX_PATH = os.path.join(CACHE_FOLDER, 'near_dup_index.npz')
+
     PROCESSED_DATA_PATH = os.path.join(OUTPUT_FOLDER, 'processed.parquet')
     SENTIMENT_DATA_PATH = os.path.join(OUTPUT_FOLDER, 'sentiments.parquet')
+    TOPICS_DATA_PATH = os.path.join(OUTPUT_FOLDER, 'topics.parquet')
     FINAL_DATA_PATH = os.path.join(OUTPUT_FOLDER, 'final_data.parquet')
+    CUBE_PATH = os.path.join(OUTPUT_FOLDER, 'sentiment_cube.parquet')
+    ARTICLES_DATASET_PATH = os.path.join(OUTPUT_FOLDER, 'articles')
+    SEEN_HASHES_PATH = os.path.join(CACHE_FOLDER, 'seen_hashes.sqlite')
+    DAG_STATE_PATH = os.path.join(CACHE_FOLDER, 'dag_state.json')
+    TOPIC_MODEL_PATH = os.path.join(OUTPUT_FOLDER, 'topic_model')
+    SEARCH_INDEX_PATH = os.path.join(OUTPUT_FOLDER, 'search_index')
+    BASELINE_STATE_PATH = os.path.join(CACHE_FOLDER, 'baseline_state.parquet')
     TOPIC_INFO_PATH = os.path.join(REPORTS_FOLDER, 'topic_info.csv')
     TOP_TOPICS_REPORT_PATH = os.path.join(REPORTS_FOLDER, 'top_topics_per_source.txt')
-    BIAS_REPORT_PATH = os.path.join(REPORTS_FOLDER, 'bias_report.txt') 
-    
+    BIAS_REPORT_PATH = os.path.join(REPORTS_FOLDER, 'bias_report.txt')
+    METRICS_LOG_PATH = os.path.join(OUTPUT_FOLDER, 'metrics.jsonl')
+    PROFILES_FOLDER = os.path.join(OUTPUT_FOLDER, 'profiles')
+
     os.makedirs(REPORTS_FOLDER, exist_ok=True)
 
-    #   2. Ingest & Preprocess  
-    raw_df = ingest.load_all_articles(DATA_FOLDER)
-    processed_df = preprocess.preprocess_data(raw_df)
-    utils.save_data(processed_df, PROCESSED_DATA_PATH)
-    
-    #   3. Sentiment & Topic Modeling  
-    # processed_df = utils.load_data(PROCESSED_DATA_PATH)
-    sentiment_df = sentiment.apply_vader(processed_df)
-    utils.save_data(sentiment_df, SENTIMENT_DATA_PATH)
-    
-    # sentiment_df = utils.load_data(SENTIMENT_DATA_PATH)
-    final_df, topic_model = topics.model_topics(sentiment_df)
-    
-    topic_info = topic_model.get_topic_info()
-    topic_info.to_csv(TOPIC_INFO_PATH, index=False)
-    utils.save_data(final_df, FINAL_DATA_PATH)
-
-    #   4. Aggregation, Reporting & Visualization  
-    print("\n--- Starting Aggregation, Reporting, and Visualization ---")
-    final_df = utils.load_data(FINAL_DATA_PATH)
-    topic_info_df = pd.read_csv(TOPIC_INFO_PATH)
-
-    # a) Original Aggregations
-    agg_time = aggregate.aggregate_by_time(final_df)
-    agg_sent_region, agg_topic_region = aggregate.aggregate_by_region(final_df)
-    
-    # b) New Aggregations & Reports
-    agg_sent_source = aggregate.aggregate_by_source(final_df)
-    aggregate.generate_top_topics_report(final_df, topic_info_df, TOP_TOPICS_REPORT_PATH)
-
-    bias_analysis_results = aggregate.analyze_bias_and_events(final_df)
-    reports.generate_bias_report(bias_analysis_results, BIAS_REPORT_PATH)
-
-    # c) Original Visualizations
-    visualize.plot_sentiment_over_time(agg_time, REPORTS_FOLDER)
-    visualize.plot_sentiment_by_region(agg_sent_region, REPORTS_FOLDER)
-    visualize.plot_topics_by_region(agg_topic_region, REPORTS_FOLDER)
-
-    # d) New Visualizations
-    visualize.plot_sentiment_by_source(agg_sent_source, REPORTS_FOLDER)
-    visualize.plot_sentiment_over_time_per_source(final_df, REPORTS_FOLDER)
-    visualize.plot_regional_comparison_timelines(final_df, REPORTS_FOLDER)
-
-    print("\nPipeline finished successfully!")
-    print(f"All outputs and reports have been saved in '{REPORTS_FOLDER}'.")
+    # Wall/CPU time, peak RSS and rows per stage, appended to METRICS_LOG_PATH as JSON lines
+    run_metrics = metrics.PipelineMetrics(METRICS_LOG_PATH, profile_stage=args.profile, profile_dir=PROFILES_FOLDER)
+
+    #   2-3. Ingest, Preprocess, Sentiment & Topics
+    if args.chunked:
+        def chunked_stage():
+            # One batch at a time, straight into the partitioned dataset
+            os.makedirs(CACHE_FOLDER, exist_ok=True)
+            if args.force:
+                chunked.reset(ARTICLES_DATASET_PATH, SEEN_HASHES_PATH)
+            topic_model = topics.load_topic_model(TOPIC_MODEL_PATH) if os.path.exists(TOPIC_MODEL_PATH) else None
+            chunked.run_chunked(
+                DATA_FOLDER, ARTICLES_DATASET_PATH, SEEN_HASHES_PATH, batch_size=args.batch_size,
+                n_jobs=args.workers, topic_model=topic_model, embeddings_folder=EMBEDDINGS_FOLDER
+            )
+            return ARTICLES_DATASET_PATH
+
+        def cube_stage(dataset_path):
+            # The cube is built batch by batch from the dataset
+            sentiment_cube = chunked.build_dataset_cube(dataset_path)
+            cube.save_cube(sentiment_cube, CUBE_PATH)
+            return sentiment_cube
+
+        def search_index_stage(dataset_path):
+            metadata = chunked.read_articles(dataset_path, columns=search.METADATA_COLUMNS)
+            search.update_index(SEARCH_INDEX_PATH, EMBEDDINGS_FOLDER, metadata, rebuild=args.force)
+
+        articles = 'articles_dataset'
+        stages = [
+            dag.Stage('chunked', chunked_stage, outputs=[articles], load=lambda: ARTICLES_DATASET_PATH),
+        ]
+    else:
+        # Only new or changed articles are recomputed; everything else comes from the cache
+        pipeline_cache = cache.PipelineCache(CACHE_FOLDER, force=args.force, from_stage=args.from_stage)
+
+        def preprocess_stage(raw_df):
+            logger.info("Starting preprocessing...")
+            processed_df = pipeline_cache.run(
+                'preprocess', raw_df, partial(preprocess.clean_articles, n_jobs=args.workers),
+                columns=['date_published', 'cleaned_body', 'cleaned_headline', 'country', 'region'],
+                modules=[preprocess, utils]
+            )
+            # Raw text is no longer needed; it can be re-read from data/ by 'source_offset'
+            return schema.drop_raw_text(processed_df)
+
+        def dedup_stage(processed_df):
+            processed_df = preprocess.drop_duplicate_articles(processed_df)
+            if args.near_dup_threshold > 0:
+                # The LSH index persists between runs, so only new articles are signed and matched.
+                # It is rebuilt whenever the cleaned text it was built from changes.
+                if args.force or args.from_stage in ('ingest', 'preprocess'):
+                    if os.path.exists(NEAR_DUP_INDEX_PATH):
+                        os.remove(NEAR_DUP_INDEX_PATH)
+                processed_df = dedup.drop_near_duplicates(
+                    processed_df, threshold=args.near_dup_threshold, index_path=NEAR_DUP_INDEX_PATH,
+                    keep_duplicates=args.keep_near_duplicates, n_jobs=args.workers,
+                    text_fingerprint=pipeline_cache.stage_fingerprint('preprocess')
+                )
+            logger.info(f"Preprocessing complete. {len(processed_df)} articles remaining.")
+            utils.save_data(processed_df, PROCESSED_DATA_PATH)
+            return processed_df
+
+        def sentiment_stage(processed_df):
+            sentiment_df = pipeline_cache.run(
+                'sentiment', processed_df, partial(sentiment.apply_vader, n_jobs=args.workers),
+                columns=list(sentiment.VADER_COLUMNS.values()),
+                modules=[sentiment]
+            )
+            utils.save_data(sentiment_df, SENTIMENT_DATA_PATH)
+            return sentiment_df
+
+        def fit_topics(df):
+            # Embeddings are cached per article, so only new articles are ever encoded
+            embeddings = topics.compute_embeddings(df, EMBEDDINGS_FOLDER)
+            df, topic_model = topics.model_topics(df, embeddings=embeddings)
+            topics.save_topic_model(topic_model, TOPIC_MODEL_PATH)
+            topic_info = topic_model.get_topic_info()
+            topic_info.to_csv(TOPIC_INFO_PATH, index=False)
+            return df
+
+        def assign_new_topics(df):
+            topic_model = topics.load_topic_model(TOPIC_MODEL_PATH)
+            embeddings = topics.compute_embeddings(df, EMBEDDINGS_FOLDER)
+            df = topics.assign_topics(df, topic_model, embeddings)
+
+            drifted, poor_fit = topics.detect_topic_drift(topic_model, embeddings)
+            if drifted and args.topic_mode == 'online':
+                updated_model = topics.update_topics_online(topic_model, df, embeddings, poor_fit)
+                if updated_model is not topic_model:
+                    topics.save_topic_model(updated_model, TOPIC_MODEL_PATH)
+                    updated_model.get_topic_info().to_csv(TOPIC_INFO_PATH, index=False)
+                    df = topics.assign_topics(df, updated_model, embeddings)
+            elif drifted:
+                logger.warning("New articles drift from the saved topics. Consider --topic-mode online or fit.")
+            return df
+
+        def topic_model_config():
+            # Cached topics are keyed to the saved model that assigned them, in both modes, so after a
+            # fit or an online update only articles the current model has not seen are assigned
+            if not os.path.exists(TOPIC_MODEL_PATH):
+                return {'model': None}
+            return {'model': topics.saved_model_fingerprint(TOPIC_MODEL_PATH)}
+
+        def topics_stage(processed_df):
+            # Cached topic assignments are only usable together with the model and topic info they came from
+            if not os.path.exists(TOPIC_INFO_PATH) or not os.path.exists(TOPIC_MODEL_PATH):
+                pipeline_cache.invalidate('topics')
+
+            if args.topic_mode == 'fit' or not os.path.exists(TOPIC_MODEL_PATH):
+                topic_df = pipeline_cache.run(
+                    'topics', processed_df, fit_topics,
+                    columns=['topic'],
+                    modules=[topics],
+                    config=topic_model_config,
+                    row_wise=False
+                )
+            else:
+                # Only articles without a cached topic for this exact model go through the saved model
+                topic_df = pipeline_cache.run(
+                    'topics', processed_df, assign_new_topics,
+                    columns=['topic'],
+                    modules=[topics],
+                    config=topic_model_config
+                )
+            topic_df = topic_df[['article_id', 'topic']]
+            utils.save_data(topic_df, TOPICS_DATA_PATH)
+            return topic_df
+
+        def merge_stage(sentiment_df, topic_df):
+            final_df = sentiment_df.merge(topic_df, on='article_id', how='inner', validate='one_to_one')
+            # Partitioned by source and year, so later reads only touch the columns and periods they need
+            utils.save_data(final_df, FINAL_DATA_PATH, partition_cols=utils.PARTITION_COLUMNS)
+            pipeline_cache.report()
+            return final_df
+
+        def cube_stage(final_df):
+            # The count/sum/sum-of-squares cube is built in one pass; every aggregate view below rolls it up
+            sentiment_cube = cube.build_cube(final_df)
+            cube.save_cube(sentiment_cube, CUBE_PATH)
+            return sentiment_cube
+
+        def search_index_stage(final_df):
+            search.update_index(SEARCH_INDEX_PATH, EMBEDDINGS_FOLDER, final_df[search.METADATA_COLUMNS],
+                                rebuild=args.force)
+
+        # Sentiment and topics both start from the deduplicated articles and run side by side
+        articles = 'final_df'
+        # All that the stages after merge read of the final data, when it is loaded rather than built
+        FINAL_COLUMNS = list(dict.fromkeys(cube.ARTICLE_COLUMNS + search.METADATA_COLUMNS))
+        stages = [
+            dag.Stage('ingest', partial(pipeline_cache.load_articles, DATA_FOLDER), outputs=['raw_df']),
+            dag.Stage('preprocess', preprocess_stage, inputs=['raw_df'], outputs=['cleaned_df']),
+            dag.Stage('dedup', dedup_stage, inputs=['cleaned_df'], outputs=['processed_df'],
+                      load=partial(utils.load_data, PROCESSED_DATA_PATH)),
+            dag.Stage('sentiment', sentiment_stage, inputs=['processed_df'], outputs=['sentiment_df'],
+                      load=partial(utils.load_data, SENTIMENT_DATA_PATH)),
+            dag.Stage('topics', topics_stage, inputs=['processed_df'], outputs=['topic_df'],
+                      load=partial(utils.load_data, TOPICS_DATA_PATH)),
+            dag.Stage('merge', merge_stage, inputs=['sentiment_df', 'topic_df'], outputs=['final_df'],
+                      load=partial(utils.load_data, FINAL_DATA_PATH, columns=FINAL_COLUMNS)),
+        ]
+
+    #   4. Aggregation, Reporting & Visualization
+    def aggregate_stage(sentiment_cube):
+        logger.info("--- Starting Aggregation, Reporting, and Visualization ---")
+        agg_time = aggregate.aggregate_by_time(sentiment_cube)
+        agg_sent_region, agg_topic_region = aggregate.aggregate_by_region(sentiment_cube)
+        agg_sent_source = aggregate.aggregate_by_source(sentiment_cube)
+        return agg_time, agg_sent_region, agg_topic_region, agg_sent_source
+
+    def top_topics_stage(sentiment_cube):
+        # Without a fitted model (possible in --chunked mode) there are no topics to report
+        if os.path.exists(TOPIC_INFO_PATH):
+            topic_info_df = pd.read_csv(TOPIC_INFO_PATH)
+            aggregate.generate_top_topics_report(sentiment_cube, topic_info_df, TOP_TOPICS_REPORT_PATH)
+
+    baseline_config = {
+        'window': args.baseline_window, 'rolling_months': args.baseline_months, 'halflife': args.baseline_halflife,
+    }
+
+    def baseline_stage(sentiment_cube):
+        # Only the (region, topic) series whose monthly totals changed since the last run are recomputed
+        state = baseline.update_state(BASELINE_STATE_PATH, sentiment_cube, baseline_config, rebuild=args.force)
+        return state.baselines()
+
+    def bias_stage(sentiment_cube, baselines):
+        # The cube gives the same bias scores as the articles from far fewer rows
+        event_catalogue = events.load_event_catalogue(args.events)
+        bias_analysis_results = aggregate.analyze_bias_and_events(
+            sentiment_cube, n_jobs=args.workers, events=event_catalogue, baselines=baselines, measure=args.bias_measure
+        )
+        reports.generate_bias_report(bias_analysis_results, BIAS_REPORT_PATH)
+
+    def plot_stage(name, plot, input_name):
+        # matplotlib is not thread-safe, so each chart is drawn in a worker process. The profiler
+        # only sees this process, though, so a profiled chart is drawn here.
+        executor = 'thread' if name == args.profile else 'process'
+        return dag.Stage(name, partial(plot, output_folder=REPORTS_FOLDER), inputs=[input_name], executor=executor)
+
+    stages += [
+        dag.Stage('cube', cube_stage, inputs=[articles], outputs=['sentiment_cube'],
+                  load=partial(cube.load_cube, CUBE_PATH)),
+        dag.Stage('aggregate', aggregate_stage, inputs=['sentiment_cube'],
+                  outputs=['agg_time', 'agg_sent_region', 'agg_topic_region', 'agg_sent_source']),
+        dag.Stage('top_topics_report', top_topics_stage, inputs=['sentiment_cube']),
+        dag.Stage('baseline', baseline_stage, inputs=['sentiment_cube'], outputs=['baselines'],
+                  load=lambda: baseline.BaselineState.load(BASELINE_STATE_PATH, baseline_config).baselines()),
+        dag.Stage('bias', bias_stage, inputs=['sentiment_cube', 'baselines']),
+        plot_stage('plot_over_time', visualize.plot_sentiment_over_time, 'agg_time'),
+        plot_stage('plot_by_region', visualize.plot_sentiment_by_region, 'agg_sent_region'),
+        plot_stage('plot_topics_by_region', visualize.plot_topics_by_region, 'agg_topic_region'),
+        plot_stage('plot_by_source', visualize.plot_sentiment_by_source, 'agg_sent_source'),
+        # Per-source and regional timelines share one groupby, render in their own process pool
+        # and skip charts whose data is unchanged
+        dag.Stage('plot_timelines', partial(
+            visualize.plot_timelines, output_folder=REPORTS_FOLDER, n_jobs=args.workers,
+            formats=args.plot_formats, dpi=args.plot_dpi
+        ), inputs=['sentiment_cube']),
+        # Nearest-neighbour index over the article embeddings the topics stage cached
+        dag.Stage('search_index', search_index_stage, inputs=[articles]),
+    ]
+
+    # A profiled stage runs alone, so its measurements are not mixed with other stages'
+    stage_workers = 1 if args.profile else args.stage_workers
+    # Options that only affect how (not what) this run computes do not prevent resuming
+    resume_config = {k: v for k, v in vars(args).items() if k not in RUN_ONLY_ARGS}
+    dag.run_dag(
+        stages, only=args.only, until=args.until, max_workers=stage_workers, state_path=DAG_STATE_PATH,
+        resume=args.resume, config=resume_config, run_metrics=run_metrics
+    )
+
+    run_metrics.report()
+    logger.info("Pipeline finished successfully!")
+    logger.info(f"All outputs and reports have been saved in '{REPORTS_FOLDER}'.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
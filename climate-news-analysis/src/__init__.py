@@ -1,12 +1,23 @@
 # src/__init__.py
+import importlib
+import logging
 
-from . import ingest
-from . import preprocess
-from . import sentiment
-from . import topics
-from . import aggregate
-from . import visualize
-from . import utils
-from . import reports
+# Submodules are imported on first access (PEP 562), so e.g. `from src import reports` does not
+# also load the topic model, transformers or the plotting libraries
+__all__ = [
+    'ingest', 'preprocess', 'sentiment', 'topics', 'aggregate', 'visualize', 'utils', 'reports',
+    'cache', 'dedup', 'events', 'cube', 'schema', 'chunked', 'metrics', 'dag', 'query', 'search', 'baseline',
+]
 
-print("src package initialized.")
\ No newline at end of file
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+logging.getLogger(__name__).debug("src package initialized.")
@@ -1,121 +1,261 @@
 # src/aggregate.py
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import ruptures as rpt
-from . import utils
+from . import utils, events as event_store, cube as sentiment_cube, baseline as baseline_engine
+
+logger = logging.getLogger(__name__)
+
+# Changepoint detection settings for the weekly per-source bias series.
+# 'algorithm' is one of 'pelt', 'binseg' or 'window'; 'model' is a ruptures cost ('l2', 'normal', 'rbf', ...).
+# Series longer than 'long_series_weeks' switch to 'long_series_algorithm', since PELT with the
+# rbf cost builds a Gram matrix that is quadratic in the number of weeks.
+CHANGEPOINT_CONFIG = {
+    'algorithm': 'pelt',
+    'model': 'rbf',
+    'min_size': 2,
+    'jump': 5,
+    'pen': 3,
+    'width': 10,  # window size for the 'window' algorithm
+    'long_series_weeks': None,
+    'long_series_algorithm': 'binseg',
+}
 
 def aggregate_by_time(df, freq='M'):
-    print(f"Aggregating data by time frequency: {freq}")
-    df_time = df.set_index('date_published').copy()
-    sentiment_over_time = df_time['vader_sentiment'].resample(freq).mean().reset_index()
-    return sentiment_over_time
+    """Mean sentiment per period. `df` may be article-level data or a sentiment cube."""
+    logger.info(f"Aggregating data by time frequency: {freq}")
+    totals = sentiment_cube.as_cube(df).set_index('date')[['count', 'sentiment_sum']].resample(freq).sum()
+    # Empty periods have a zero count and come out as NaN, as with resample().mean()
+    sentiment = totals['sentiment_sum'] / totals['count'].where(totals['count'] > 0)
+    return sentiment.rename('vader_sentiment').rename_axis('date_published').reset_index()
 
 def aggregate_by_region(df):
-    print("Aggregating data by region...")
-    sentiment_by_region = df.groupby('region')['vader_sentiment'].mean().reset_index()
-    topic_by_region = df.groupby(['region', 'topic']).size().unstack(fill_value=0)
+    logger.info("Aggregating data by region...")
+    cube = sentiment_cube.as_cube(df)
+    sentiment_by_region = (
+        sentiment_cube.rollup(cube, by=['region'])['mean'].rename('vader_sentiment').reset_index()
+    )
+    topic_by_region = cube.groupby(['region', 'topic'], observed=True)['count'].sum().unstack(fill_value=0)
     return sentiment_by_region, topic_by_region
 
 def aggregate_by_source(df):
-    print("Aggregating data by news source...")
-    sentiment_by_source = df.groupby('source')['vader_sentiment'].mean().sort_values(ascending=False).reset_index()
+    logger.info("Aggregating data by news source...")
+    by_source = sentiment_cube.rollup(sentiment_cube.as_cube(df), by=['source'])['mean']
+    sentiment_by_source = by_source.rename('vader_sentiment').sort_values(ascending=False).reset_index()
     return sentiment_by_source
 
 def generate_top_topics_report(df, topic_info_df, output_path):
-    print(f"Generating top topics report at {output_path}...")
-    
-    # Merge topic names into the main dataframe for easier access
+    logger.info(f"Generating top topics report at {output_path}...")
+
+    # Article counts per source and topic, read off the cube instead of scanning every article
+    counts = sentiment_cube.as_cube(df).groupby(['source', 'topic'], observed=True)['count'].sum().reset_index()
     topic_names = topic_info_df[['Topic', 'Name']].set_index('Topic')
-    df_merged = df.join(topic_names, on='topic')
+    counts = counts.join(topic_names, on='topic')
     # Use a placeholder for topics without a generated name (like Topic -1)
-    df_merged['Name'].fillna(df_merged['topic'].apply(lambda x: f"Topic {x}"), inplace=True)
+    counts['Name'] = counts['Name'].fillna(counts['topic'].apply(lambda x: f"Topic {x}"))
+
+    all_sources = sorted(counts['source'].unique())
 
-    all_sources = sorted(df['source'].unique())
-    
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write("Top 50 Most Frequent Topics per News Source\n")
         f.write("===============================================\n\n")
 
         for source in all_sources:
             f.write(f"--- {source.upper()} ---\n")
-            
-            source_df = df_merged[df_merged['source'] == source]
-            topic_counts = source_df['Name'].value_counts().nlargest(50)
-            
+
+            source_counts = counts[counts['source'] == source]
+            topic_counts = source_counts.groupby('Name')['count'].sum().nlargest(50)
+
             if topic_counts.empty:
                 f.write("No topic data available.\n\n")
                 continue
 
             for i, (topic_name, count) in enumerate(topic_counts.items()):
                 f.write(f"{i+1:2}. {topic_name} ({count} articles)\n")
-            
+
             f.write("\n")
-    print("Report generation complete.")
+    logger.info("Report generation complete.")
+
+# Article columns the bias and changepoint analysis reads
+BIAS_COLUMNS = ['source', 'region', 'topic', 'date_published', 'vader_sentiment']
+# 'raw' is the difference from the baseline mean, 'zscore' that difference in baseline stds
+BIAS_MEASURES = {'raw': 'bias_score', 'zscore': 'bias_zscore'}
+
+def compute_bias_scores(df, baselines=None):
+    """
+    Returns a new frame with each article's regional baseline sentiment and bias score.
+    The baseline is the mean sentiment of articles from the same region on the same topic
+    in the same month. The input frame is not modified.
+
+    With `baselines` (see baseline.BaselineState), or when `df` is a sentiment cube, the
+    baselines come from the baseline engine instead, and a z-scored bias is added.
+    """
+    if baselines is not None or sentiment_cube.is_cube(df):
+        if baselines is None:
+            baselines = baseline_engine.BaselineState.from_data(df).baselines()
+        return baseline_engine.score(df, baselines)
+
+    bias_df = df[BIAS_COLUMNS].copy()
+    # Integer month key (same grouping as to_period('M'), much cheaper to compute)
+    dates = bias_df['date_published']
+    month = dates.dt.year * 12 + dates.dt.month
+    bias_df['baseline_sentiment'] = (
+        bias_df.groupby([bias_df['region'], bias_df['topic'], month], observed=True)['vader_sentiment'].transform('mean')
+    )
+    bias_df['bias_score'] = bias_df['vader_sentiment'] - bias_df['baseline_sentiment']
+    # Drop articles without a baseline
+    return bias_df.dropna(subset=['bias_score'])
+
+def _weighted_mean(bias_df, keys, column):
+    if 'count' not in bias_df.columns:
+        return bias_df.groupby(keys, observed=True)[column].mean()
+    # Cube cells stand for `count` articles each; cells without a score carry no weight
+    values = bias_df[column]
+    weights = bias_df['count'].where(values.notna(), 0)
+    totals = pd.DataFrame({'total': values * weights, 'weight': weights}).groupby(keys, observed=True).sum()
+    return totals['total'] / totals['weight'].where(totals['weight'] > 0)
+
+def weekly_bias_matrix(bias_df, column='bias_score'):
+    """
+    Mean weekly bias score as a wide (week x source) matrix, computed in one grouped pass.
+    Weeks without articles are NaN; per source, the span between its first and last article
+    matches what resampling that source alone would produce.
+    """
+    dates = bias_df['date_published']
+    # Label of the resample('W') bin: the Sunday ending the article's week. Computing it directly
+    # avoids the full sort a pd.Grouper(freq='W') does.
+    week = (dates.dt.normalize() + pd.to_timedelta((6 - dates.dt.dayofweek) % 7, unit='D')).rename('date_published')
+    weekly = _weighted_mean(bias_df, [bias_df['source'], week], column).unstack('source')
+    if weekly.empty:
+        return weekly
+    # The grouped result only contains observed weeks, so restore the full weekly index
+    full_index = pd.date_range(weekly.index.min(), weekly.index.max(), freq='W', name='date_published')
+    return weekly.reindex(full_index)
+
+def detect_changepoints(values, config=None):
+    """
+    Runs ruptures on a 1-D series. Returns one dict per changepoint with its index, the mean of
+    the segments before and after it, and the shift magnitude (after - before).
+    """
+    config = {**CHANGEPOINT_CONFIG, **(config or {})}
+    algorithm = config['algorithm']
+    if config['long_series_weeks'] and len(values) > config['long_series_weeks']:
+        algorithm = config['long_series_algorithm']
 
-def analyze_bias_and_events(df):
+    # ruptures pulls in scipy, which is slow to import; only the bias stage needs it
+    import ruptures as rpt
+    params = {'model': config['model'], 'min_size': config['min_size'], 'jump': config['jump']}
+    if algorithm == 'pelt':
+        algo = rpt.Pelt(**params)
+    elif algorithm == 'binseg':
+        algo = rpt.Binseg(**params)
+    elif algorithm == 'window':
+        algo = rpt.Window(width=config['width'], **params)
+    else:
+        raise ValueError(f"Unknown changepoint algorithm: {algorithm}")
+
+    points = np.asarray(values, dtype=np.float64).reshape(-1, 1)
+    result_indices = algo.fit(points).predict(pen=config['pen'])
+
+    # The last index is the end of the series, so it is not a changepoint
+    boundaries = [0] + list(result_indices)
+    changepoints = []
+    for k in range(1, len(boundaries) - 1):
+        before = points[boundaries[k - 1]:boundaries[k], 0].mean()
+        after = points[boundaries[k]:boundaries[k + 1], 0].mean()
+        changepoints.append({
+            'index': int(boundaries[k]),
+            'segment_mean_before': float(before),
+            'segment_mean_after': float(after),
+            'magnitude': float(after - before),
+        })
+    return changepoints
+
+def _detect_source_changepoints(args):
+    source, values, config = args
+    return source, detect_changepoints(values, config)
+
+def analyze_bias_and_events(df, changepoint_config=None, n_jobs=1, events=None,
+                            event_lag_days=event_store.DEFAULT_LAG_DAYS, max_correlated_events=10,
+                            baselines=None, measure='raw'):
+    """
+    Bias scores and changepoint analysis per source. Changepoint detection runs in a process
+    pool when n_jobs > 1 (or -1 for all cores); see CHANGEPOINT_CONFIG for the settings.
+    Each changepoint is matched against `events` (see events.load_event_catalogue; defaults to
+    utils.MAJOR_EVENTS) that started up to `event_lag_days` before it, keeping the
+    `max_correlated_events` closest.
+
+    `df` holds articles (BIAS_COLUMNS) or is the sentiment cube, which gives the same results
+    from far fewer rows. `baselines` and `measure` (a BIAS_MEASURES key) are as in
+    compute_bias_scores.
+    """
+    if measure not in BIAS_MEASURES:
+        raise ValueError(f"Unknown bias measure '{measure}' (expected one of {list(BIAS_MEASURES)})")
+    column = BIAS_MEASURES[measure]
+    if column == 'bias_zscore' and baselines is None:
+        baselines = baseline_engine.BaselineState.from_data(df).baselines()
+
+    logger.info("--- Starting Bias and Event Correlation Analysis ---")
 
-    print("\n--- Starting Bias and Event Correlation Analysis ---")
-    
     # 1. Calculate Regional Baseline Sentiment per Topic per Month
-    print("Step 1/4: Calculating regional baseline sentiment...")
-    df['month'] = df['date_published'].dt.to_period('M')
-    baseline_sentiment = df.groupby(['region', 'topic', 'month'])['vader_sentiment'].transform('mean')
-    df['baseline_sentiment'] = baseline_sentiment
-    
+    logger.info("Step 1/4: Calculating regional baseline sentiment...")
     # 2. Calculate Bias Score for each article
-    print("Step 2/4: Calculating bias scores...")
-    df['bias_score'] = df['vader_sentiment'] - df['baseline_sentiment']
-    df.dropna(subset=['bias_score'], inplace=True) # Drop articles without a baseline
+    logger.info("Step 2/4: Calculating bias scores...")
+    bias_df = compute_bias_scores(df, baselines)
 
     # 3. Analyze each source for changepoints
-    print("Step 3/4: Detecting sentiment changepoints for each source...")
-    all_sources = df['source'].unique()
-    analysis_results = {}
-
-    # Convert event strings to datetime objects
-    events_dt = {
-        name: (pd.to_datetime(dates[0]), pd.to_datetime(dates[1]))
-        for name, dates in utils.MAJOR_EVENTS.items()
-    }
+    logger.info("Step 3/4: Detecting sentiment changepoints for each source...")
+    all_sources = pd.unique(bias_df['source'])
+    overall_bias = _weighted_mean(bias_df, bias_df['source'], column)
+    weekly_matrix = weekly_bias_matrix(bias_df, column)
 
+    # Weekly bias between each source's first and last article. Fill missing weeks.
+    weekly_series = {}
     for source in all_sources:
-        source_df = df[df['source'] == source].copy()
-        
-        # Resample bias score weekly to find trends. Fill missing weeks.
-        weekly_bias = source_df.set_index('date_published')['bias_score'].resample('W').mean().fillna(0)
-        
+        source_weeks = weekly_matrix[source]
+        weekly_bias = source_weeks.loc[source_weeks.first_valid_index():source_weeks.last_valid_index()].fillna(0)
         if len(weekly_bias) < 10: # Not enough data to analyze
             continue
-            
-        # Changepoint detection using the Ruptures library
-        points = weekly_bias.values.reshape(-1, 1)
-        algo = rpt.Pelt(model="rbf").fit(points)
-        # We'll consider up to 5 major changepoints per source
-        result_indices = algo.predict(pen=3) 
+        weekly_series[source] = weekly_bias
+
+    tasks = [(source, series.values, changepoint_config) for source, series in weekly_series.items()]
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1 or len(tasks) <= 1:
+        detected = dict(map(_detect_source_changepoints, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=utils.process_context()) as executor:
+            detected = dict(executor.map(_detect_source_changepoints, tasks))
+
+    if events is None:
+        events = event_store.load_event_catalogue()
+
+    analysis_results = {}
+    for source, weekly_bias in weekly_series.items():
+        changepoint_dates = [weekly_bias.index[cp['index']] for cp in detected[source]]
+        # All events that started within the lag window before each changepoint, closest first
+        nearby_events = event_store.find_events_near(
+            events, changepoint_dates, lag_days=event_lag_days, max_events=max_correlated_events
+        )
 
         changepoints = []
-        if len(result_indices) > 1:
-            # The last index is the end of the series, so we ignore it
-            for cp_idx in result_indices[:-1]:
-                changepoint_date = weekly_bias.index[cp_idx]
-                correlated_event = "None"
-                
-                # Check if this changepoint happened within 90 days AFTER a major event started
-                for event, (start_date, end_date) in events_dt.items():
-                    if start_date <= changepoint_date <= start_date + pd.Timedelta(days=90):
-                        correlated_event = event
-                        break
-                
-                changepoints.append({
-                    "date": changepoint_date,
-                    "correlated_event": correlated_event
-                })
+        for cp, changepoint_date, matched in zip(detected[source], changepoint_dates, nearby_events):
+            changepoints.append({
+                "date": changepoint_date,
+                "correlated_event": matched[0]['event'] if matched else "None",
+                "correlated_events": matched,
+                "segment_mean_before": cp['segment_mean_before'],
+                "segment_mean_after": cp['segment_mean_after'],
+                "magnitude": cp['magnitude'],
+            })
 
         analysis_results[source] = {
-            "overall_bias_score": source_df['bias_score'].mean(),
+            "overall_bias_score": overall_bias[source],
             "changepoints": changepoints
         }
-        
-    print("Step 4/4: Finalizing analysis...")
-    print("Bias and event analysis complete.")
-    return analysis_results
\ No newline at end of file
+
+    logger.info("Step 4/4: Finalizing analysis...")
+    logger.info("Bias and event analysis complete.")
+    return analysis_results
@@ -0,0 +1,238 @@
+# src/baseline.py
+import logging
+import os
+import numpy as np
+import pandas as pd
+from . import cube as sentiment_cube
+
+logger = logging.getLogger(__name__)
+
+# The regional baseline of the bias analysis is kept as running count / sum / sum of squares of
+# vader_sentiment per (region, topic, month) bucket, with months numbered year * 12 + month - 1.
+# Baselines for any window are derived from the buckets, so new articles only change the buckets
+# of their own months and only the (region, topic) series containing them are recomputed.
+BUCKET_KEYS = ['region', 'topic', 'month']
+SERIES_KEYS = ['region', 'topic']
+MEASURES = sentiment_cube.CUBE_MEASURES
+BASELINE_COLUMNS = ['baseline_count', 'baseline_mean', 'baseline_std']
+
+# 'month': the bucket's own calendar month; 'rolling': the trailing `rolling_months` months;
+# 'ewma': every month so far, weighted down by half every `halflife` months
+WINDOWS = ['month', 'rolling', 'ewma']
+DEFAULT_CONFIG = {'window': 'month', 'rolling_months': 3, 'halflife': 3.0}
+
+
+def month_numbers(dates):
+    return (dates.dt.year * 12 + dates.dt.month - 1).astype(np.int32)
+
+
+def buckets_from(df):
+    """Bucket totals of article-level data or of a sentiment cube (see cube.py)."""
+    if sentiment_cube.is_cube(df):
+        cells = df[['region', 'topic'] + MEASURES].copy()
+        cells['month'] = month_numbers(df['date'])
+    else:
+        sentiment = df['vader_sentiment'].astype(np.float64)
+        cells = pd.DataFrame({
+            'region': df['region'], 'topic': df['topic'], 'month': month_numbers(df['date_published']),
+            'count': 1, 'sentiment_sum': sentiment, 'sentiment_sumsq': sentiment * sentiment,
+        })
+    # Plain strings, so buckets from different runs align whatever categories each one had
+    cells['region'] = cells['region'].astype(object)
+    # Articles without a region or topic have no baseline
+    buckets = cells.groupby(BUCKET_KEYS, observed=True)[MEASURES].sum()
+    return buckets.astype({'count': np.float64}).sort_index()
+
+
+def _window_totals(buckets, config):
+    """Measures summed over each bucket's window. `buckets` is sorted by BUCKET_KEYS."""
+    values = buckets[MEASURES].to_numpy(dtype=np.float64)
+    if config['window'] == 'month':
+        return values
+
+    series = buckets.groupby(level=SERIES_KEYS, observed=True, sort=False).ngroup().to_numpy()
+    months = buckets.index.get_level_values('month').to_numpy(dtype=np.int64)
+    if config['window'] == 'rolling':
+        # Window totals as differences of running totals: for each bucket, subtract everything
+        # up to `rolling_months` months before it (but not from an earlier series)
+        running = np.vstack([np.zeros((1, len(MEASURES))), np.cumsum(values, axis=0)])
+        keys = series.astype(np.int64) << 32 | months
+        window_start = np.searchsorted(keys, keys - config['rolling_months'], side='right')
+        series_start = np.searchsorted(series, series, side='left')
+        start = np.maximum(window_start, series_start)
+        return running[np.arange(1, len(values) + 1)] - running[start]
+
+    if config['window'] == 'ewma':
+        decay = 0.5 ** (1.0 / config['halflife'])
+        totals = np.empty_like(values)
+        state = np.zeros((series.max() + 1, len(MEASURES)))
+        last_month = np.zeros(series.max() + 1, dtype=np.int64)
+        # One step per calendar month; within a month every series has at most one bucket
+        order = np.argsort(months, kind='stable')
+        bounds = np.flatnonzero(np.diff(months[order])) + 1
+        for rows in np.split(order, bounds):
+            s = series[rows]
+            state[s] = values[rows] + state[s] * (decay ** (months[rows] - last_month[s]))[:, None]
+            last_month[s] = months[rows]
+            totals[rows] = state[s]
+        return totals
+
+    raise ValueError(f"Unknown baseline window '{config['window']}' (expected one of {WINDOWS})")
+
+
+def compute_baselines(buckets, config=None):
+    """
+    Baseline count, mean and std of vader_sentiment per bucket under the window in `config`
+    (see DEFAULT_CONFIG). With 'ewma', the count is the decayed (effective) article count.
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    totals = _window_totals(buckets, config)
+    count, total, total_sq = totals[:, 0], totals[:, 1], totals[:, 2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+        variance = np.where(count > 1, (total_sq - total * mean) / (count - 1), np.nan)
+    return pd.DataFrame({
+        'baseline_count': count,
+        'baseline_mean': mean,
+        'baseline_std': np.sqrt(np.clip(variance, 0, None)),
+    }, index=buckets.index)
+
+
+class BaselineState:
+    """
+    Bucket totals and the baselines derived from them under one window `config`. `add` folds in
+    new articles; `sync` replaces the totals with those of the whole corpus (e.g. the sentiment
+    cube). Either way only the (region, topic) series whose buckets changed are recomputed.
+    Persisted with save and load, so a daily refresh only recomputes what the new days touched.
+    """
+
+    def __init__(self, config=None, table=None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        if self.config['window'] not in WINDOWS:
+            raise ValueError(f"Unknown baseline window '{self.config['window']}' (expected one of {WINDOWS})")
+        if table is None:
+            index = pd.MultiIndex.from_arrays([pd.Series([], dtype=object), pd.Series([], dtype=np.int16),
+                                               pd.Series([], dtype=np.int32)], names=BUCKET_KEYS)
+            table = pd.DataFrame(columns=MEASURES + BASELINE_COLUMNS, index=index, dtype=np.float64)
+        self.table = table
+
+    @classmethod
+    def from_data(cls, df, config=None):
+        state = cls(config)
+        state.sync(df)
+        return state
+
+    def __len__(self):
+        return len(self.table)
+
+    def _update(self, buckets, changed):
+        # Recomputes the baselines of the series that have a changed bucket, and keeps the others
+        if not changed.any():
+            self.table = buckets.join(self.table[BASELINE_COLUMNS])
+            return 0
+        series = buckets.index.droplevel('month')
+        changed_series = series[changed].unique()
+        recompute = series.isin(changed_series)
+        baselines = self.table[BASELINE_COLUMNS].reindex(buckets.index)
+        baselines.loc[recompute] = compute_baselines(buckets[recompute], self.config).to_numpy()
+        self.table = buckets.join(baselines)
+        logger.info(f"Baselines: {int(changed.sum())} of {len(buckets)} buckets changed, "
+                    f"{len(changed_series)} (region, topic) series recomputed.")
+        return int(changed.sum())
+
+    def add(self, df):
+        """Adds new articles (or a cube of them) to their buckets. Returns the number of changed buckets."""
+        new = buckets_from(df)
+        buckets = self.table[MEASURES].add(new, fill_value=0).sort_index()
+        return self._update(buckets, buckets.index.isin(new.index))
+
+    def sync(self, df):
+        """
+        Replaces the bucket totals with those of `df`, the whole corpus as articles or as a
+        sentiment cube. Returns the number of buckets that changed.
+        """
+        buckets = buckets_from(df)
+        previous = self.table[MEASURES].reindex(buckets.index)
+        changed = ~np.isclose(previous.to_numpy(), buckets.to_numpy(), rtol=1e-12, atol=1e-9).all(axis=1)
+        # A bucket that disappeared changes the windows of its series' later buckets
+        removed = self.table.index.difference(buckets.index)
+        if len(removed):
+            gone = removed.droplevel('month').unique()
+            changed |= buckets.index.droplevel('month').isin(gone)
+        return self._update(buckets, changed)
+
+    def baselines(self):
+        """Baseline count, mean and std per (region, topic, month) bucket."""
+        return self.table[BASELINE_COLUMNS]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        table = self.table.reset_index()
+        table.attrs = {'baseline_config': self.config}
+        tmp_path = path + '.tmp'
+        table.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, config=None):
+        """
+        The state saved at `path`. If it was saved with a different window `config`, only its
+        bucket totals are kept and every baseline is recomputed.
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Baseline state not found at {path}")
+        table = pd.read_parquet(path)
+        saved_config = table.attrs.get('baseline_config', DEFAULT_CONFIG)
+        table = table.astype({'region': object}).set_index(BUCKET_KEYS)
+        if config is None or {**DEFAULT_CONFIG, **config} == saved_config:
+            return cls(saved_config, table)
+        logger.info("Baseline window changed since the state was saved; recomputing every baseline.")
+        state = cls(config)
+        buckets = table[MEASURES]
+        state._update(buckets, np.ones(len(buckets), dtype=bool))
+        return state
+
+
+def update_state(path, df, config=None, rebuild=False):
+    """
+    Brings the baseline state at `path` up to date with `df` (the whole corpus, as articles or
+    as a sentiment cube) and saves it. Returns the state.
+    """
+    if rebuild or not os.path.exists(path):
+        state = BaselineState(config)
+    else:
+        state = BaselineState.load(path, config)
+    state.sync(df)
+    state.save(path)
+    return state
+
+
+def score(df, baselines):
+    """
+    Joins each article's (or cube cell's) baseline from `baselines` (see BaselineState.baselines)
+    and adds its bias score: the difference from the baseline mean, and as a z-score, divided by
+    the baseline std. For cube cells both are those of the cell's mean sentiment, so their
+    count-weighted means equal the articles' mean scores. Rows without a baseline are dropped.
+    """
+    if sentiment_cube.is_cube(df):
+        scored = df[['source', 'region', 'topic', 'count']].copy()
+        scored['date_published'] = df['date']
+        sentiment = df['sentiment_sum'] / df['count']
+    else:
+        scored = df[['source', 'region', 'topic', 'date_published', 'vader_sentiment']].copy()
+        sentiment = df['vader_sentiment'].astype(np.float64)
+
+    keys = pd.MultiIndex.from_arrays(
+        [df['region'].astype(object), df['topic'], month_numbers(scored['date_published'])], names=BUCKET_KEYS
+    )
+    positions = baselines.index.get_indexer(keys)
+    found = positions >= 0
+    matched = baselines.to_numpy()[np.where(found, positions, 0)]
+    mean = np.where(found, matched[:, 1], np.nan)
+    std = np.where(found, matched[:, 2], np.nan)
+    scored['baseline_sentiment'] = mean
+    scored['baseline_std'] = std
+    scored['bias_score'] = sentiment.to_numpy() - mean
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scored['bias_zscore'] = np.where(std > 0, scored['bias_score'].to_numpy() / std, np.nan)
+    return scored.dropna(subset=['bias_score'])
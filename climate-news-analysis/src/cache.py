@@ -0,0 +1,222 @@
+# src/cache.py
+import logging
+import hashlib
+import inspect
+import json
+import os
+import threading
+import pandas as pd
+from . import ingest, utils, schema
+
+logger = logging.getLogger(__name__)
+
+# Cached stages in pipeline order, and the stage whose results each one reads. Sentiment and
+# topics both start from the preprocessed articles, so they can run at the same time.
+STAGES = ['ingest', 'preprocess', 'sentiment', 'topics']
+UPSTREAM = {'preprocess': 'ingest', 'sentiment': 'preprocess', 'topics': 'preprocess'}
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def downstream_stages(stage):
+    """`stage` and every cached stage that reads its results, directly or indirectly."""
+    stages = {stage}
+    for other in STAGES:
+        if UPSTREAM.get(other) in stages:
+            stages.add(other)
+    return stages
+
+
+def fingerprint(modules=(), config=None, upstream=None):
+    """Hashes the source of the modules implementing a stage, its config and the upstream fingerprint."""
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(inspect.getsource(module).encode('utf-8'))
+    digest.update(json.dumps(config or {}, sort_keys=True, default=str).encode('utf-8'))
+    digest.update((upstream or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+class PipelineCache:
+    """
+    Per-article stage cache stored as Parquet files in `cache_dir`.
+
+    Each stage file holds one row per article the stage has seen, keyed by `article_id`,
+    with the stage's output columns and a `_kept` flag for articles the stage filtered out.
+    A stage's results are reused only while its fingerprint (code, config and upstream
+    fingerprint) is unchanged.
+    """
+
+    def __init__(self, cache_dir, force=False, from_stage=None):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.manifest = {'files': {}, 'stages': {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+        self.invalidated = set()
+        if force:
+            self.invalidated.update(STAGES)
+        elif from_stage is not None:
+            self.invalidated.update(downstream_stages(from_stage))
+
+        self.fingerprints = {}
+        self.stats = {}
+        # Stages may run in parallel threads; the manifest is written by one at a time
+        self._lock = threading.Lock()
+
+    def invalidate(self, stage):
+        self.invalidated.update(downstream_stages(stage))
+
+    def _stage_path(self, stage):
+        return os.path.join(self.cache_dir, f'{stage}.parquet')
+
+    def stage_fingerprint(self, stage):
+        """Fingerprint of `stage`'s results; for a stage not run this time, as it was last recorded."""
+        return self.fingerprints.get(stage) or self.manifest['stages'].get(stage)
+
+    def _upstream(self, stage):
+        return self.stage_fingerprint(UPSTREAM.get(stage))
+
+    def _is_valid(self, stage, stage_fingerprint):
+        return (
+            stage not in self.invalidated
+            and self.manifest['stages'].get(stage) == stage_fingerprint
+            and os.path.exists(self._stage_path(stage))
+        )
+
+    def _commit(self, stage, stage_fingerprint, cached):
+        cached.to_parquet(self._stage_path(stage), index=False)
+        with self._lock:
+            self.manifest['stages'][stage] = stage_fingerprint
+            self.fingerprints[stage] = stage_fingerprint
+            tmp_path = self.manifest_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+    def load_articles(self, data_folder):
+        """Ingests only new or changed .jsonl files, reusing cached rows for unchanged ones."""
+        stage = 'ingest'
+        stage_fingerprint = fingerprint([ingest, utils])
+        filenames = ingest.list_source_files(data_folder)
+        hashes = {f: file_hash(os.path.join(data_folder, f)) for f in filenames}
+
+        cached = None
+        known_hashes = {}
+        if self._is_valid(stage, stage_fingerprint):
+            cached = pd.read_parquet(self._stage_path(stage))
+            known_hashes = self.manifest['files']
+
+        unchanged = [f for f in filenames if known_hashes.get(f) == hashes[f]]
+        changed = [f for f in filenames if known_hashes.get(f) != hashes[f]]
+
+        parts = []
+        if cached is not None and unchanged:
+            unchanged_sources = [f[:-len('.jsonl')] for f in unchanged]
+            parts.append(cached[cached['source'].isin(unchanged_sources)])
+        if changed:
+            parts.append(utils.add_article_ids(ingest.load_all_articles(data_folder, filenames=changed)))
+        if not parts:
+            raise ValueError("No articles were loaded. Check the data directory and file format.")
+
+        # Restore file order so downstream "keep first" deduplication does not depend on what was cached
+        df = pd.concat(parts, ignore_index=True)
+        file_order = {f[:-len('.jsonl')]: i for i, f in enumerate(filenames)}
+        df = df.sort_values('source', key=lambda s: s.astype(str).map(file_order), kind='stable', ignore_index=True)
+        # Byte-identical articles share an id; keep one so ids stay unique
+        df = df.drop_duplicates(subset='article_id', ignore_index=True)
+        # Concatenating frames whose categoricals differ falls back to object columns
+        schema.apply_schema(df)
+        self.stats[stage] = {'hits': len(unchanged), 'misses': len(changed), 'unit': 'files'}
+
+        if changed or cached is None or len(df) != len(cached):
+            self.manifest['files'] = hashes
+            self._commit(stage, stage_fingerprint, df)
+        else:
+            self.fingerprints[stage] = stage_fingerprint
+        return df
+
+    def run(self, stage, df, func, columns, modules=(), config=None, row_wise=True):
+        """
+        Applies `func` to the articles in `df` that have no cached result for `stage`, and merges
+        the output `columns` of cached and freshly computed articles back in the original order.
+
+        `func` takes and returns a DataFrame; it may drop rows. Stages that are not row-wise
+        (e.g. topic modeling, which fits on the whole corpus) are reused only when the exact
+        same set of articles was cached, and are otherwise recomputed for every article.
+
+        `config` may be a function returning the config. It is called again before the results
+        are stored, for stages that change their own config while they run (e.g. by saving a
+        new topic model).
+        """
+        resolve_config = config if callable(config) else lambda: config
+        stage_fingerprint = fingerprint(modules, resolve_config(), self._upstream(stage))
+        cached = None
+        if self._is_valid(stage, stage_fingerprint):
+            cached = pd.read_parquet(self._stage_path(stage)).set_index('article_id')
+
+        if cached is None:
+            hit = pd.Series(False, index=df.index)
+        elif row_wise:
+            hit = df['article_id'].isin(cached.index)
+        else:
+            same_corpus = set(df['article_id']) == set(cached.index)
+            hit = pd.Series(same_corpus, index=df.index)
+
+        n_hits = int(hit.sum())
+        self.stats[stage] = {'hits': n_hits, 'misses': len(df) - n_hits, 'unit': 'articles'}
+
+        parts = []
+        if n_hits:
+            hits_df = df[hit]
+            hits_df = hits_df.drop(columns=[c for c in columns if c in hits_df.columns])
+            hits_df = hits_df.join(cached[columns + ['_kept']], on='article_id')
+            parts.append(hits_df[hits_df['_kept']].drop(columns='_kept'))
+
+        computed = None
+        if n_hits < len(df):
+            misses_df = df[~hit].copy()
+            computed = func(misses_df)
+            parts.append(computed)
+
+        if not parts:
+            return df
+        result = pd.concat(parts).sort_index(kind='stable') if len(parts) > 1 else parts[0]
+        # Concatenation and Parquet round trips can lose the compact dtypes; restore them
+        schema.apply_schema(result)
+
+        if computed is not None:
+            miss_ids = df.loc[~hit, 'article_id']
+            new_entries = pd.DataFrame({'article_id': miss_ids.values})
+            new_entries = new_entries.join(computed.set_index('article_id')[columns], on='article_id')
+            new_entries['_kept'] = miss_ids.isin(computed['article_id']).values
+            if cached is not None and row_wise:
+                # Keep cached results for articles not in this run; they may come back later
+                old_entries = cached[~cached.index.isin(miss_ids)].reset_index()
+                new_entries = pd.concat([old_entries, new_entries], ignore_index=True)
+            if callable(config):
+                stage_fingerprint = fingerprint(modules, config(), self._upstream(stage))
+            self._commit(stage, stage_fingerprint, new_entries)
+        else:
+            self.fingerprints[stage] = stage_fingerprint
+
+        return result
+
+    def report(self):
+        logger.info("--- Pipeline Cache Report ---")
+        logger.info(f"{'Stage':<12} {'Hits':>10} {'Misses':>10}  Unit")
+        for stage in STAGES:
+            if stage in self.stats:
+                s = self.stats[stage]
+                logger.info(f"{stage:<12} {s['hits']:>10} {s['misses']:>10}  {s['unit']}")
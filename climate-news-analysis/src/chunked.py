@@ -0,0 +1,172 @@
+# src/chunked.py
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from tqdm import tqdm
+from . import ingest, preprocess, sentiment, topics, utils, schema, cube
+
+logger = logging.getLogger(__name__)
+
+# Out-of-core mode: articles are streamed through ingest -> clean -> dedup -> VADER -> topics in
+# fixed-size batches and appended to a Parquet dataset partitioned by source and year. Only one
+# batch is in memory at a time; aggregation reads the dataset back column- and partition-wise.
+PARTITION_COLUMNS = utils.PARTITION_COLUMNS
+DEFAULT_BATCH_SIZE = 50000
+
+# Keeps each "IN (...)" lookup below SQLite's limit on query parameters
+_LOOKUP_CHUNK = 500
+
+
+class SeenHashes:
+    """
+    Persistent set of cleaned-body hashes (see utils.hash_text_series) in a SQLite file, so
+    exact duplicates are found across batches and runs without holding every hash in memory.
+    Across batches a matching 64-bit hash counts as a duplicate without comparing the texts.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen (hash INTEGER PRIMARY KEY)')
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def unseen(self, hashes):
+        """Mask of the hashes not in the set yet."""
+        # SQLite integers are signed, so the uint64 hashes are stored by their int64 bit pattern
+        keys = np.asarray(hashes, dtype=np.uint64).view(np.int64)
+        found = []
+        for i in range(0, len(keys), _LOOKUP_CHUNK):
+            chunk = keys[i:i + _LOOKUP_CHUNK].tolist()
+            placeholders = ','.join('?' * len(chunk))
+            found.extend(row[0] for row in self.conn.execute(
+                f'SELECT hash FROM seen WHERE hash IN ({placeholders})', chunk
+            ))
+        return ~np.isin(keys, np.asarray(found, dtype=np.int64))
+
+    def add(self, hashes):
+        keys = np.asarray(hashes, dtype=np.uint64).view(np.int64)
+        self.conn.executemany('INSERT OR IGNORE INTO seen VALUES (?)', ((key,) for key in keys.tolist()))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def reset(dataset_path, hashes_path):
+    """Removes the dataset and the hash set, so the next run starts from scratch."""
+    if os.path.exists(dataset_path):
+        shutil.rmtree(dataset_path)
+    if os.path.exists(hashes_path):
+        os.remove(hashes_path)
+
+
+def _rebatch(tables, batch_size):
+    """Regroups the streamed tables into batches of exactly `batch_size` rows (the last may be smaller)."""
+    pending, rows = [], 0
+    for table in tables:
+        pending.append(table)
+        rows += table.num_rows
+        while rows >= batch_size:
+            combined = pa.concat_tables(pending)
+            pending, rows = [combined.slice(0, batch_size), combined.slice(batch_size)], rows - batch_size
+            del combined
+            # Popped rather than held in a local, so the batch is freed as soon as the caller drops it
+            yield pending.pop(0)
+    if rows:
+        yield pa.concat_tables(pending)
+
+
+def _write_batch(df, dataset_path, basename):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_to_dataset(
+        table, dataset_path, partition_cols=PARTITION_COLUMNS,
+        basename_template=f'{basename}-{{i}}.parquet', existing_data_behavior='overwrite_or_ignore',
+        row_group_size=utils.ROW_GROUP_SIZE,
+        **utils.parquet_write_options([c for c in table.column_names if c not in PARTITION_COLUMNS])
+    )
+
+
+def run_chunked(data_folder, dataset_path, hashes_path, batch_size=DEFAULT_BATCH_SIZE, n_jobs=1,
+                topic_model=None, embeddings_folder=None):
+    """
+    Runs ingestion, cleaning, exact deduplication, VADER scoring and topic assignment batch by
+    batch, appending the results to the partitioned dataset at `dataset_path`. Articles whose
+    cleaned body was written by an earlier batch or run are skipped, so rerunning after new
+    articles arrive only adds those. Topics come from the saved `topic_model` when there is one
+    (a model cannot be fitted one batch at a time); otherwise every article gets topic -1.
+    """
+    os.makedirs(dataset_path, exist_ok=True)
+    seen = SeenHashes(hashes_path)
+    run_id = time.strftime('%Y%m%d-%H%M%S')
+    stats = {}
+    totals = {'read': 0, 'kept': 0, 'duplicates': 0, 'written': 0}
+
+    batches = _rebatch(ingest.stream_article_batches(data_folder, stats=stats), batch_size)
+    for batch_no, table in enumerate(tqdm(batches, desc="Chunked batches", disable=not logger.isEnabledFor(logging.INFO))):
+        df = utils.add_article_ids(ingest.table_to_frame(table))
+        del table
+        totals['read'] += len(df)
+
+        df = preprocess.clean_articles(df, n_jobs=n_jobs)
+        totals['kept'] += len(df)
+        n_kept = len(df)
+        df = preprocess.drop_duplicate_articles(df)
+        hashes = utils.hash_text_series(df['cleaned_body'])
+        new = seen.unseen(hashes)
+        df = df[new]
+        totals['duplicates'] += n_kept - len(df)
+
+        if len(df):
+            df = sentiment.apply_vader(df, n_jobs=n_jobs)
+            if topic_model is None:
+                df['topic'] = np.full(len(df), -1, dtype=np.int16)
+            else:
+                embeddings = topics.compute_embeddings(df, embeddings_folder) if embeddings_folder else None
+                df = topics.assign_topics(df, topic_model, embeddings)
+            df['year'] = df['date_published'].dt.year
+            _write_batch(df, dataset_path, f'part-{run_id}-{batch_no:05d}')
+            totals['written'] += len(df)
+        # Hashes are only recorded once their articles are on disk
+        seen.add(hashes[new])
+        del df
+
+    ingest.report_ingest_stats(stats)
+    logger.info(f"Chunked run complete: {totals['read']} articles read, {totals['kept']} kept after cleaning, "
+                f"{totals['duplicates']} duplicates skipped, {totals['written']} written to {dataset_path}.")
+    seen.close()
+    return totals
+
+
+def _dataset(dataset_path):
+    # Dictionary-encoded partition values come back as categoricals, like the in-memory frame
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+    return ds.dataset(dataset_path, format='parquet', partitioning=partitioning)
+
+
+def read_articles(dataset_path, columns=None, filter=None):
+    """
+    Reads `columns` of the articles matching `filter` (a pyarrow.dataset expression, e.g.
+    ds.field('year') >= 2015) from the partitioned dataset. Partitions and row groups the
+    filter excludes are skipped without being read.
+    """
+    table = _dataset(dataset_path).to_table(columns=columns, filter=filter)
+    return schema.apply_schema(table.to_pandas(types_mapper=schema.arrow_types_mapper))
+
+
+def build_dataset_cube(dataset_path, filter=None, merge_every=16):
+    """Builds the sentiment cube (see cube.py) one record batch at a time from the dataset."""
+    cubes = []
+    for batch in _dataset(dataset_path).to_batches(columns=cube.ARTICLE_COLUMNS, filter=filter):
+        cubes.append(cube.build_cube(batch.to_pandas()))
+        if len(cubes) >= merge_every:
+            cubes = [cube.merge_cubes(*cubes)]
+    if not cubes:
+        raise ValueError(f"No articles found in {dataset_path}.")
+    return schema.apply_schema(cube.merge_cubes(*cubes))
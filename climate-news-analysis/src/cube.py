@@ -0,0 +1,83 @@
+# src/cube.py
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# One cube cell per source/country/region/topic/day holds the article count and the sum and
+# sum of squares of vader_sentiment. Means and variances for any roll-up are derived from these.
+CUBE_DIMENSIONS = ['source', 'country', 'region', 'topic', 'date']
+CUBE_MEASURES = ['count', 'sentiment_sum', 'sentiment_sumsq']
+# The article columns build_cube reads
+ARTICLE_COLUMNS = ['source', 'country', 'region', 'topic', 'date_published', 'vader_sentiment']
+
+
+def is_cube(df):
+    return all(column in df.columns for column in CUBE_MEASURES)
+
+
+def build_cube(df):
+    """Builds the cube from article-level data in a single grouped pass."""
+    # Sums are accumulated in float64 even though the article scores are stored as float32
+    sentiment = df['vader_sentiment'].astype(np.float64)
+    cells = pd.DataFrame({
+        'source': df['source'],
+        'country': df['country'],
+        'region': df['region'],
+        'topic': df['topic'],
+        'date': df['date_published'].dt.normalize(),
+        'count': 1,
+        'sentiment_sum': sentiment,
+        'sentiment_sumsq': sentiment * sentiment,
+    })
+    return cells.groupby(CUBE_DIMENSIONS, observed=True, dropna=False)[CUBE_MEASURES].sum().reset_index()
+
+
+def as_cube(df):
+    """Returns `df` unchanged if it already is a cube, otherwise builds one from the articles."""
+    return df if is_cube(df) else build_cube(df)
+
+
+def merge_cubes(*cubes):
+    """Merges cubes, e.g. the stored cube and one built from newly added days of articles."""
+    combined = pd.concat(cubes, ignore_index=True)
+    return combined.groupby(CUBE_DIMENSIONS, observed=True, dropna=False)[CUBE_MEASURES].sum().reset_index()
+
+
+def update_cube(cube, new_articles):
+    return merge_cubes(cube, build_cube(new_articles))
+
+
+def rollup(cube, by=None, freq=None):
+    """
+    Re-aggregates the cube by the `by` dimensions and, optionally, by period (`freq`, e.g. 'W',
+    'M', 'Q'). Returns count, mean and std of vader_sentiment per group.
+    """
+    keys = list(by or [])
+    if freq is not None:
+        keys.append(pd.Grouper(key='date', freq=freq))
+    if not keys:
+        keys = [np.zeros(len(cube), dtype=np.int8)]  # one group: the grand total
+    totals = cube.groupby(keys, observed=True)[CUBE_MEASURES].sum()
+
+    count = totals['count']
+    mean = totals['sentiment_sum'] / count.where(count > 0)
+    variance = (totals['sentiment_sumsq'] - totals['sentiment_sum'] * mean) / (count - 1).where(count > 1)
+    return pd.DataFrame({
+        'count': count,
+        'mean': mean,
+        'std': np.sqrt(variance.clip(lower=0)),
+    })
+
+
+def save_cube(cube, path):
+    logger.info(f"Saving sentiment cube ({len(cube)} cells) to {path}...")
+    cube.to_parquet(path, index=False)
+
+
+def load_cube(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Cube not found at {path}")
+    return pd.read_parquet(path)
@@ -0,0 +1,273 @@
+# src/dag.py
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    One step of the pipeline graph. `func(*inputs)` receives the values named in `inputs` and
+    returns the values named in `outputs` (a tuple if there are several, None if there are none).
+
+    CPU-bound stages that hold the GIL can use executor='process'; their function and inputs
+    must then be picklable. `load`, if given, re-creates the outputs from what the stage saved
+    to disk, so later stages can run without re-running this one (after --resume or --only).
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), executor='thread', load=None):
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor '{executor}' for stage '{name}'")
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.executor = executor
+        self.load = load
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+
+def _graph(stages):
+    """Maps each stage to the stages producing its inputs. Raises on unknown inputs and cycles."""
+    producers = {}
+    for stage in stages.values():
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"'{output}' is produced by both '{producers[output]}' and '{stage.name}'")
+            producers[output] = stage.name
+
+    deps = {}
+    for stage in stages.values():
+        missing = [i for i in stage.inputs if i not in producers]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' needs {missing}, which no stage produces")
+        deps[stage.name] = {producers[i] for i in stage.inputs}
+
+    # Depth-first search for cycles
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Cycle in the pipeline graph: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for dep in deps[name]:
+            visit(dep, path + [name])
+        state[name] = 'done'
+
+    for name in stages:
+        visit(name, [])
+    return deps
+
+
+def ancestors(deps, names):
+    """`names` and every stage they depend on, directly or indirectly."""
+    result, todo = set(), list(names)
+    while todo:
+        name = todo.pop()
+        if name not in result:
+            result.add(name)
+            todo.extend(deps[name])
+    return result
+
+
+def config_fingerprint(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _load_state(state_path):
+    if state_path and os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+
+def _save_state(state_path, state):
+    if not state_path:
+        return
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def plan(stages, only=None, until=None, completed=()):
+    """
+    Splits the graph into the stages to run and the stages whose outputs are loaded from disk.
+    `until` selects a stage and everything it depends on; `only` selects exactly the given
+    stages. Completed stages (from a resumed run) are not selected. Outside the selection,
+    stages whose outputs are needed are loaded if they can be, and otherwise run as well.
+    """
+    deps = _graph(stages)
+    for name in list(only or []) + ([until] if until else []):
+        if name not in stages:
+            raise ValueError(f"Unknown stage '{name}'")
+
+    if only:
+        selected = set(only)
+    elif until:
+        selected = ancestors(deps, [until])
+    else:
+        selected = set(stages)
+    selected -= set(completed)
+
+    to_run, to_load = set(), set()
+    todo = list(selected)
+    while todo:
+        name = todo.pop()
+        if name in to_run:
+            continue
+        to_run.add(name)
+        for dep in deps[name]:
+            if dep in to_run or dep in to_load:
+                continue
+            if dep not in selected and stages[dep].load is not None:
+                to_load.add(dep)
+            else:
+                # Outputs that only ever lived in memory have to be computed again
+                todo.append(dep)
+    return deps, to_run, to_load
+
+
+def _row_count(values):
+    for value in values:
+        if hasattr(value, 'shape'):
+            return value.shape[0]
+    return None
+
+
+@contextmanager
+def _unmeasured(name, rows_in=None):
+    yield {'rows_in': rows_in, 'rows_out': None}
+
+
+def run_dag(stages, only=None, until=None, max_workers=None, state_path=None, resume=False,
+            config=None, run_metrics=None):
+    """
+    Runs a list of Stages, each as soon as the stages it depends on have finished, with up to
+    `max_workers` stages at a time. Values no remaining stage needs are released as soon as
+    possible. Completed stages are recorded in `state_path`; with `resume`, a run with the same
+    `config` that did not finish skips them. On failure no new stage is started, the running
+    ones are allowed to finish and the first error is re-raised.
+    Returns the values of the outputs that are still held, i.e. those no stage consumed.
+    """
+    stages = {stage.name: stage for stage in stages}
+    fingerprint = config_fingerprint(config or {})
+
+    completed = []
+    previous = _load_state(state_path) if resume else None
+    if previous and not previous.get('finished') and previous.get('config') == fingerprint:
+        completed = [name for name in previous['completed'] if name in stages]
+        if completed:
+            logger.info(f"Resuming: skipping completed stage(s) {', '.join(completed)}.")
+    elif resume:
+        logger.info("Nothing to resume (no unfinished run with these settings); running every selected stage.")
+
+    deps, to_run, to_load = plan(stages, only=only, until=until, completed=completed)
+    state = {'config': fingerprint, 'completed': list(completed), 'finished': False}
+    _save_state(state_path, state)
+    if not to_run:
+        logger.info("No stages to run.")
+        return {}
+
+    values = {}
+    for name in sorted(to_load):
+        logger.info(f"Loading the saved outputs of stage '{name}'...")
+        loaded = stages[name].load()
+        outputs = stages[name].outputs
+        values.update(zip(outputs, loaded if len(outputs) > 1 else (loaded,)))
+
+    # How many of the stages still to run read each value, so it can be dropped after the last one
+    readers = {}
+    for name in to_run:
+        for i in stages[name].inputs:
+            readers[i] = readers.get(i, 0) + 1
+
+    if max_workers is None:
+        max_workers = min(4, os.cpu_count() or 1)
+    measure = run_metrics.stage if run_metrics is not None else _unmeasured
+    process_pool = None
+    pool_lock = threading.Lock()
+
+    def get_process_pool():
+        nonlocal process_pool
+        with pool_lock:
+            if process_pool is None:
+                process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=utils.process_context())
+            return process_pool
+
+    def execute(stage, args):
+        thread = threading.current_thread()
+        thread_name, thread.name = thread.name, stage.name
+        try:
+            with measure(stage.name, rows_in=_row_count(args)) as record:
+                if stage.executor == 'process':
+                    result = get_process_pool().submit(stage.func, *args).result()
+                else:
+                    result = stage.func(*args)
+                if len(stage.outputs) == 1:
+                    result = (result,)
+                elif not stage.outputs:
+                    result = ()
+                record['rows_out'] = _row_count(result)
+            return result
+        finally:
+            thread.name = thread_name
+
+    pending = set(to_run)
+    running = {}
+    failure = None
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage') as executor:
+        try:
+            while pending or running:
+                if failure is None:
+                    ready = sorted(name for name in pending if not (deps[name] & (pending | set(running.values()))))
+                    for name in ready:
+                        stage = stages[name]
+                        pending.discard(name)
+                        args = tuple(values[i] for i in stage.inputs)
+                        running[executor.submit(execute, stage, args)] = name
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    stage = stages[name]
+                    try:
+                        result = future.result()
+                    except BaseException as e:
+                        logger.error(f"Stage '{name}' failed: {e!r}")
+                        if failure is None:
+                            failure = e
+                        continue
+
+                    values.update(zip(stage.outputs, result))
+                    for i in stage.inputs:
+                        readers[i] -= 1
+                        if readers[i] == 0:
+                            values.pop(i, None)
+                    if name not in state['completed']:
+                        state['completed'].append(name)
+                    _save_state(state_path, state)
+        finally:
+            if process_pool is not None:
+                process_pool.shutdown()
+
+    if failure is not None:
+        logger.error(f"Pipeline stopped. Re-run with --resume to skip the {len(state['completed'])} completed stage(s).")
+        raise failure
+
+    state['finished'] = True
+    _save_state(state_path, state)
+    return values
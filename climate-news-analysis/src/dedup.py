@@ -0,0 +1,203 @@
+# src/dedup.py
+import logging
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5  # words per shingle
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Fixed seed so signatures stay comparable with a persisted index across runs
+_rng = np.random.RandomState(1)
+# a, b < 2**32 and shingle hashes < 2**32 keep a * h + b below 2**64, so nothing overflows
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def _lsh_params(threshold, num_perm=NUM_PERM):
+    """Picks (bands, rows) with bands * rows = num_perm whose S-curve midpoint is closest to the threshold."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        midpoint = (1.0 / bands) ** (1.0 / rows)
+        if best is None or abs(midpoint - threshold) < best[0]:
+            best = (abs(midpoint - threshold), bands, rows)
+    return best[1], best[2]
+
+
+def minhash_signature(text, shingle_size=SHINGLE_SIZE):
+    """MinHash signature (uint32[NUM_PERM]) of the set of word shingles in `text`."""
+    words = text.split()
+    if len(words) <= shingle_size:
+        shingles = {' '.join(words)}
+    else:
+        shingles = {' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def _signature_chunk(texts):
+    return np.vstack([minhash_signature(text) for text in texts])
+
+
+def compute_signatures(texts, n_jobs=1, chunk_size=2000):
+    if not texts:
+        return np.empty((0, NUM_PERM), dtype=np.uint32)
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    if n_jobs == 1 or len(chunks) == 1:
+        return np.vstack([_signature_chunk(chunk) for chunk in chunks])
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=utils.process_context()) as executor:
+        return np.vstack(list(executor.map(_signature_chunk, chunks)))
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index over article texts. Articles whose estimated Jaccard similarity (of word
+    shingles) reaches `threshold` are grouped into clusters; a cluster's id is the article id
+    of its earliest indexed member. The index can be saved and extended with new articles,
+    which only costs work proportional to the new articles.
+    """
+
+    def __init__(self, threshold=0.8, text_fingerprint=None):
+        self.threshold = threshold
+        # Identifies the code that produced the indexed texts; signatures of differently cleaned text do not match
+        self.text_fingerprint = text_fingerprint
+        self.bands, self.rows = _lsh_params(threshold)
+        self.ids = np.empty(0, dtype=np.uint64)
+        self.signatures = np.empty((0, NUM_PERM), dtype=np.uint32)
+        self._parent = []
+        self._position = {}
+        self._buckets = [{} for _ in range(self.bands)]
+
+    def _find(self, i):
+        root = i
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[i] != root:
+            self._parent[i], i = root, self._parent[i]
+        return root
+
+    def _union(self, i, j):
+        root_i, root_j = self._find(i), self._find(j)
+        if root_i != root_j:
+            # The earliest member stays the root, so existing cluster ids are stable
+            self._parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    def _insert(self, start, signatures):
+        for offset, signature in enumerate(signatures):
+            position = start + offset
+            self._parent.append(position)
+            candidates = set()
+            for band in range(self.bands):
+                key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                bucket = self._buckets[band].setdefault(key, [])
+                candidates.update(bucket)
+                bucket.append(position)
+            for candidate in candidates:
+                if self._find(candidate) == self._find(position):
+                    continue
+                similarity = np.mean(self.signatures[candidate] == signature)
+                if similarity >= self.threshold:
+                    self._union(candidate, position)
+
+    def add(self, article_ids, texts, n_jobs=1):
+        """Indexes articles not seen before. Returns the cluster id of every given article."""
+        article_ids = np.asarray(article_ids, dtype=np.uint64)
+        new_mask = np.array([a not in self._position for a in article_ids], dtype=bool)
+        new_ids, first = np.unique(article_ids[new_mask], return_index=True)
+        # np.unique sorts; restore input order so "earliest" means first in the input
+        order = np.argsort(first, kind='stable')
+        new_ids = new_ids[order]
+        new_positions = np.flatnonzero(new_mask)[first[order]]
+        if isinstance(texts, pd.Series):
+            # Only the new articles' texts are materialised as Python strings
+            new_texts = texts.iloc[new_positions].tolist()
+        else:
+            new_texts = [texts[i] for i in new_positions]
+
+        start = len(self.ids)
+        new_signatures = compute_signatures(new_texts, n_jobs=n_jobs)
+        self.ids = np.concatenate([self.ids, new_ids])
+        self.signatures = np.vstack([self.signatures, new_signatures])
+        for offset, article_id in enumerate(new_ids):
+            self._position[int(article_id)] = start + offset
+        self._insert(start, new_signatures)
+
+        return self.cluster_ids(article_ids)
+
+    def cluster_ids(self, article_ids):
+        return np.array(
+            [self.ids[self._find(self._position[int(a)])] for a in article_ids], dtype=np.uint64
+        )
+
+    def save(self, path):
+        np.savez(path, ids=self.ids, signatures=self.signatures,
+                 parent=np.asarray(self._parent, dtype=np.int64), threshold=self.threshold,
+                 text_fingerprint=self.text_fingerprint or '')
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        text_fingerprint = str(data['text_fingerprint']) if 'text_fingerprint' in data else ''
+        index = cls(threshold=float(data['threshold']), text_fingerprint=text_fingerprint or None)
+        index.ids = data['ids']
+        index.signatures = data['signatures']
+        index._parent = data['parent'].tolist()
+        index._position = {int(a): i for i, a in enumerate(index.ids)}
+        # Buckets are cheap to rebuild, so only the signatures and clusters are stored
+        for position, signature in enumerate(index.signatures):
+            for band in range(index.bands):
+                key = signature[band * index.rows:(band + 1) * index.rows].tobytes()
+                index._buckets[band].setdefault(key, []).append(position)
+        return index
+
+
+def drop_near_duplicates(df, threshold=0.8, index_path=None, text_column='cleaned_body',
+                         keep_duplicates=False, n_jobs=1, text_fingerprint=None):
+    """
+    Assigns each article a `dup_cluster` id and, unless `keep_duplicates`, keeps only the
+    earliest article of each near-duplicate cluster. With `index_path`, the LSH index is
+    loaded from and saved back to disk so new articles are matched against earlier runs. A
+    saved index built with another threshold or `text_fingerprint` (e.g. the fingerprint of
+    the cleaning stage) is rebuilt from scratch.
+    """
+    logger.info(f"Detecting near-duplicate articles (threshold={threshold})...")
+    index = None
+    if index_path and os.path.exists(index_path):
+        index = NearDuplicateIndex.load(index_path)
+        if index.threshold != threshold or index.text_fingerprint != text_fingerprint:
+            logger.info("Near-duplicate index was built with other settings or cleaning code; rebuilding it.")
+            index = None
+    if index is None:
+        index = NearDuplicateIndex(threshold=threshold, text_fingerprint=text_fingerprint)
+
+    article_ids = df['article_id'].to_numpy(dtype=np.uint64)
+    clusters = index.add(article_ids, df[text_column], n_jobs=n_jobs)
+    if index_path:
+        index.save(index_path)
+
+    df = df.assign(dup_cluster=clusters)
+    # Keep the earliest indexed member of each cluster that is present in this frame
+    # (the cluster's root may be an article that is no longer in the corpus)
+    positions = pd.Series([index._position[int(a)] for a in article_ids], index=df.index)
+    is_duplicate = positions != positions.groupby(clusters).transform('min')
+    cluster_sizes = pd.Series(clusters).value_counts()
+    logger.info(f"Found {int(is_duplicate.sum())} near-duplicate articles in "
+                f"{int((cluster_sizes > 1).sum())} clusters.")
+
+    if not keep_duplicates:
+        df = df[~is_duplicate]
+    return df
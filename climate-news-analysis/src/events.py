@@ -0,0 +1,65 @@
+# src/events.py
+import numpy as np
+import pandas as pd
+from . import utils
+
+# A changepoint is linked to events that started at most this many days before it
+DEFAULT_LAG_DAYS = 90
+
+EVENT_COLUMNS = ['name', 'start', 'end']
+
+
+def load_event_catalogue(path=None):
+    """
+    Loads an event catalogue as a DataFrame with 'name', 'start' and 'end' columns, sorted by
+    start date. `path` may be a CSV or Parquet file; without one, utils.MAJOR_EVENTS is used.
+    """
+    if path is None:
+        events = pd.DataFrame(
+            [(name, start, end) for name, (start, end) in utils.MAJOR_EVENTS.items()],
+            columns=EVENT_COLUMNS
+        )
+    elif path.endswith('.parquet'):
+        events = pd.read_parquet(path)
+    else:
+        events = pd.read_csv(path)
+
+    missing = [c for c in EVENT_COLUMNS if c not in events.columns]
+    if missing:
+        raise ValueError(f"Event catalogue is missing columns: {missing}")
+
+    events = events[EVENT_COLUMNS].copy()
+    events['start'] = pd.to_datetime(events['start'])
+    events['end'] = pd.to_datetime(events['end'])
+    # The sorted start dates are the index that find_events_near binary-searches
+    return events.sort_values('start', kind='stable', ignore_index=True)
+
+
+def find_events_near(events, dates, lag_days=DEFAULT_LAG_DAYS, max_events=None):
+    """
+    For each date, returns the events that started within `lag_days` before it
+    (start <= date <= start + lag_days), closest first. Uses a binary search over the sorted
+    start dates, so each lookup costs O(log n + matches). `max_events` caps the matches per date.
+    """
+    starts = events['start'].to_numpy()
+    ends = events['end'].to_numpy()
+    names = events['name'].to_numpy()
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+    lower = np.searchsorted(starts, dates - np.timedelta64(lag_days, 'D'), side='left')
+    upper = np.searchsorted(starts, dates, side='right')
+
+    matches = []
+    for date, lo, hi in zip(dates, lower, upper):
+        days_after = (date - starts[lo:hi]) // np.timedelta64(1, 'D')
+        # Later starts are closer; the stable sort keeps catalogue order among equal starts
+        order = lo + np.argsort(days_after, kind='stable')
+        matches.append([
+            {
+                'event': names[i],
+                'start': pd.Timestamp(starts[i]),
+                'end': pd.Timestamp(ends[i]),
+                'days_after_start': int((date - starts[i]) // np.timedelta64(1, 'D')),
+            }
+            for i in order[:max_events]
+        ])
+    return matches
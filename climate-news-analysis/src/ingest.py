@@ -1,38 +1,247 @@
 # src/ingest.py
+import logging
 import pandas as pd
 import os
 import json
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.json as pa_json
 from tqdm import tqdm
+from . import schema
 
-def load_all_articles(data_folder_path):
+logger = logging.getLogger(__name__)
 
-    all_articles = []
-    print(f"Ingesting articles from {data_folder_path}...")
+# orjson is noticeably faster than the standard library, but it is optional
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
-    # Use tqdm for a progress bar
-    for filename in tqdm(os.listdir(data_folder_path), desc="Reading files"):
-        if filename.endswith('.jsonl'):
-            
-            
+# Only these fields are used downstream; everything else in the raw files is dropped
+ARTICLE_FIELDS = ['headline', 'body', 'date_published']
+# large_string is what pandas' Arrow-backed string dtype stores, so converting needs no copy
+ARTICLE_SCHEMA = pa.schema([(field, pa.large_string()) for field in ARTICLE_FIELDS])
+# 'source_offset' is the byte offset of the article's line in its source file, so raw text
+# dropped after cleaning can be read back with read_articles_at
+OUTPUT_SCHEMA = ARTICLE_SCHEMA.append(pa.field('source', pa.string())).append(pa.field('source_offset', pa.int64()))
+
+# Large enough that a single (long) article never straddles two blocks
+READ_BLOCK_SIZE = 16 << 20
+# Articles per table when a file has to be streamed through the line-by-line parser
+STREAM_BATCH_ROWS = 10000
+
+
+def _to_str(value):
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def _iter_line_offsets(file_path):
+    """Byte offsets of the non-blank lines, i.e. of the rows Arrow's JSON reader returns."""
+    position = 0
+    with open(file_path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield position
+            position += len(line)
+
+
+def _iter_file_by_line(file_path, batch_size=None):
+    """
+    Fallback parser for files Arrow rejects. Skips and counts malformed lines.
+    Yields (table, offsets, malformed) for every `batch_size` articles (all at once if None).
+    """
+    columns = {field: [] for field in ARTICLE_FIELDS}
+    offsets = []
+    malformed = 0
+    position = 0
+    with open(file_path, 'rb') as f:
+        for line in f:
+            line_start = position
+            position += len(line)
+            if not line.strip():
+                continue
+            try:
+                article = _json_loads(line)
+            except ValueError:
+                malformed += 1
+                continue
+            if not isinstance(article, dict):
+                malformed += 1
+                continue
+            for field in ARTICLE_FIELDS:
+                columns[field].append(_to_str(article.get(field)))
+            offsets.append(line_start)
+            if len(offsets) == batch_size:
+                yield pa.table(columns, schema=ARTICLE_SCHEMA), offsets, malformed
+                columns = {field: [] for field in ARTICLE_FIELDS}
+                offsets = []
+                malformed = 0
+    if offsets or malformed or batch_size is None:
+        yield pa.table(columns, schema=ARTICLE_SCHEMA), offsets, malformed
+
+
+def _read_file_by_line(file_path):
+    return next(_iter_file_by_line(file_path))
+
+
+def _json_options():
+    return {
+        'read_options': pa_json.ReadOptions(block_size=READ_BLOCK_SIZE),
+        'parse_options': pa_json.ParseOptions(explicit_schema=ARTICLE_SCHEMA, unexpected_field_behavior='ignore'),
+    }
+
+
+def _add_source_columns(table, source_name, offsets):
+    table = table.append_column('source', pa.array([source_name] * table.num_rows, pa.string()))
+    return table.append_column('source_offset', pa.array(offsets, pa.int64()))
+
+
+def _read_source_file(file_path, source_name):
+    """Parses one .jsonl file into an Arrow table with the projected columns and its source."""
+    try:
+        table = pa_json.read_json(file_path, **_json_options())
+        table = table.select(ARTICLE_FIELDS)
+        offsets = list(_iter_line_offsets(file_path))
+        malformed = 0
+    except pa.ArrowInvalid:
+        # A single bad line makes Arrow reject the whole file, so parse it line by line instead
+        table, offsets, malformed = _read_file_by_line(file_path)
+
+    return _add_source_columns(table, source_name, offsets), malformed
+
+
+def _stream_source_file(file_path, source_name, stats):
+    """
+    Streams one .jsonl file as Arrow tables of one read block each, so memory use does not
+    grow with the file size. Falls back to the line parser like _read_source_file.
+    """
+    offsets = _iter_line_offsets(file_path)
+    rows = 0
+    malformed = 0
+    try:
+        for batch in pa_json.open_json(file_path, **_json_options()):
+            table = pa.Table.from_batches([batch]).select(ARTICLE_FIELDS)
+            rows += table.num_rows
+            yield _add_source_columns(table, source_name, list(itertools.islice(offsets, table.num_rows)))
+    except pa.ArrowInvalid:
+        # Every line before the rejected block parsed, so resume the line parser after them
+        skip = rows
+        for table, batch_offsets, batch_malformed in _iter_file_by_line(file_path, batch_size=STREAM_BATCH_ROWS):
+            malformed += batch_malformed
+            if skip >= table.num_rows:
+                skip -= table.num_rows
+                continue
+            table, batch_offsets, skip = table.slice(skip), batch_offsets[skip:], 0
+            rows += table.num_rows
+            yield _add_source_columns(table, source_name, batch_offsets)
+    stats[os.path.basename(file_path)] = {'rows': rows, 'malformed': malformed}
+
+
+def list_source_files(data_folder_path):
+    return sorted(f for f in os.listdir(data_folder_path) if f.endswith('.jsonl'))
+
+
+def iter_article_batches(data_folder_path, filenames=None, max_workers=None, batch_size=65536, stats=None):
+    """
+    Streams articles as Arrow record batches, parsing the per-source files concurrently.
+    Files are yielded in sorted filename order. If a `stats` dict is given, it is filled with
+    per-file row and malformed-line counts.
+    """
+    if filenames is None:
+        filenames = list_source_files(data_folder_path)
+    if max_workers is None:
+        max_workers = min(8, os.cpu_count() or 1)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        files = iter(filenames)
+
+        def submit_next():
+            filename = next(files, None)
+            if filename is None:
+                return
             # Get the source name from the filename (e.g., 'bbc.jsonl' -> 'bbc')
-            source_name = filename.replace('.jsonl', '')
-            
+            source_name = filename[:-len('.jsonl')]
             file_path = os.path.join(data_folder_path, filename)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        article = json.loads(line)
-                        
-                        # Add the source name to the article's data before appending
-                        article['source'] = source_name
-                        
-                        all_articles.append(article)
-                    except json.JSONDecodeError:
-                        print(f"Warning: Could not decode line in {filename}")
-
-    if not all_articles:
+            pending.append((filename, executor.submit(_read_source_file, file_path, source_name)))
+
+        # Keep at most `max_workers` files in flight so memory stays bounded
+        for _ in range(max_workers):
+            submit_next()
+
+        while pending:
+            filename, future = pending.popleft()
+            table, malformed = future.result()
+            submit_next()
+
+            if stats is not None:
+                stats[filename] = {'rows': table.num_rows, 'malformed': malformed}
+            yield from table.to_batches(max_chunksize=batch_size)
+
+
+def stream_article_batches(data_folder_path, filenames=None, stats=None):
+    """
+    Streams articles file by file as Arrow tables of one read block each (see READ_BLOCK_SIZE).
+    Unlike iter_article_batches, no file is ever held in memory as a whole.
+    """
+    if filenames is None:
+        filenames = list_source_files(data_folder_path)
+    if stats is None:
+        stats = {}
+    for filename in filenames:
+        source_name = filename[:-len('.jsonl')]
+        yield from _stream_source_file(os.path.join(data_folder_path, filename), source_name, stats)
+
+
+def report_ingest_stats(stats):
+    for filename, file_stats in stats.items():
+        if file_stats['malformed']:
+            logger.warning(f"Skipped {file_stats['malformed']} malformed line(s) in {filename}")
+
+
+def load_all_articles(data_folder_path, max_workers=None, filenames=None):
+
+    logger.info(f"Ingesting articles from {data_folder_path}...")
+
+    stats = {}
+    batches = list(tqdm(
+        iter_article_batches(data_folder_path, filenames=filenames, max_workers=max_workers, stats=stats),
+        desc="Reading batches", disable=not logger.isEnabledFor(logging.INFO)
+    ))
+    report_ingest_stats(stats)
+
+    table = pa.Table.from_batches(batches, schema=OUTPUT_SCHEMA)
+    if table.num_rows == 0:
         raise ValueError("No articles were loaded. Check the data directory and file format.")
 
-    df = pd.DataFrame(all_articles)
-    print(f"Ingested {len(df)} total articles.")
-    return df
\ No newline at end of file
+    df = table_to_frame(table)
+    logger.info(f"Ingested {len(df)} total articles.")
+    return df
+
+
+def table_to_frame(table):
+    """Converts ingested articles to pandas with Arrow-backed strings and a categorical source."""
+    table = table.set_column(
+        table.schema.get_field_index('source'), 'source', table.column('source').dictionary_encode()
+    )
+    return table.to_pandas(types_mapper=schema.arrow_types_mapper)
+
+
+def read_articles_at(data_folder_path, source_name, offsets, fields=ARTICLE_FIELDS):
+    """
+    Reads back the raw `fields` of articles from a source file by their 'source_offset'.
+    Offsets refer to the file as it was ingested.
+    """
+    file_path = os.path.join(data_folder_path, f'{source_name}.jsonl')
+    rows = []
+    with open(file_path, 'rb') as f:
+        for offset in offsets:
+            f.seek(int(offset))
+            article = _json_loads(f.readline())
+            rows.append({field: _to_str(article.get(field)) for field in fields})
+    return pd.DataFrame(rows, columns=list(fields))
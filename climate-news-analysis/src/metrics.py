@@ -0,0 +1,132 @@
+# src/metrics.py
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Allocation sites listed in the log when a stage is profiled
+TRACEMALLOC_TOP = 15
+
+
+def _peak_rss_mb(who):
+    """High-water mark of resident memory so far, for this process or its finished children."""
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    scale = 1e6 if sys.platform == 'darwin' else 1e3
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def _cpu_seconds():
+    # Includes worker processes (VADER, cleaning, changepoints) once their pool has shut down
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class PipelineMetrics:
+    """
+    Collects per-stage wall time, CPU time, peak RSS, rows in/out and throughput. Each finished
+    stage is logged and appended to `log_path` as one JSON line; summary() formats the run as a
+    table. The stage named `profile_stage` additionally runs under cProfile and tracemalloc, and
+    both are dumped to `profile_dir`.
+
+    CPU time and peak RSS are process-wide, so for stages that ran concurrently (see dag.py)
+    they include the other stages' share.
+    """
+
+    def __init__(self, log_path=None, profile_stage=None, profile_dir=None):
+        self.run_id = time.strftime('%Y%m%dT%H%M%S')
+        self.log_path = log_path
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir
+        self.records = []
+        self._lock = threading.Lock()
+        if log_path:
+            os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Measures the enclosed block. Yields the stage's record, so the block can fill in
+        'rows_in' and 'rows_out' once it knows them.
+        """
+        record = {'run_id': self.run_id, 'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        profiler = None
+        if name == self.profile_stage:
+            tracemalloc.start()
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        rss_before = _peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+        wall_start, cpu_start = time.perf_counter(), _cpu_seconds()
+        record['status'] = 'error'
+        try:
+            yield record
+            record['status'] = 'ok'
+        finally:
+            wall = time.perf_counter() - wall_start
+            record['wall_seconds'] = round(wall, 3)
+            record['cpu_seconds'] = round(_cpu_seconds() - cpu_start, 3)
+            if resource:
+                record['peak_rss_mb'] = round(_peak_rss_mb(resource.RUSAGE_SELF), 1)
+                # How far this stage raised the process's high-water mark
+                record['rss_growth_mb'] = round(record['peak_rss_mb'] - rss_before, 1)
+                record['children_peak_rss_mb'] = round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1)
+            rows = record['rows_in'] if record['rows_in'] is not None else record['rows_out']
+            record['rows_per_second'] = round(rows / wall, 1) if rows and wall > 0 else None
+            if profiler is not None:
+                profiler.disable()
+                self._dump_profile(name, profiler, tracemalloc.take_snapshot())
+                tracemalloc.stop()
+            self._emit(record)
+
+    def _dump_profile(self, name, profiler, snapshot):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, f'{name}-{self.run_id}')
+        profiler.dump_stats(f'{base}.prof')
+        snapshot.dump(f'{base}.tracemalloc')
+        logger.info(f"Profile of stage '{name}' written to {base}.prof (cProfile, e.g. for snakeviz) "
+                    f"and {base}.tracemalloc (tracemalloc.Snapshot.load).")
+        # tracemalloc only sees this process's Python and NumPy allocations, not Arrow or workers
+        for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+            logger.info(f"  {stat}")
+
+    def _emit(self, record):
+        logger.debug(json.dumps(record))
+        with self._lock:
+            self.records.append(record)
+            if self.log_path:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + '\n')
+
+    def summary(self):
+        """The run's stages as a fixed-width table."""
+        lines = [f"{'Stage':<22} {'Wall (s)':>9} {'CPU (s)':>9} {'Peak RSS (MB)':>14} "
+                 f"{'Rows in':>10} {'Rows out':>10} {'Rows/s':>10}"]
+
+        def fmt(value, spec):
+            return '-' if value is None else format(value, spec)
+
+        for r in self.records:
+            name = r['stage'] if r['status'] == 'ok' else f"{r['stage']} (!)"
+            lines.append(
+                f"{name:<22} {r['wall_seconds']:>9.2f} {r['cpu_seconds']:>9.2f} "
+                f"{fmt(r.get('peak_rss_mb'), ',.0f'):>14} {fmt(r['rows_in'], ','):>10} "
+                f"{fmt(r['rows_out'], ','):>10} {fmt(r['rows_per_second'], ',.0f'):>10}"
+            )
+        return '\n'.join(lines)
+
+    def report(self):
+        logger.info("--- Stage Metrics ---\n" + self.summary())
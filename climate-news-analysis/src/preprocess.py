@@ -1,36 +1,75 @@
 # src/preprocess.py
+import logging
+import numpy as np
 import pandas as pd
-from . import utils
+import pyarrow as pa
+from . import utils, schema
 
-def preprocess_data(df):
+logger = logging.getLogger(__name__)
 
-    print("Starting preprocessing...")
+def clean_articles(df, n_jobs=1):
+    """
+    Row-wise cleaning and filtering. Each article's result depends only on that article.
+    The raw headline and body are not carried over (see schema.RAW_TEXT_COLUMNS).
+    """
 
     # The 'source' column is added during the ingestion step.
-    # Drop rows where essential columns are missing.
-    df.dropna(subset=['headline', 'body', 'date_published', 'source'], inplace=True)
-
-    # Clean text fields
-    df['cleaned_body'] = df['body'].apply(utils.clean_text)
-    df['cleaned_headline'] = df['headline'].apply(utils.clean_text)
+    # Rows missing essential columns are dropped.
+    keep = df[['headline', 'body', 'date_published', 'source']].notna().all(axis=1).to_numpy()
 
     # Convert date to datetime objects, coercing errors
-    df['date_published'] = pd.to_datetime(df['date_published'], errors='coerce')
-    df.dropna(subset=['date_published'], inplace=True)
+    dates = pd.to_datetime(df['date_published'][keep], errors='coerce')
+    keep[keep] = dates.notna().to_numpy()
+
+    # Clean the body text chunk by chunk and filter out articles with very short text as we go,
+    # so only the kept cleaned text is converted to Arrow strings. The whole column is cleaned
+    # (missing values become "") so the Arrow strings are read in place, not copied first.
+    kept_bodies = []
+    for start, chunk in utils.iter_clean_text_chunks(df['body'], n_jobs=n_jobs):
+        chunk_keep = keep[start:start + len(chunk)]
+        chunk_keep &= np.fromiter((len(text) > 100 for text in chunk), dtype=bool, count=len(chunk))
+        kept_bodies.append(pa.array([t for t, k in zip(chunk, chunk_keep) if k], pa.large_string()))
+    positions = np.flatnonzero(keep)
+
+    # Take the surviving rows once rather than copying the frame after every filter
+    kept_columns = [c for c in df.columns if c not in schema.RAW_TEXT_COLUMNS]
+    result = df[kept_columns].take(positions)
+    result['date_published'] = dates
+    result['cleaned_body'] = pd.Series(
+        pd.arrays.ArrowStringArray(pa.chunked_array(kept_bodies, pa.large_string())), index=result.index
+    )
+    result['cleaned_headline'] = utils.clean_text_series(df['headline'].iloc[positions], n_jobs=n_jobs)
+
+    # Add country and region information using the maps from utils.
+    # Sources missing from the maps get 'Unknown'.
+    result['country'] = schema.map_categories(result['source'], utils.SOURCE_TO_COUNTRY_MAP, 'Unknown')
+    result['region'] = schema.map_categories(result['country'], utils.COUNTRY_TO_REGION_MAP, 'Unknown')
+
+    return schema.apply_schema(result)
 
-    # Add country and region information using the new maps from utils
-    df['country'] = df['source'].map(utils.SOURCE_TO_COUNTRY_MAP)
-    df['region'] = df['country'].map(utils.COUNTRY_TO_REGION_MAP)
+def drop_duplicate_articles(df):
+    """Corpus-level step: drop duplicates based on the cleaned article body."""
+    # Compare 64-bit hashes instead of the texts, then confirm each match against the text of
+    # the first article with that hash so a hash collision never drops an article
+    hashes = utils.hash_text_series(df['cleaned_body'])
+    duplicated = pd.Series(hashes).duplicated().to_numpy()
+    if not duplicated.any():
+        return df
+    first = pd.Series(np.arange(len(hashes))).groupby(hashes).transform('first').to_numpy()
+    candidates = np.flatnonzero(duplicated)
+    body = df['cleaned_body']
+    same_text = body.iloc[candidates].to_numpy() == body.iloc[first[candidates]].to_numpy()
+    duplicated[candidates[~same_text]] = False
+    return df[~duplicated]
 
-    # Fill any potential NaNs if a source isn't in the map (good practice)
-    df['country'].fillna('Unknown', inplace=True)
-    df['region'].fillna('Unknown', inplace=True)
+def preprocess_data(df, n_jobs=1):
 
-    # Drop duplicates based on the cleaned article body
-    df.drop_duplicates(subset=['cleaned_body'], inplace=True)
+    logger.info("Starting preprocessing...")
 
-    # Filter out articles with very short text
-    df = df[df['cleaned_body'].str.len() > 100].copy()
+    df = clean_articles(df, n_jobs=n_jobs)
+    # Duplicates share the same cleaned body (and so the same length), so
+    # deduplicating after the length filter gives the same result as before it.
+    df = drop_duplicate_articles(df)
 
-    print(f"Preprocessing complete. {len(df)} articles remaining.")
-    return df
\ No newline at end of file
+    logger.info(f"Preprocessing complete. {len(df)} articles remaining.")
+    return df
@@ -0,0 +1,286 @@
+# src/query.py
+import logging
+import os
+import copy
+import json
+import argparse
+import threading
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+from . import aggregate, baseline, utils
+
+logger = logging.getLogger(__name__)
+
+INDEX_COLUMNS = ['source', 'region', 'topic']
+QUERY_COLUMNS = INDEX_COLUMNS + ['date_published', 'vader_sentiment']
+
+
+def parse_period(period):
+    """'2015Q3', '2015-07' or '2015' -> (first, last) timestamp of that period."""
+    period = pd.Period(period)
+    return period.start_time, period.end_time
+
+
+class _ValueIndex:
+    """Row positions per distinct value, ascending within each value."""
+
+    def __init__(self, values):
+        self.codes, uniques = pd.factorize(values)
+        order = np.argsort(self.codes, kind='stable')
+        bounds = np.searchsorted(self.codes[order], np.arange(len(uniques) + 1))
+        self.code_of = {value: code for code, value in enumerate(uniques)}
+        self.positions = [order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))]
+
+    def lookup(self, value):
+        code = self.code_of.get(value)
+        if code is None:
+            return -1, np.empty(0, dtype=np.intp)
+        return code, self.positions[code]
+
+
+class QueryEngine:
+    """
+    Read-only queries over final_data.parquet. The needed columns are read through a memory map,
+    rows are ordered by date (so a date range is a contiguous slice) and source, region and topic
+    get position indexes. Query results are kept in an LRU cache of `cache_size` entries.
+    All results are plain JSON-serialisable dicts and lists.
+
+    Bias scores and changepoints use the baselines the pipeline saved at `baseline_path` (with
+    that run's --baseline-window), brought up to date with the loaded articles, and
+    `bias_measure` (an aggregate.BIAS_MEASURES key), so they agree with the bias report.
+    """
+
+    def __init__(self, data_path, topic_info_path=None, cache_size=1024, baseline_path=None, bias_measure='raw'):
+        logger.info(f"Loading query data from {data_path}...")
+        df = utils.load_data(data_path, columns=QUERY_COLUMNS, memory_map=True)
+        df = df.sort_values('date_published', kind='stable', ignore_index=True)
+        self.df = df
+        self.dates = df['date_published'].to_numpy(dtype='datetime64[ns]')
+        self.sentiment_values = df['vader_sentiment'].to_numpy(dtype=np.float64)
+        self.topic_values = df['topic'].to_numpy()
+        self.indexes = {column: _ValueIndex(df[column].to_numpy()) for column in INDEX_COLUMNS}
+
+        self.topic_names = {}
+        if topic_info_path:
+            topic_info = pd.read_csv(topic_info_path)
+            self.topic_names = dict(zip(topic_info['Topic'], topic_info['Name']))
+
+        if bias_measure not in aggregate.BIAS_MEASURES:
+            raise ValueError(f"Unknown bias measure '{bias_measure}' (expected one of {list(aggregate.BIAS_MEASURES)})")
+        self.baseline_path = baseline_path
+        self.bias_measure = bias_measure
+        self._baselines = None
+        self._bias = None
+        self._bias_analysis = None
+        self._lock = threading.Lock()
+        self._cached = lru_cache(maxsize=cache_size)(self._run)
+        logger.info(f"Query engine ready: {len(df)} articles indexed.")
+
+    def _date_bounds(self, start, end, period):
+        if period is not None:
+            start, end = parse_period(period)
+        elif end is not None:
+            # An end date includes the whole day (and '2015-09' the whole month), like a period
+            end = pd.Period(end).end_time
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), 'ns'), side='left')
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), 'ns'), side='right')
+        return lo, hi
+
+    def select(self, source=None, region=None, topic=None, start=None, end=None, period=None):
+        """Positions of the matching rows, in date order."""
+        lo, hi = self._date_bounds(start, end, period)
+        filters = [(column, value) for column, value in
+                   [('source', source), ('region', region), ('topic', topic)] if value is not None]
+        if not filters:
+            return np.arange(lo, hi)
+
+        # Start from the most selective index, then check the other filters by their codes
+        lookups = [(column, *self.indexes[column].lookup(value)) for column, value in filters]
+        lookups.sort(key=lambda item: len(item[2]))
+        _, _, positions = lookups[0]
+        rows = positions[np.searchsorted(positions, lo):np.searchsorted(positions, hi)]
+        for column, code, _ in lookups[1:]:
+            rows = rows[self.indexes[column].codes[rows] == code]
+        return rows
+
+    def _load_baselines(self):
+        # Called with the lock held. Without a saved state this is the same-month baseline; a saved
+        # state is synced with the loaded articles in memory only, as the service never writes it.
+        if self._baselines is None:
+            if self.baseline_path and os.path.exists(self.baseline_path):
+                state = baseline.BaselineState.load(self.baseline_path)
+                state.sync(self.df)
+            else:
+                state = baseline.BaselineState.from_data(self.df)
+            self._baselines = state.baselines()
+        return self._baselines
+
+    def _bias_scores(self):
+        with self._lock:
+            if self._bias is None:
+                bias_df = aggregate.compute_bias_scores(self.df, baselines=self._load_baselines())
+                bias = np.full(len(self.df), np.nan)
+                bias[bias_df.index.to_numpy()] = bias_df[aggregate.BIAS_MEASURES[self.bias_measure]].to_numpy()
+                self._bias = bias
+        return self._bias
+
+    def _summary(self, rows, values, freq):
+        if freq is None:
+            selected = values[rows]
+            selected = selected[~np.isnan(selected)]
+            return {
+                'count': int(len(selected)),
+                'mean': float(selected.mean()) if len(selected) else None,
+                'std': float(selected.std(ddof=1)) if len(selected) > 1 else None,
+            }
+        series = pd.Series(values[rows], index=pd.DatetimeIndex(self.dates[rows]))
+        grouped = series.resample(freq).agg(['count', 'mean'])
+        return [
+            {'period': str(period.date()), 'count': int(row['count']),
+             'mean': None if pd.isna(row['mean']) else float(row['mean'])}
+            for period, row in grouped.iterrows()
+        ]
+
+    def _run(self, kind, source, region, topic, start, end, period, freq, n):
+        rows = self.select(source, region, topic, start, end, period)
+        if kind == 'sentiment':
+            return self._summary(rows, self.sentiment_values, freq)
+        if kind == 'bias':
+            return self._summary(rows, self._bias_scores(), freq)
+        if kind == 'top_topics':
+            topic_ids, counts = np.unique(self.topic_values[rows], return_counts=True)
+            top = np.argsort(-counts, kind='stable')[:n]
+            return [
+                {'topic': int(topic_ids[i]),
+                 'name': self.topic_names.get(int(topic_ids[i]), f"Topic {topic_ids[i]}"),
+                 'count': int(counts[i])}
+                for i in top
+            ]
+        raise ValueError(f"Unknown query: {kind}")
+
+    def _query(self, kind, source=None, region=None, topic=None, start=None, end=None,
+               period=None, freq=None, n=10):
+        topic = None if topic is None else int(topic)
+        start = None if start is None else str(start)
+        end = None if end is None else str(end)
+        # Cached results are shared, so every caller gets its own copy to modify
+        return copy.deepcopy(self._cached(kind, source, region, topic, start, end, period, freq, n))
+
+    def sentiment(self, **filters):
+        """Count, mean and std of vader_sentiment for the filtered articles (per period with `freq`)."""
+        return self._query('sentiment', **filters)
+
+    def bias(self, **filters):
+        """Count, mean and std of the articles' bias scores (in `bias_measure`; see aggregate.compute_bias_scores)."""
+        return self._query('bias', **filters)
+
+    def top_topics(self, n=10, **filters):
+        return self._query('top_topics', n=n, **filters)
+
+    def changepoints(self, source):
+        """Changepoints of a source's weekly bias series, as in the bias report."""
+        with self._lock:
+            if self._bias_analysis is None:
+                self._bias_analysis = aggregate.analyze_bias_and_events(
+                    self.df, baselines=self._load_baselines(), measure=self.bias_measure
+                )
+        result = self._bias_analysis.get(source)
+        if result is None:
+            return []
+        return [
+            {'date': str(cp['date'].date()), 'correlated_event': cp['correlated_event'],
+             'segment_mean_before': cp['segment_mean_before'],
+             'segment_mean_after': cp['segment_mean_after'], 'magnitude': cp['magnitude']}
+            for cp in result['changepoints']
+        ]
+
+    def cache_info(self):
+        return self._cached.cache_info()._asdict()
+
+
+QUERY_PARAMS = ['source', 'region', 'topic', 'start', 'end', 'period', 'freq', 'n']
+
+
+def _make_handler(engine):
+    class QueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                unknown = set(params) - set(QUERY_PARAMS)
+                if unknown:
+                    raise ValueError(f"Unknown parameters: {sorted(unknown)}")
+                if 'n' in params:
+                    params['n'] = int(params['n'])
+                route = url.path.strip('/')
+                if route == 'sentiment':
+                    body = engine.sentiment(**params)
+                elif route == 'bias':
+                    body = engine.bias(**params)
+                elif route == 'top_topics':
+                    body = engine.top_topics(**params)
+                elif route == 'changepoints':
+                    body = engine.changepoints(params['source'])
+                elif route == 'health':
+                    body = {'status': 'ok', 'cache': engine.cache_info()}
+                else:
+                    self._send(404, {'error': f"Unknown endpoint: /{route}"})
+                    return
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {'error': str(e)})
+                return
+            self._send(200, body)
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return QueryHandler
+
+
+def make_server(engine, host='127.0.0.1', port=8000):
+    return ThreadingHTTPServer((host, port), _make_handler(engine))
+
+
+def serve(engine, host='127.0.0.1', port=8000):
+    """
+    Serves the engine's queries as JSON over HTTP, e.g.
+    GET /bias?source=fox&topic=12&period=2015Q3 or GET /sentiment?region=Europe&freq=M.
+    """
+    server = make_server(engine, host, port)
+    logger.info(f"Serving queries on http://{host}:{port} (Ctrl+C to stop)...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local query service over the analysis outputs.")
+    parser.add_argument('--data', default='outputs/final_data.parquet')
+    parser.add_argument('--topic-info', default='outputs/reports/topic_info.csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--cache-size', type=int, default=1024)
+    parser.add_argument('--baseline-state', default='outputs/cache/baseline_state.parquet',
+                        help="Baselines saved by the pipeline run (see main.py --baseline-window).")
+    parser.add_argument('--bias-measure', choices=list(aggregate.BIAS_MEASURES), default='raw',
+                        help="See main.py --bias-measure.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s', datefmt='%H:%M:%S')
+    topic_info = args.topic_info if args.topic_info and os.path.exists(args.topic_info) else None
+    engine = QueryEngine(args.data, topic_info_path=topic_info, cache_size=args.cache_size,
+                         baseline_path=args.baseline_state, bias_measure=args.bias_measure)
+    serve(engine, args.host, args.port)
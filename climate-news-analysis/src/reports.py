@@ -1,10 +1,15 @@
 # src/reports.py
 
+import logging
+import os
+import argparse
 import pandas as pd
 
-def generate_bias_report(analysis_results, output_path):
+logger = logging.getLogger(__name__)
 
-    print(f"Generating bias and event correlation report at {output_path}...")
+def generate_bias_report(analysis_results, output_path, top_shifts=20):
+
+    logger.info(f"Generating bias and event correlation report at {output_path}...")
 
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write("Media Bias Analysis Report\n")
@@ -25,7 +30,23 @@ def generate_bias_report(analysis_results, output_path):
             f.write(f"- {source.upper()}: {data['overall_bias_score']:.4f}\n")
         f.write("\n")
 
-        #  Section 2: Detailed Analysis per Source 
+        #  Section 2: Largest Shifts Across All Sources 
+        f.write("--- Largest Shifts in Sentiment Bias ---\n")
+        f.write("----------------------------------------\n")
+
+        all_shifts = [
+            (source, cp) for source, data in analysis_results.items() for cp in data['changepoints']
+        ]
+        all_shifts.sort(key=lambda item: abs(item[1]['magnitude']), reverse=True)
+
+        if not all_shifts:
+            f.write("No significant shifts in sentiment bias detected.\n")
+        for source, cp in all_shifts[:top_shifts]:
+            f.write(f"- {source.upper()} on/around {cp['date'].strftime('%Y-%m-%d')}: "
+                    f"{cp['magnitude']:+.4f} ({cp['segment_mean_before']:.4f} -> {cp['segment_mean_after']:.4f})\n")
+        f.write("\n")
+
+        #  Section 3: Detailed Analysis per Source 
         f.write("--- Detailed Source Analysis ---\n")
         f.write("--------------------------------\n")
         
@@ -36,18 +57,100 @@ def generate_bias_report(analysis_results, output_path):
             if not data['changepoints']:
                 f.write("No significant shifts in sentiment bias detected during the analyzed period.\n")
             else:
-                f.write("Detected shifts in sentiment bias and potential correlated events:\n")
-                for cp in data['changepoints']:
+                f.write("Detected shifts in sentiment bias (largest first) and potential correlated events:\n")
+                ranked_changepoints = sorted(data['changepoints'], key=lambda cp: abs(cp['magnitude']), reverse=True)
+                for cp in ranked_changepoints:
                     change_date = cp['date']
                     event = cp['correlated_event']
                     
                     f.write(f"  - On/Around {change_date.strftime('%Y-%m-%d')}:\n")
-                    f.write(f"    - A significant shift in reporting bias was detected.\n")
-                    if event != 'None':
+                    f.write(f"    - A shift of {cp['magnitude']:+.4f} in weekly reporting bias was detected "
+                            f"({cp['segment_mean_before']:.4f} -> {cp['segment_mean_after']:.4f}).\n")
+                    matched = cp.get('correlated_events', [])
+                    if len(matched) > 1:
+                        f.write(f"    - This shift occurred shortly after these events (closest first):\n")
+                        for match in matched:
+                            f.write(f"      - '{match['event']}' ({match['days_after_start']} days after it started)\n")
+                    elif event != 'None':
                         f.write(f"    - This shift occurred shortly after the '{event}' event.\n")
                     else:
                         f.write(f"    - No major predefined event was found to correlate with this shift.\n")
             
             f.write("\n--------------------------------\n\n")
 
-    print("Bias report generation complete.")
\ No newline at end of file
+    logger.info("Bias report generation complete.")
+
+
+def regenerate_reports(output_folder='outputs', chunked=False, rebuild_cube=False, bias=True, events_path=None,
+                       plots=False, n_jobs=1, bias_measure='raw'):
+    """
+    Report/aggregate-only path: rebuilds the top-topics and bias reports (and with `plots` the
+    charts) from an earlier pipeline run's outputs in `output_folder`. The saved sentiment cube
+    is reused unless `rebuild_cube`, and so are the saved baselines (see baseline.py). Articles
+    are only read to rebuild the cube, and the NLP libraries are never imported (matplotlib and
+    seaborn only with `plots`).
+    """
+    from . import aggregate, cube, events, baseline, utils
+
+    reports_folder = os.path.join(output_folder, 'reports')
+    cube_path = os.path.join(output_folder, 'sentiment_cube.parquet')
+    baseline_state_path = os.path.join(output_folder, 'cache', 'baseline_state.parquet')
+    topic_info_path = os.path.join(reports_folder, 'topic_info.csv')
+    os.makedirs(reports_folder, exist_ok=True)
+
+    def read_articles(columns):
+        if chunked:
+            from . import chunked as chunked_dataset
+            return chunked_dataset.read_articles(os.path.join(output_folder, 'articles'), columns=columns)
+        return utils.load_data(os.path.join(output_folder, 'final_data.parquet'), columns=columns)
+
+    if rebuild_cube or not os.path.exists(cube_path):
+        sentiment_cube = cube.build_cube(read_articles(cube.ARTICLE_COLUMNS))
+        cube.save_cube(sentiment_cube, cube_path)
+    else:
+        sentiment_cube = cube.load_cube(cube_path)
+
+    if os.path.exists(topic_info_path):
+        aggregate.generate_top_topics_report(
+            sentiment_cube, pd.read_csv(topic_info_path), os.path.join(reports_folder, 'top_topics_per_source.txt')
+        )
+
+    if bias:
+        # Baselines from the last pipeline run keep its --baseline-window; they are brought up to date with the cube
+        baselines = None
+        if os.path.exists(baseline_state_path):
+            baselines = baseline.update_state(baseline_state_path, sentiment_cube).baselines()
+        bias_analysis_results = aggregate.analyze_bias_and_events(
+            sentiment_cube, n_jobs=n_jobs, events=events.load_event_catalogue(events_path),
+            baselines=baselines, measure=bias_measure
+        )
+        generate_bias_report(bias_analysis_results, os.path.join(reports_folder, 'bias_report.txt'))
+
+    if plots:
+        from . import visualize
+        visualize.plot_sentiment_over_time(aggregate.aggregate_by_time(sentiment_cube), reports_folder)
+        agg_sent_region, agg_topic_region = aggregate.aggregate_by_region(sentiment_cube)
+        visualize.plot_sentiment_by_region(agg_sent_region, reports_folder)
+        visualize.plot_topics_by_region(agg_topic_region, reports_folder)
+        visualize.plot_sentiment_by_source(aggregate.aggregate_by_source(sentiment_cube), reports_folder)
+        visualize.plot_timelines(sentiment_cube, reports_folder, n_jobs=n_jobs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Regenerate the reports from an earlier pipeline run's outputs.")
+    parser.add_argument('--outputs', default='outputs', help="Output folder of the pipeline run.")
+    parser.add_argument('--chunked', action='store_true',
+                        help="Read the --chunked dataset (outputs/articles) instead of final_data.parquet.")
+    parser.add_argument('--rebuild-cube', action='store_true',
+                        help="Rebuild sentiment_cube.parquet from the articles instead of reusing it.")
+    parser.add_argument('--skip-bias', action='store_true',
+                        help="Skip the bias and changepoint analysis, the slowest report.")
+    parser.add_argument('--events', default=None, help="CSV or Parquet event catalogue (see main.py --events).")
+    parser.add_argument('--bias-measure', choices=['raw', 'zscore'], default='raw', help="See main.py --bias-measure.")
+    parser.add_argument('--plots', action='store_true', help="Also redraw the charts.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes for changepoint detection and timeline charts (-1 uses all cores).")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-7s %(message)s', datefmt='%H:%M:%S')
+    regenerate_reports(args.outputs, chunked=args.chunked, rebuild_cube=args.rebuild_cube, bias=not args.skip_bias,
+                       events_path=args.events, plots=args.plots, n_jobs=args.workers, bias_measure=args.bias_measure)
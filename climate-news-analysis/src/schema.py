@@ -0,0 +1,83 @@
+# src/schema.py
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Column dtypes of the article frame as it moves through the pipeline. Columns are converted
+# when present, so the same plan applies after every stage.
+CATEGORICAL_COLUMNS = ['source', 'country', 'region']
+TEXT_COLUMNS = ['headline', 'body', 'cleaned_body', 'cleaned_headline']
+FLOAT32_COLUMNS = ['vader_neg', 'vader_neu', 'vader_pos', 'vader_sentiment']
+INT16_COLUMNS = ['topic']
+
+# Raw text is only needed for cleaning; afterwards it can be re-read from the source file
+# through the article's (source, source_offset)
+RAW_TEXT_COLUMNS = ['headline', 'body']
+
+TEXT_DTYPE = pd.StringDtype('pyarrow')
+
+
+def _target_dtype(column):
+    if column in CATEGORICAL_COLUMNS:
+        return 'category'
+    if column in TEXT_COLUMNS:
+        return TEXT_DTYPE
+    if column in FLOAT32_COLUMNS:
+        return np.float32
+    if column in INT16_COLUMNS:
+        return np.int16
+    return None
+
+
+def apply_schema(df):
+    """
+    Converts the known columns of `df` to their compact dtypes in place (column by column, so
+    at most one column is duplicated at a time) and returns it. Columns that already have the
+    target dtype are left untouched.
+    """
+    for column in df.columns:
+        dtype = _target_dtype(column)
+        if dtype is None:
+            continue
+        if dtype == 'category':
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                continue
+        elif df[column].dtype == dtype:
+            continue
+        df[column] = df[column].astype(dtype)
+    return df
+
+
+def arrow_types_mapper(arrow_type):
+    """types_mapper for pyarrow's to_pandas: Arrow-backed strings instead of Python objects."""
+    if arrow_type in (pa.string(), pa.large_string()):
+        return TEXT_DTYPE
+    return None
+
+
+def map_categories(values, mapping, default):
+    """
+    Maps a column through `mapping` per category rather than per row; values missing from
+    the mapping become `default`. Returns a categorical Series.
+    """
+    values = values.astype('category')
+    mapped = pd.Index([mapping.get(category, default) for category in values.cat.categories])
+    categories = mapped.unique()
+    new_codes = categories.get_indexer(mapped)
+    codes = values.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, new_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=values.index)
+
+
+def drop_raw_text(df):
+    """Removes the raw headline/body columns in place once the cleaned text exists."""
+    for column in RAW_TEXT_COLUMNS:
+        if column in df.columns:
+            del df[column]
+    return df
+
+
+def memory_report(df):
+    """Deep memory usage per column in MB, largest first."""
+    usage = df.memory_usage(deep=True, index=False) / 1e6
+    return usage.sort_values(ascending=False).round(1)
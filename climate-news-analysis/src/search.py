@@ -0,0 +1,430 @@
+# src/search.py
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from . import topics
+
+logger = logging.getLogger(__name__)
+
+# Inverted-file (IVF) index: the unit-length article embeddings are clustered with spherical
+# k-means, and each vector is stored in its nearest cluster's list, with the lists laid out
+# contiguously. Vectors are float32 by default: numpy converts float16 to float32 far more slowly
+# than it multiplies, so float16 (dtype='float16') halves the index size at a cost in latency.
+# A query is compared with the centroids first and then only scans the `nprobe` closest lists.
+# Articles added later are appended to an unsorted tail, still assigned to their nearest list,
+# until the tail grows past COMPACT_FRACTION of the index and is merged into the lists.
+INDEX_FILES = ['centroids', 'vectors', 'ids', 'lists', 'sources', 'regions', 'days']
+INDEX_META_FILE = 'meta.json'
+METADATA_COLUMNS = ['article_id', 'source', 'region', 'date_published']
+
+DEFAULT_NPROBE = 16
+COMPACT_FRACTION = 0.1
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+MAX_LISTS = 4096
+# Filters matching fewer articles than this many times what the probed lists hold are searched exactly
+PREFILTER_FACTOR = 4
+# Rows per block in brute-force scans and k-means assignment
+SCAN_BLOCK = 65536
+# Stands in for a missing date_published in the per-row day numbers
+NO_DATE = np.iinfo(np.int32).min
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _top(scores, k):
+    """Positions of the `k` highest scores, highest first."""
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind='stable')]
+    return np.argsort(-scores, kind='stable')
+
+
+def _nearest_centroid(vectors, centroids, positions=None):
+    # Block by block, so `vectors` can be memory-mapped; `positions` selects some of its rows
+    n_rows = len(vectors) if positions is None else len(positions)
+    assigned = np.empty(n_rows, dtype=np.int32)
+    for start in range(0, n_rows, SCAN_BLOCK):
+        if positions is None:
+            block = vectors[start:start + SCAN_BLOCK]
+        else:
+            block = vectors[positions[start:start + SCAN_BLOCK]]
+        assigned[start:start + SCAN_BLOCK] = np.argmax(np.asarray(block, dtype=np.float32) @ centroids.T, axis=1)
+    return assigned
+
+
+def train_centroids(vectors, n_lists, iterations=KMEANS_ITERATIONS, seed=42):
+    """Spherical k-means on a sample of the (unit-length) vectors. Returns unit-length centroids."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * KMEANS_SAMPLE_PER_LIST)
+    sample = _normalize(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assigned = _nearest_centroid(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assigned, sample)
+        counts = np.bincount(assigned, minlength=n_lists)
+        # Empty clusters restart from a random sample vector
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def default_n_lists(n_vectors):
+    return int(np.clip(round(np.sqrt(n_vectors)), 1, MAX_LISTS))
+
+
+def _codes(values, categories):
+    """Codes of `values` in `categories`, extending `categories` with values not seen before."""
+    values = pd.Series(values, dtype=object).fillna('')
+    for value in pd.unique(values):
+        if value not in categories:
+            categories.append(value)
+    return pd.Categorical(values, categories=categories).codes.astype(np.int16)
+
+
+def _days(dates):
+    """Days since 1970-01-01, NO_DATE where the date is missing."""
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+    days[dates.isna()] = NO_DATE
+    return days.astype(np.int32)
+
+
+class SemanticIndex:
+    """
+    Approximate nearest-neighbour index over article embeddings (see the IVF note above), with
+    per-article source, region and publication day for filtering. Scores are cosine similarities.
+    Built with SemanticIndex.build, extended with add, persisted with save and opened with load
+    (the vectors are memory-mapped, so opening is cheap at any size).
+    """
+
+    def __init__(self, centroids, vectors, ids, lists, sources, regions, days, meta):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.lists = lists
+        self.sources = sources
+        self.regions = regions
+        self.days = days
+        self.meta = meta
+        self._id_positions = None
+        self._tail_lists = None
+
+    @classmethod
+    def build(cls, ids, vectors, metadata, n_lists=None, model_name=topics.EMBEDDING_MODEL, dtype='float32',
+              seed=42):
+        """
+        Trains the lists on `vectors` (one per article id in `ids`) and indexes them, stored as
+        `dtype`. `metadata` holds METADATA_COLUMNS for (at least) those ids.
+        """
+        n_lists = n_lists or default_n_lists(len(ids))
+        logger.info(f"Building semantic index: {len(ids)} articles, {n_lists} lists...")
+        centroids = train_centroids(vectors, n_lists, seed=seed)
+        meta = {
+            'model': model_name, 'dim': int(vectors.shape[1]), 'dtype': dtype, 'n_lists': n_lists, 'n_sorted': 0,
+            'sources': [], 'regions': [],
+        }
+        empty = np.empty(0, dtype=np.int32)
+        index = cls(centroids, np.empty((0, vectors.shape[1]), dtype=dtype), np.empty(0, dtype=np.uint64),
+                    empty, empty.astype(np.int16), empty.astype(np.int16), empty, meta)
+        # With nothing sorted yet, add sorts everything into the lists
+        index.add(ids, vectors, metadata)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _offsets(self):
+        # Start of each list within the sorted part, plus its end
+        sorted_lists = self.lists[:self.meta['n_sorted']]
+        return np.searchsorted(sorted_lists, np.arange(self.meta['n_lists'] + 1))
+
+    def _tail(self):
+        # Tail rows grouped by list, and where each list's rows start in that order
+        if self._tail_lists is None:
+            n_sorted = self.meta['n_sorted']
+            order = np.argsort(self.lists[n_sorted:], kind='stable')
+            offsets = np.searchsorted(self.lists[n_sorted:][order], np.arange(self.meta['n_lists'] + 1))
+            self._tail_lists = (order + n_sorted, offsets)
+        return self._tail_lists
+
+    def add(self, ids, vectors, metadata):
+        """
+        Appends articles to the unsorted tail (ids already indexed are skipped) and merges the
+        tail into the lists once it holds more than COMPACT_FRACTION of the index.
+        """
+        ids = np.asarray(ids, dtype=np.uint64)
+        positions = np.flatnonzero(~np.isin(ids, self.ids))
+        if not len(positions):
+            return 0
+        ids = ids[positions]
+
+        metadata = metadata.drop_duplicates('article_id').set_index('article_id').reindex(ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self.lists = np.concatenate([self.lists, _nearest_centroid(vectors, self.centroids, positions)])
+        self.sources = np.concatenate([self.sources, _codes(metadata['source'].astype(object), self.meta['sources'])])
+        self.regions = np.concatenate([self.regions, _codes(metadata['region'].astype(object), self.meta['regions'])])
+        self.days = np.concatenate([self.days, _days(metadata['date_published'])])
+
+        if len(self) - self.meta['n_sorted'] > COMPACT_FRACTION * max(self.meta['n_sorted'], 1):
+            self._sort(vectors, positions)
+        else:
+            self.vectors = self._gather(np.arange(len(self)), vectors, positions)
+            self._id_positions = None
+            self._tail_lists = None
+        return len(ids)
+
+    def compact(self):
+        """Merges the tail into the lists, so each list is read as one contiguous block."""
+        self._sort()
+
+    def _sort(self, new_vectors=None, positions=None):
+        order = np.argsort(self.lists, kind='stable')
+        self.vectors = self._gather(order, new_vectors, positions)
+        for name in ['ids', 'lists', 'sources', 'regions', 'days']:
+            setattr(self, name, getattr(self, name)[order])
+        self.meta['n_sorted'] = len(self)
+        self._id_positions = None
+        self._tail_lists = None
+
+    def _gather(self, order, new_vectors=None, positions=None):
+        """
+        The vectors of rows `order`, where rows past the current vectors are new_vectors[positions]
+        (normalised). Written block by block into one array, so adding to or sorting a large index
+        needs no more than one extra copy, and the new vectors can be memory-mapped.
+        """
+        n_old = len(self.vectors)
+        gathered = np.empty((len(order), self.meta['dim']), dtype=self.meta['dtype'])
+        for start in range(0, len(order), SCAN_BLOCK):
+            rows = order[start:start + SCAN_BLOCK]
+            block = gathered[start:start + SCAN_BLOCK]
+            old = rows < n_old
+            block[old] = self.vectors[rows[old]]
+            if not old.all():
+                block[~old] = _normalize(new_vectors[positions[rows[~old] - n_old]])
+        return gathered
+
+    def _filter_mask(self, rows, source, region, start, end):
+        mask = np.ones(len(rows), dtype=bool)
+        for values, categories, wanted in [(self.sources, self.meta['sources'], source),
+                                           (self.regions, self.meta['regions'], region)]:
+            if wanted is not None:
+                wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+                codes = [categories.index(value) for value in wanted if value in categories]
+                mask &= np.isin(values[rows], codes)
+        if start is not None or end is not None:
+            days = self.days[rows]
+            mask &= days != NO_DATE
+            if start is not None:
+                mask &= days >= _days([start])[0]
+            if end is not None:
+                mask &= days <= _days([end])[0]
+        return mask
+
+    def _scan(self, rows, vectors, queries, query_numbers, best, mask):
+        """Scores `rows` (holding `vectors`) against the given queries and adds them to their candidates."""
+        if mask is not None:
+            keep = mask[rows]
+            rows, vectors = rows[keep], vectors[keep]
+        if not len(rows):
+            return
+        scores = np.asarray(vectors, dtype=np.float32) @ queries[query_numbers].T
+        for column, q in enumerate(query_numbers):
+            best[q][0].append(rows)
+            best[q][1].append(scores[:, column])
+
+    def search(self, queries, k=10, nprobe=DEFAULT_NPROBE, source=None, region=None, start=None, end=None,
+               exclude_ids=None):
+        """
+        Top-`k` articles for each query vector (one row per query) among those matching the
+        filters: `source`/`region` (a value or a list) and a `start`/`end` publication date.
+        Probes the `nprobe` lists closest to each query, and more if they hold fewer than `k`
+        matching articles. Returns (article_ids, scores), both of shape (n_queries, k), best
+        first; slots without a match have article id 0 and score NaN.
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        n_queries = len(queries)
+        n_lists = self.meta['n_lists']
+        nprobe = min(max(nprobe, 1), n_lists)
+        if exclude_ids is not None:
+            exclude_ids = np.asarray(exclude_ids, dtype=np.uint64)
+
+        mask = None
+        if any(value is not None for value in (source, region, start, end)):
+            mask = self._filter_mask(np.arange(len(self)), source, region, start, end)
+            rows = np.flatnonzero(mask)
+            # A selective filter leaves fewer articles than the probed lists hold; scanning just
+            # those is both faster and exact
+            if len(rows) <= PREFILTER_FACTOR * nprobe * len(self) / n_lists:
+                return self._exact(queries, k, rows, exclude_ids)
+
+        offsets = self._offsets()
+        tail_rows, tail_offsets = self._tail()
+        # Probe order per query: the closest lists first
+        probe_order = np.argsort(-(queries @ self.centroids.T), axis=1)
+
+        result_ids = np.zeros((n_queries, k), dtype=np.uint64)
+        result_scores = np.full((n_queries, k), np.nan, dtype=np.float32)
+        todo = np.arange(n_queries)
+        while len(todo):
+            best = {q: ([], []) for q in todo}
+            # Lists probed in this round, each scanned once for every query that probes it
+            wanted = probe_order[todo, :nprobe]
+            for list_number in np.unique(wanted):
+                query_numbers = todo[(wanted == list_number).any(axis=1)]
+                lo, hi = offsets[list_number], offsets[list_number + 1]
+                self._scan(np.arange(lo, hi), self.vectors[lo:hi], queries, query_numbers, best, mask)
+                rows = tail_rows[tail_offsets[list_number]:tail_offsets[list_number + 1]]
+                if len(rows):
+                    self._scan(rows, self.vectors[rows], queries, query_numbers, best, mask)
+            for q in todo:
+                rows = np.concatenate(best[q][0]) if best[q][0] else np.empty(0, dtype=np.intp)
+                scores = np.concatenate(best[q][1]) if best[q][1] else np.empty(0, dtype=np.float32)
+                if exclude_ids is not None:
+                    keep = self.ids[rows] != exclude_ids[q]
+                    rows, scores = rows[keep], scores[keep]
+                previous = ~np.isnan(result_scores[q])
+                rows = np.concatenate([self._positions(result_ids[q, previous]), rows])
+                scores = np.concatenate([result_scores[q, previous], scores])
+                top = _top(scores, k)
+                result_ids[q, :len(top)] = self.ids[rows[top]]
+                result_scores[q, :len(top)] = scores[top]
+
+            # Lists are probed in rounds of doubling size until every query has k matches
+            probe_order = probe_order[:, nprobe:]
+            todo = todo[np.isnan(result_scores[todo, -1])] if probe_order.shape[1] else todo[:0]
+            nprobe = min(nprobe * 2, probe_order.shape[1])
+        return result_ids, result_scores
+
+    def _positions(self, ids):
+        if self._id_positions is None:
+            self._id_positions = pd.Index(self.ids)
+        return self._id_positions.get_indexer(ids)
+
+    def search_similar(self, article_ids, k=10, **kwargs):
+        """Articles most similar to already indexed articles (each excluding itself)."""
+        positions = self._positions(np.asarray(article_ids, dtype=np.uint64))
+        if (positions < 0).any():
+            raise KeyError("Some article ids are not in the index")
+        return self.search(np.asarray(self.vectors[positions], dtype=np.float32), k=k,
+                           exclude_ids=article_ids, **kwargs)
+
+    def search_text(self, texts, k=10, **kwargs):
+        """Articles closest to free-text queries, encoded with the index's embedding model."""
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(self.meta['model'])
+        return self.search(model.encode(list(texts), convert_to_numpy=True), k=k, **kwargs)
+
+    def _exact(self, queries, k, rows=None, exclude_ids=None):
+        """Exact top-`k` among `rows` (default: every article), in the same format as search."""
+        n_rows = len(self) if rows is None else len(rows)
+        best = [(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)) for _ in queries]
+        for block_start in range(0, n_rows, SCAN_BLOCK):
+            block_stop = min(block_start + SCAN_BLOCK, n_rows)
+            if rows is None:
+                block_rows = np.arange(block_start, block_stop)
+                vectors = self.vectors[block_start:block_stop]
+            else:
+                block_rows = rows[block_start:block_stop]
+                vectors = self.vectors[block_rows]
+            scores = np.asarray(vectors, dtype=np.float32) @ queries.T
+            for q in range(len(queries)):
+                candidates, candidate_scores = block_rows, scores[:, q]
+                if exclude_ids is not None:
+                    keep = self.ids[block_rows] != exclude_ids[q]
+                    candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+                # Only the best k are kept between blocks, so memory does not grow with the index
+                candidates = np.concatenate([best[q][0], candidates])
+                candidate_scores = np.concatenate([best[q][1], candidate_scores])
+                top = _top(candidate_scores, k)
+                best[q] = (candidates[top], candidate_scores[top])
+
+        result_ids = np.zeros((len(queries), k), dtype=np.uint64)
+        result_scores = np.full((len(queries), k), np.nan, dtype=np.float32)
+        for q, (best_rows, best_scores) in enumerate(best):
+            result_ids[q, :len(best_rows)] = self.ids[best_rows]
+            result_scores[q, :len(best_rows)] = best_scores
+        return result_ids, result_scores
+
+    def brute_force(self, queries, k=10, source=None, region=None, start=None, end=None):
+        """Exact top-`k` over every matching article, in the same format as search (for recall checks)."""
+        queries = _normalize(np.atleast_2d(queries))
+        rows = None
+        if any(value is not None for value in (source, region, start, end)):
+            rows = np.flatnonzero(self._filter_mask(np.arange(len(self)), source, region, start, end))
+        return self._exact(queries, k, rows)
+
+    def save(self, index_path):
+        """Writes the index to the folder `index_path`, one .npy file per array."""
+        os.makedirs(index_path, exist_ok=True)
+        for name in INDEX_FILES:
+            tmp_path = os.path.join(index_path, f'{name}.tmp.npy')
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, os.path.join(index_path, f'{name}.npy'))
+        with open(os.path.join(index_path, INDEX_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2)
+        logger.info(f"Semantic index saved to {index_path} ({len(self)} articles, {self.meta['n_lists']} lists).")
+
+    @classmethod
+    def load(cls, index_path):
+        meta_path = os.path.join(index_path, INDEX_META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"Semantic index not found at {index_path}")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(index_path, f'{name}.npy'), mmap_mode='r' if name == 'vectors' else None)
+                  for name in INDEX_FILES}
+        return cls(meta=meta, **arrays)
+
+
+def update_index(index_path, embeddings_folder, metadata, model_name=topics.EMBEDDING_MODEL, dtype='float32',
+                 rebuild=False):
+    """
+    Brings the index at `index_path` up to date with the embedding cache (see
+    topics.compute_embeddings) for the articles in `metadata` (METADATA_COLUMNS); `dtype` is
+    that of the cache and of the index. New articles are added incrementally; the index is rebuilt
+    when it was made with another model or dtype, when indexed articles are no longer in
+    `metadata`, or with `rebuild`. Returns the index, or None if none of the articles in
+    `metadata` has a cached embedding yet.
+    """
+    ids, embeddings = topics.load_embeddings(embeddings_folder, model_name, dtype)
+    if embeddings is None or not len(ids):
+        logger.info("No cached article embeddings; skipping the semantic index.")
+        return None
+
+    wanted = np.isin(ids, metadata['article_id'].to_numpy(dtype=np.uint64))
+    ids = ids[wanted]
+    if not len(ids):
+        logger.info("None of the cached embeddings belong to the current articles; skipping the semantic index.")
+        return None
+    index = None
+    if not rebuild and os.path.exists(os.path.join(index_path, INDEX_META_FILE)):
+        index = SemanticIndex.load(index_path)
+        if (index.meta['model'], index.meta['dim'], index.meta['dtype']) != (model_name, embeddings.shape[1], dtype):
+            logger.info("Semantic index was built with another embedding model or dtype; rebuilding it.")
+            index = None
+        elif not np.isin(index.ids, ids).all():
+            logger.info("Articles were removed since the semantic index was built; rebuilding it.")
+            index = None
+
+    positions = np.flatnonzero(wanted)
+    if index is None:
+        index = SemanticIndex.build(ids, embeddings[positions], metadata, model_name=model_name, dtype=dtype)
+    else:
+        new = ~np.isin(ids, index.ids)
+        # Only the new articles' embeddings are read from the memory-mapped cache
+        added = index.add(ids[new], embeddings[positions[new]], metadata)
+        logger.info(f"Semantic index: {added} new articles added, {len(index)} in total.")
+        if not added:
+            return index
+    index.save(index_path)
+    return index
@@ -1,38 +1,200 @@
+import logging
+import os
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from transformers import pipeline
 from tqdm import tqdm
+from . import utils
 
-def apply_vader(df, text_column='cleaned_body'):
-    """Applies VADER sentiment analysis."""
-    print("Applying VADER sentiment analysis...")
-    analyzer = SentimentIntensityAnalyzer()
-    
-    # Use tqdm's progress_apply for a progress bar with pandas
-    tqdm.pandas(desc="VADER Progress")
-    df['vader_sentiment'] = df[text_column].progress_apply(
-        lambda text: analyzer.polarity_scores(text)['compound']
-    )
+logger = logging.getLogger(__name__)
+
+# VADER score keys and the columns they are stored in. 'compound' keeps its original column name.
+VADER_COLUMNS = {
+    'neg': 'vader_neg',
+    'neu': 'vader_neu',
+    'pos': 'vader_pos',
+    'compound': 'vader_sentiment',
+}
+
+# One analyzer per process, created once by the pool initializer (or lazily on the serial path)
+_analyzer = None
+
+def _init_vader_worker():
+    global _analyzer
+    _analyzer = SentimentIntensityAnalyzer()
+
+def _score_chunk(texts):
+    if _analyzer is None:
+        _init_vader_worker()
+    rows = []
+    for text in texts:
+        scores = _analyzer.polarity_scores(text)
+        rows.append([scores[key] for key in VADER_COLUMNS])
+    return rows
+
+def apply_vader(df, text_column='cleaned_body', n_jobs=1, chunk_size=1000):
+    """
+    Applies VADER sentiment analysis, adding the neg/neu/pos scores and the compound score
+    ('vader_sentiment'). With n_jobs > 1 (or -1 for all cores) chunks are scored in a process
+    pool; results are collected in input order, so they match the serial path exactly.
+    """
+    logger.info("Applying VADER sentiment analysis...")
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+
+    # Progress bars follow the log level, so --log-level WARNING silences them too
+    quiet = not logger.isEnabledFor(logging.INFO)
+    # Texts are materialised one chunk at a time rather than as one list of every article
+    texts = df[text_column]
+    n_chunks = -(-len(texts) // chunk_size)
+    chunks = (texts.iloc[i:i + chunk_size].tolist() for i in range(0, len(texts), chunk_size))
+
+    if n_jobs == 1 or n_chunks <= 1:
+        results = map(_score_chunk, chunks)
+        results = list(tqdm(results, total=n_chunks, desc="VADER Progress", disable=quiet))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_vader_worker,
+                                 mp_context=utils.process_context()) as executor:
+            # executor.map yields results in submission order regardless of completion order
+            results = executor.map(_score_chunk, chunks)
+            results = list(tqdm(results, total=n_chunks, desc="VADER Progress", disable=quiet))
+
+    scores = np.array([row for chunk in results for row in chunk], dtype=np.float32).reshape(-1, len(VADER_COLUMNS))
+    for i, column in enumerate(VADER_COLUMNS.values()):
+        df[column] = scores[:, i]
     return df
 
-def apply_zero_shot(df, text_column='cleaned_body', sample_size=None):
+ZERO_SHOT_MODEL = "facebook/bart-large-mnli"
+ZERO_SHOT_LABELS = ['positive', 'negative', 'neutral']
+
+# Tokens kept free for the hypothesis ("This example is positive.") and special tokens
+HYPOTHESIS_TOKEN_BUDGET = 16
+
+def _resolve_device(device):
+    """Uses the first GPU when one is available, otherwise the CPU (-1)."""
+    if device is not None:
+        return device
+    import torch
+    return 0 if torch.cuda.is_available() else -1
+
+def _quantize_for_cpu(classifier):
+    import torch
+    classifier.model = torch.quantization.quantize_dynamic(
+        classifier.model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return classifier
+
+def _split_by_tokens(tokenizer, texts, max_tokens, chunk_long_texts):
+    """
+    Truncates each text to `max_tokens` tokens, or with `chunk_long_texts` splits it into
+    consecutive windows of that size. Returns the pieces and the index of the text each came from.
+    """
+    encoded = tokenizer(texts, add_special_tokens=False)['input_ids']
+    pieces, owners = [], []
+    for i, ids in enumerate(encoded):
+        windows = [ids[j:j + max_tokens] for j in range(0, max(len(ids), 1), max_tokens)]
+        if not chunk_long_texts:
+            windows = windows[:1]
+        for window in windows:
+            pieces.append(tokenizer.decode(window, skip_special_tokens=True))
+            owners.append(i)
+    return pieces, owners
+
+def _zero_shot_cache_key(text, config):
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8'))
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+def _load_zero_shot_cache(cache_path):
+    if cache_path and os.path.exists(cache_path):
+        cached = pd.read_parquet(cache_path)
+        return dict(zip(cached['text_hash'], cached['zero_shot_sentiment']))
+    return {}
+
+def _save_zero_shot_cache(cache_path, cache):
+    pd.DataFrame({
+        'text_hash': list(cache.keys()),
+        'zero_shot_sentiment': list(cache.values()),
+    }).to_parquet(cache_path, index=False)
 
-    print("Applying Zero-Shot sentiment analysis...")
+def apply_zero_shot(df, text_column='cleaned_body', sample_size=None, device=None, batch_size=16,
+                    max_tokens=None, chunk_long_texts=False, quantize=False, cache_path=None,
+                    model_name=ZERO_SHOT_MODEL):
+    """
+    Batched zero-shot sentiment classification.
+
+    `device` defaults to the first GPU if there is one, else the CPU. Texts are truncated to the
+    model's token limit (or split into token windows whose label scores are averaged, with
+    `chunk_long_texts`), sorted by length so each batch pads as little as possible, and
+    optionally run through a dynamically int8-quantized model on CPU. With `cache_path`,
+    labels are stored per text hash in a Parquet file and never re-inferred.
+    """
+    logger.info("Applying Zero-Shot sentiment analysis...")
     if sample_size:
-        print(f"Using a sample of {sample_size} articles for Zero-Shot.")
+        logger.info(f"Using a sample of {sample_size} articles for Zero-Shot.")
         df_sample = df.sample(n=min(sample_size, len(df)), random_state=42)
     else:
         df_sample = df
 
-    classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli", device=0) 
-    candidate_labels = ['positive', 'negative', 'neutral']
-    
-    sentiments = []
-    for text in tqdm(df_sample[text_column], desc="Zero-Shot Progress"):
-        # Truncate text to fit model limits
-        truncated_text = text[:1024]
-        result = classifier(truncated_text, candidate_labels)
-        sentiments.append(result['labels'][0]) # Get the top label
-    
+    device = _resolve_device(device)
+    candidate_labels = ZERO_SHOT_LABELS
+    config = {
+        'model': model_name,
+        'labels': candidate_labels,
+        'max_tokens': max_tokens,
+        'chunk_long_texts': chunk_long_texts,
+        'quantize': bool(quantize and device == -1),
+    }
+
+    texts = df_sample[text_column].tolist()
+    keys = [_zero_shot_cache_key(text, config) for text in texts]
+    cache = _load_zero_shot_cache(cache_path)
+    todo = sorted({key: text for key, text in zip(keys, texts) if key not in cache}.items())
+    hits = sum(key in cache for key in keys)
+    logger.info(f"Zero-Shot cache: {hits} hits, {len(texts) - hits} misses ({len(todo)} unique texts to infer).")
+
+    start_time = time.perf_counter()
+    if todo:
+        from transformers import pipeline
+        classifier = pipeline("zero-shot-classification", model=model_name, device=device)
+        if config['quantize']:
+            classifier = _quantize_for_cpu(classifier)
+
+        limit = max_tokens or classifier.tokenizer.model_max_length - HYPOTHESIS_TOKEN_BUDGET
+        pieces, owners = _split_by_tokens(
+            classifier.tokenizer, [text for _, text in todo], limit, chunk_long_texts
+        )
+
+        # Longest first, so each batch holds texts of similar length
+        order = sorted(range(len(pieces)), key=lambda i: len(pieces[i]), reverse=True)
+        # A generator input makes the pipeline stream results as batches finish
+        results = classifier(
+            (pieces[i] for i in order), candidate_labels=candidate_labels, batch_size=batch_size
+        )
+
+        label_scores = np.zeros((len(todo), len(candidate_labels)))
+        piece_counts = np.zeros(len(todo))
+        for i, result in tqdm(zip(order, results), total=len(order), desc="Zero-Shot Progress",
+                              disable=not logger.isEnabledFor(logging.INFO)):
+            scores = dict(zip(result['labels'], result['scores']))
+            label_scores[owners[i]] += [scores[label] for label in candidate_labels]
+            piece_counts[owners[i]] += 1
+
+        top_labels = np.argmax(label_scores / piece_counts[:, None], axis=1)
+        for (key, _), label_index in zip(todo, top_labels):
+            cache[key] = candidate_labels[label_index]
+        if cache_path:
+            _save_zero_shot_cache(cache_path, cache)
+
+    elapsed = time.perf_counter() - start_time
+    if todo:
+        logger.info(f"Zero-Shot throughput: {len(todo) / elapsed:.2f} articles/sec "
+                    f"({len(todo)} articles in {elapsed:.1f}s, device={device}).")
+
     # Add results back to the original dataframe
-    df.loc[df_sample.index, 'zero_shot_sentiment'] = sentiments
-    return df
\ No newline at end of file
+    df.loc[df_sample.index, 'zero_shot_sentiment'] = [cache[key] for key in keys]
+    return df
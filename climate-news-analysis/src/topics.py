@@ -1,17 +1,248 @@
-from bertopic import BERTopic
+import logging
+import hashlib
+import io
+import json
+import os
+import numpy as np
 import pandas as pd
 
-def model_topics(df, text_column='cleaned_body'):
-    print("Starting topic modeling with BERTopic...")
+logger = logging.getLogger(__name__)
+
+# BERTopic's default English embedding model, pinned so cached embeddings stay comparable
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+EMBEDDINGS_FILE = 'embeddings.npy'
+EMBEDDING_IDS_FILE = 'embedding_ids.npy'
+EMBEDDINGS_META_FILE = 'embeddings_meta.json'
+
+# A new batch "drifts" when too many of its articles are far from every known topic
+DRIFT_MIN_SIMILARITY = 0.3
+DRIFT_MAX_POOR_FIT_SHARE = 0.2
+# Fitting a model on fewer documents than this gives UMAP/HDBSCAN too little to work with
+MIN_DOCS_FOR_NEW_TOPICS = 100
+
+
+def load_embeddings(cache_dir, model_name=EMBEDDING_MODEL, dtype='float32'):
+    """
+    Returns (article_ids, embeddings) from the cache, with the embeddings memory-mapped read-only.
+    Returns empty results if there is no cache or it was built with another model or dtype.
+    """
+    meta_path = os.path.join(cache_dir, EMBEDDINGS_META_FILE)
+    if not os.path.exists(meta_path):
+        return np.empty(0, dtype=np.uint64), None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta != {'model': model_name, 'dtype': dtype}:
+        return np.empty(0, dtype=np.uint64), None
+
+    ids = np.load(os.path.join(cache_dir, EMBEDDING_IDS_FILE))
+    embeddings = np.load(os.path.join(cache_dir, EMBEDDINGS_FILE), mmap_mode='r')
+    if len(embeddings) < len(ids):
+        return np.empty(0, dtype=np.uint64), None
+    # Rows past the ids are left over from an interrupted append
+    return ids, embeddings[:len(ids)]
+
+
+def _write_embeddings(cache_dir, ids, old_embeddings, new_embeddings, model_name, dtype):
+    n_old = 0 if old_embeddings is None else len(old_embeddings)
+    shape = (n_old + len(new_embeddings), new_embeddings.shape[1])
+
+    tmp_path = os.path.join(cache_dir, EMBEDDINGS_FILE + '.tmp')
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=shape)
+    block = 65536
+    for start in range(0, n_old, block):
+        stop = min(start + block, n_old)
+        out[start:stop] = old_embeddings[start:stop]
+    out[n_old:] = new_embeddings
+    out.flush()
+    del out
+
+    os.replace(tmp_path, os.path.join(cache_dir, EMBEDDINGS_FILE))
+    np.save(os.path.join(cache_dir, EMBEDDING_IDS_FILE), ids)
+    with open(os.path.join(cache_dir, EMBEDDINGS_META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'model': model_name, 'dtype': dtype}, f)
+
+
+def _append_rows(path, rows, n_rows):
+    """
+    Grows the .npy array at `path` in place: `rows` are written after its first `n_rows` rows and
+    the header's shape is rewritten, so only the new rows touch the disk. Returns False, without
+    writing, if the header can't be rewritten in place (e.g. a file saved by an older numpy).
+    """
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version != (1, 0):
+            return False
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        data_offset = f.tell()
+        if fortran_order or dtype != rows.dtype or shape[1:] != rows.shape[1:]:
+            return False
+
+        # numpy pads the header so the length of the first axis can grow without moving the data
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {
+            'descr': np.lib.format.dtype_to_descr(dtype),
+            'fortran_order': False,
+            'shape': (n_rows + len(rows),) + shape[1:],
+        })
+        if header.tell() != data_offset:
+            return False
+
+        f.seek(data_offset + n_rows * dtype.itemsize * int(np.prod(shape[1:])))
+        f.write(np.ascontiguousarray(rows).tobytes())
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+        f.seek(0)
+        f.write(header.getvalue())
+    return True
+
+
+def _append_embeddings(cache_dir, cached_ids, new_ids, new_embeddings):
+    # The ids go last: until they are written, the appended embeddings are ignored on load
+    return (_append_rows(os.path.join(cache_dir, EMBEDDINGS_FILE), new_embeddings, len(cached_ids))
+            and _append_rows(os.path.join(cache_dir, EMBEDDING_IDS_FILE), new_ids, len(cached_ids)))
+
+
+def compute_embeddings(df, cache_dir, text_column='cleaned_body', id_column='article_id',
+                       model_name=EMBEDDING_MODEL, batch_size=64, dtype='float32'):
+    """
+    Returns sentence embeddings aligned with the rows of `df`.
+
+    Embeddings are cached in `cache_dir` as a memory-mapped array (float32 or float16) with
+    a parallel array of article ids. Only articles missing from the cache are encoded, in
+    batches, and appended to both files in place, so caching a corpus batch by batch writes
+    each embedding once.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cached_ids, cached_embeddings = load_embeddings(cache_dir, model_name, dtype)
+
+    article_ids = df[id_column].to_numpy(dtype=np.uint64)
+    missing = ~np.isin(article_ids, cached_ids)
+    missing_ids, first_index = np.unique(article_ids[missing], return_index=True)
+    logger.info(f"Embedding cache: {int((~missing).sum())} hits, {int(missing.sum())} misses.")
+
+    if len(missing_ids):
+        from sentence_transformers import SentenceTransformer
+        texts = df[text_column].to_numpy()[missing][first_index].tolist()
+        model = SentenceTransformer(model_name)
+        new_embeddings = model.encode(
+            texts, batch_size=batch_size, show_progress_bar=True, convert_to_numpy=True
+        ).astype(dtype)
+
+        if cached_embeddings is None or not _append_embeddings(cache_dir, cached_ids, missing_ids, new_embeddings):
+            ids = np.concatenate([cached_ids, missing_ids])
+            _write_embeddings(cache_dir, ids, cached_embeddings, new_embeddings, model_name, dtype)
+        cached_ids, cached_embeddings = load_embeddings(cache_dir, model_name, dtype)
+
+    positions = pd.Index(cached_ids).get_indexer(article_ids)
+    # UMAP works in float32 regardless of the storage dtype
+    return np.asarray(cached_embeddings[positions], dtype=np.float32)
+
+
+def model_topics(df, text_column='cleaned_body', embeddings=None, embedding_model=EMBEDDING_MODEL,
+                 **bertopic_kwargs):
+    """
+    Fits BERTopic on `text_column`. Pass precomputed `embeddings` (see compute_embeddings) to
+    skip embedding entirely, e.g. when sweeping UMAP/HDBSCAN settings via `bertopic_kwargs`.
+    """
+    logger.info("Starting topic modeling with BERTopic...")
+    from bertopic import BERTopic
     # BERTopic can be slow. Consider using a GPU-accelerated UMAP if available.
-    topic_model = BERTopic(verbose=True, calculate_probabilities=False)
-    
+    topic_model = BERTopic(
+        embedding_model=embedding_model,
+        verbose=True,
+        calculate_probabilities=False,
+        **bertopic_kwargs
+    )
+
     # Ensure text column is a list of strings
     docs = df[text_column].tolist()
-    
-    topics, _ = topic_model.fit_transform(docs)
-    
-    df['topic'] = topics
-    
-    print("Topic modeling complete.")
-    return df, topic_model
\ No newline at end of file
+
+    topics, _ = topic_model.fit_transform(docs, embeddings=embeddings)
+
+    df['topic'] = np.asarray(topics, dtype=np.int16)
+
+    logger.info("Topic modeling complete.")
+    return df, topic_model
+
+
+def save_topic_model(topic_model, path, embedding_model=EMBEDDING_MODEL):
+    """Saves the model with safetensors (no pickle); the embedding model is stored by name."""
+    logger.info(f"Saving topic model to {path}...")
+    topic_model.save(path, serialization="safetensors", save_ctfidf=True, save_embedding_model=embedding_model)
+
+
+def load_topic_model(path, embedding_model=EMBEDDING_MODEL):
+    """
+    Loads a model saved by save_topic_model. Safetensors does not keep the UMAP/HDBSCAN models,
+    so `transform` assigns each document to the topic with the most similar topic embedding.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Topic model not found at {path}")
+    logger.info(f"Loading topic model from {path}...")
+    from bertopic import BERTopic
+    return BERTopic.load(path, embedding_model=embedding_model)
+
+
+def saved_model_fingerprint(path):
+    """Hash of a saved model's files, used to key cached topic assignments to that model."""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(path)):
+        with open(os.path.join(path, name), 'rb') as f:
+            digest.update(name.encode('utf-8'))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def assign_topics(df, topic_model, embeddings=None, text_column='cleaned_body', batch_size=10000):
+    """Assigns topics with an already fitted model, in batches, without refitting it."""
+    logger.info(f"Assigning topics to {len(df)} articles with the saved model...")
+    docs = df[text_column].tolist()
+    assigned = []
+    for start in range(0, len(docs), batch_size):
+        batch_embeddings = None if embeddings is None else embeddings[start:start + batch_size]
+        batch_topics, _ = topic_model.transform(docs[start:start + batch_size], embeddings=batch_embeddings)
+        assigned.extend(batch_topics)
+    df['topic'] = np.asarray(assigned, dtype=np.int16)
+    return df
+
+
+def detect_topic_drift(topic_model, embeddings, min_similarity=DRIFT_MIN_SIMILARITY,
+                       max_poor_fit_share=DRIFT_MAX_POOR_FIT_SHARE):
+    """
+    Flags articles whose embedding is less than `min_similarity` (cosine) from every topic
+    embedding. Returns (drifted, poor_fit_mask), where `drifted` means the share of such
+    articles exceeds `max_poor_fit_share`.
+    """
+    topic_embeddings = np.asarray(topic_model.topic_embeddings_, dtype=np.float32)
+    doc_norm = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    topic_norm = topic_embeddings / np.maximum(np.linalg.norm(topic_embeddings, axis=1, keepdims=True), 1e-12)
+    best_similarity = (doc_norm @ topic_norm.T).max(axis=1)
+
+    poor_fit = best_similarity < min_similarity
+    share = float(poor_fit.mean()) if len(poor_fit) else 0.0
+    logger.info(f"Topic drift check: {share:.1%} of new articles fit no existing topic.")
+    return share > max_poor_fit_share, poor_fit
+
+
+def update_topics_online(topic_model, df, embeddings, mask, text_column='cleaned_body', min_similarity=0.7):
+    """
+    Online update: fits a small model on the articles that fit no existing topic and merges it
+    into `topic_model`. Existing topic ids are kept and genuinely new topics are appended, so
+    earlier assignments stay valid. Returns the (possibly unchanged) model.
+    """
+    docs = df.loc[mask, text_column].tolist()
+    if len(docs) < MIN_DOCS_FOR_NEW_TOPICS:
+        logger.info(f"Only {len(docs)} poorly fitting articles; skipping the online topic update.")
+        return topic_model
+
+    logger.info(f"Fitting new topics on {len(docs)} poorly fitting articles...")
+    from bertopic import BERTopic
+    new_model = BERTopic(embedding_model=EMBEDDING_MODEL, calculate_probabilities=False)
+    new_model.fit(docs, embeddings=embeddings[mask])
+    merged_model = BERTopic.merge_models([topic_model, new_model], min_similarity=min_similarity)
+
+    n_new = len(merged_model.get_topic_info()) - len(topic_model.get_topic_info())
+    logger.info(f"Online topic update added {n_new} new topic(s).")
+    return merged_model
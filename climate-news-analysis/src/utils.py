@@ -1,7 +1,16 @@
 # src/utils.py
+import logging
 import pandas as pd
+import numpy as np
 import os
 import re
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow as pa
+from . import schema
+
+logger = logging.getLogger(__name__)
 
 # Detailed mapping from source filename (without .jsonl) to its country
 SOURCE_TO_COUNTRY_MAP = {
@@ -67,6 +76,15 @@ MAJOR_EVENTS = {
     "COP21 Paris Climate Agreement": ("2015-11-30", "2015-12-12"),
 }
 
+# Parquet layout of saved stage outputs (see save_data). The final data is partitioned by
+# source and year, like the chunked dataset, so reads for one source or period skip the rest.
+PARTITION_COLUMNS = ['source', 'year']
+DICTIONARY_COLUMNS = schema.CATEGORICAL_COLUMNS + schema.INT16_COLUMNS
+PARQUET_COMPRESSION = 'snappy'
+ROW_GROUP_SIZE = 128 * 1024
+# Partition columns save_data can derive when the frame does not have them
+DERIVED_COLUMNS = {'year': lambda df: df['date_published'].dt.year.astype('int16')}
+
 def clean_text(text):
     """A simple text cleaning function."""
     if not isinstance(text, str):
@@ -77,17 +95,193 @@ def clean_text(text):
     text = re.sub(r'\s+', ' ', text).strip()
     return text
 
-def save_data(df, path):
-    """Saves a DataFrame to a Parquet file."""
-    print(f"Saving data to {path}...")
-    df.to_parquet(path, index=False)
-    print("Save complete.")
+_TAG_RE = re.compile(r'<.*?>')
+
+# Python's regex \s is exactly str.isspace(), so the fast path below can use str.split()
+# for whitespace and byte-level deletion for "[^a-z\s]" and stay byte-identical to clean_text.
+_ASCII_DELETE = bytes(c for c in range(128) if not (chr(c).islower() or chr(c).isspace()))
+_NON_ASCII_SPACE_RE = re.compile(
+    '[' + ''.join(re.escape(chr(c)) for c in range(128, 0x110000) if chr(c).isspace()) + ']'
+)
+
+def clean_text_fast(text):
+    """Single-pass equivalent of clean_text (same output, byte for byte)."""
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    if '<' in text:
+        text = _TAG_RE.sub('', text)
+    if not text.isascii():
+        # Unicode whitespace still separates words; every other non-ASCII character is dropped
+        text = _NON_ASCII_SPACE_RE.sub(' ', text).encode('ascii', 'ignore')
+    else:
+        text = text.encode('ascii')
+    text = text.translate(None, _ASCII_DELETE).decode('ascii')
+    return ' '.join(text.split())
+
+def process_context():
+    """
+    multiprocessing context for process pools. Stages run side by side in threads, and forking
+    a process while other threads hold locks can copy those locks, held, into the child; a
+    forkserver starts workers from a clean single-threaded process instead.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def _clean_chunk(texts):
+    return [clean_text_fast(text) for text in texts]
+
+def iter_clean_text_chunks(series, n_jobs=1, chunk_size=10000):
+    """
+    Yields (offset, cleaned texts) for consecutive chunks of `series`, in order. Serially only
+    one chunk of Python strings exists at a time, so callers can filter or convert each chunk
+    before the next one is cleaned.
+    """
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    offsets = range(0, len(series), chunk_size)
+    chunks = (series.iloc[i:i + chunk_size].tolist() for i in offsets)
 
-def load_data(path):
-    """Loads a DataFrame from a Parquet file."""
+    if n_jobs == 1 or len(series) <= chunk_size:
+        yield from zip(offsets, map(_clean_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=process_context()) as executor:
+            yield from zip(offsets, executor.map(_clean_chunk, chunks))
+
+def clean_text_series(series, n_jobs=1, chunk_size=10000):
+    """
+    Cleans a whole Series with clean_text_fast. With n_jobs > 1 (or -1 for all cores), large
+    Series are split into chunks and cleaned in a process pool, keeping the original order.
+    """
+    cleaned = [text for _, chunk in iter_clean_text_chunks(series, n_jobs, chunk_size) for text in chunk]
+    return pd.Series(cleaned, index=series.index, dtype=object)
+
+def hash_text_series(series, chunk_size=10000):
+    """
+    64-bit hash per text, computed chunk by chunk so Arrow-backed strings are never all
+    materialised as Python objects at once.
+    """
+    hashes = [
+        pd.util.hash_array(series.iloc[i:i + chunk_size].to_numpy(dtype=object))
+        for i in range(0, len(series), chunk_size)
+    ]
+    return np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+
+def add_article_ids(df, chunk_size=10000):
+    """
+    Adds a stable 64-bit content hash per article, used as the key for cached stage results.
+    Rows hash independently, so hashing chunk by chunk gives the same ids with less memory.
+    """
+    key_columns = ['source', 'headline', 'body', 'date_published']
+    ids = [
+        pd.util.hash_pandas_object(df[key_columns].iloc[i:i + chunk_size], index=False).to_numpy()
+        for i in range(0, len(df), chunk_size)
+    ]
+    df['article_id'] = np.concatenate(ids) if ids else np.empty(0, dtype=np.uint64)
+    return df
+
+def parquet_write_options(columns):
+    """
+    Keyword arguments for pyarrow's Parquet writers: dictionary encoding only for the
+    low-cardinality columns, zstd for the text, byte-stream-split floats and delta-encoded
+    dates (which compress better that way), and row-group statistics for filtered reads.
+    """
+    return {
+        'compression': {column: 'zstd' if column in schema.TEXT_COLUMNS else PARQUET_COMPRESSION
+                        for column in columns},
+        'use_dictionary': [column for column in columns if column in DICTIONARY_COLUMNS],
+        'column_encoding': {column: 'BYTE_STREAM_SPLIT' if column in schema.FLOAT32_COLUMNS else 'DELTA_BINARY_PACKED'
+                            for column in columns if column in schema.FLOAT32_COLUMNS or column == 'date_published'},
+        'write_statistics': True,
+    }
+
+def _add_partition_columns(df, partition_cols):
+    missing = [column for column in partition_cols if column not in df.columns]
+    if not missing:
+        return df
+    df = df.copy(deep=False)
+    for column in missing:
+        if column not in DERIVED_COLUMNS:
+            raise ValueError(f"Cannot partition by '{column}': the frame has no such column.")
+        df[column] = DERIVED_COLUMNS[column](df)
+    return df
+
+def save_data(df, path, partition_cols=None):
+    """
+    Saves a DataFrame as Parquet (see parquet_write_options). With `partition_cols`, `path`
+    becomes a directory of <column>=<value>/ partitions (rows sorted by date within each, so
+    date filters skip whole row groups); 'year' is derived from date_published when missing.
+    An empty frame is saved as a single file instead, since a dataset without files would
+    have no schema. The previous file or dataset at `path` is only replaced once the new one
+    is complete.
+    """
+    # pyarrow's dataset and parquet modules are only imported by the stages that save or load
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    logger.info(f"Saving data to {path}...")
+    tmp_path = path + '.tmp'
+    _remove_path(tmp_path)
+    if partition_cols:
+        # Partition columns are kept as columns in the single-file fallback, so filters on them still work
+        df = _add_partition_columns(df, partition_cols)
+    if partition_cols and len(df):
+        if 'date_published' in df.columns:
+            df = df.sort_values(list(partition_cols) + ['date_published'], kind='stable')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        options = parquet_write_options([c for c in table.column_names if c not in partition_cols])
+        ds.write_dataset(
+            table, tmp_path, format='parquet', partitioning=list(partition_cols), partitioning_flavor='hive',
+            file_options=ds.ParquetFileFormat().make_write_options(**options),
+            max_rows_per_group=ROW_GROUP_SIZE, min_rows_per_group=ROW_GROUP_SIZE,
+        )
+    else:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, **parquet_write_options(table.column_names))
+    del table
+    # The old layout may have been a single file where there is now a directory, or the reverse
+    old_path = path + '.old'
+    if os.path.exists(path):
+        _remove_path(old_path)
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    _remove_path(old_path)
+    logger.info("Save complete.")
+
+def _remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def load_data(path, columns=None, filters=None, memory_map=False):
+    """
+    Loads a DataFrame saved with save_data, from a single file or a partitioned directory.
+    Only `columns` are read, and only the partitions and row groups that can match `filters`
+    (a pyarrow.dataset expression or a list of tuples, e.g. [('year', '>=', 2015)]). Derived
+    partition columns are left out unless asked for in `columns`. With `memory_map`, the
+    files are read through memory maps rather than buffered reads.
+    """
     if not os.path.exists(path):
         raise FileNotFoundError(f"File not found at {path}")
-    print(f"Loading data from {path}...")
-    df = pd.read_parquet(path)
-    print("Load complete.")
+    import pyarrow.dataset as ds
+    import pyarrow.fs
+    import pyarrow.parquet as pq
+
+    logger.info(f"Loading data from {path}...")
+    # Dictionary-encoded partition values come back as categoricals, like the in-memory frame
+    dataset = ds.dataset(path, format='parquet', partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+                         filesystem=pa.fs.LocalFileSystem(use_mmap=memory_map))
+    if columns is None:
+        # In the order they were saved in: partition columns are not stored in the files
+        columns = dataset.schema.names
+        if dataset.schema.pandas_metadata:
+            saved = [column['name'] for column in dataset.schema.pandas_metadata['columns']]
+            columns = [column for column in saved if column in columns]
+        columns = [column for column in columns if column not in DERIVED_COLUMNS]
+    if isinstance(filters, list):
+        filters = pq.filters_to_expression(filters)
+    table = dataset.to_table(columns=columns, filter=filters)
+    df = schema.apply_schema(table.to_pandas(types_mapper=schema.arrow_types_mapper))
+    logger.info("Load complete.")
     return df
\ No newline at end of file
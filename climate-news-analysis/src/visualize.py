@@ -1,12 +1,30 @@
 # src/visualize.py
-import matplotlib.pyplot as plt
-import seaborn as sns
+import logging
 import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from . import utils, cube as sentiment_cube
+
+logger = logging.getLogger(__name__)
+
+RENDER_MANIFEST = '.render_manifest.json'
+
+
+def _pyplot():
+    """matplotlib and seaborn take seconds to import, so they are only loaded once a chart is drawn."""
+    import matplotlib
+    matplotlib.use('Agg')  # Non-interactive backend; also safe in worker processes
+    import matplotlib.pyplot as plt
+    return plt
 
 
 def plot_sentiment_over_time(df_time, output_folder):
-    print("Generating overall sentiment over time plot...")
+    logger.info("Generating overall sentiment over time plot...")
+    plt = _pyplot()
+    import seaborn as sns
     plt.figure(figsize=(12, 6))
     sns.lineplot(data=df_time, x='date_published', y='vader_sentiment')
     plt.title('Average Climate News Sentiment Over Time (All Sources)')
@@ -17,7 +35,9 @@ def plot_sentiment_over_time(df_time, output_folder):
     plt.close()
 
 def plot_sentiment_by_region(df_region, output_folder):
-    print("Generating sentiment by region plot...")
+    logger.info("Generating sentiment by region plot...")
+    plt = _pyplot()
+    import seaborn as sns
     plt.figure(figsize=(10, 6))
     sns.barplot(data=df_region, x='region', y='vader_sentiment', palette='viridis')
     plt.title('Average Climate News Sentiment by Region')
@@ -29,7 +49,8 @@ def plot_sentiment_by_region(df_region, output_folder):
     plt.close()
 
 def plot_topics_by_region(df_topics, output_folder):
-    print("Generating topic distribution plot...")
+    logger.info("Generating topic distribution plot...")
+    plt = _pyplot()
     df_topics.plot(
         kind='bar',
         stacked=True,
@@ -46,7 +67,9 @@ def plot_topics_by_region(df_topics, output_folder):
 
 
 def plot_sentiment_by_source(df_source, output_folder):
-    print("Generating sentiment by source plot...")
+    logger.info("Generating sentiment by source plot...")
+    plt = _pyplot()
+    import seaborn as sns
     plt.figure(figsize=(12, 10))
     sns.barplot(data=df_source, x='vader_sentiment', y='source', palette='coolwarm_r', orient='h')
     plt.title('Average Climate News Sentiment by Source', fontsize=16)
@@ -57,73 +80,160 @@ def plot_sentiment_by_source(df_source, output_folder):
     plt.savefig(os.path.join(output_folder, 'sentiment_by_source.png'))
     plt.close()
 
-def plot_sentiment_over_time_per_source(df, output_folder):
-    print("Generating individual sentiment timelines for each source...")
+def timeline_matrix(df, freq='3M'):
+    """
+    Mean sentiment per source and period as a wide (period x source) matrix, rolled up from the
+    sentiment cube (built here if `df` is article-level data) and shared by the per-source and
+    regional timeline charts. All sources use the same period bins.
+    """
+    by_period = sentiment_cube.rollup(sentiment_cube.as_cube(df), by=['source'], freq=freq)
+    matrix = by_period['mean'].unstack('source')
+    # The grouped result only contains observed periods; restore the empty ones as NaN
+    full_index = pd.date_range(matrix.index.min(), matrix.index.max(), freq=freq, name='date_published')
+    return matrix.reindex(full_index)
+
+def _data_hash(data, meta):
+    digest = hashlib.sha256(json.dumps(meta, sort_keys=True, default=str).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+    if isinstance(data, pd.DataFrame):
+        digest.update(json.dumps([str(c) for c in data.columns]).encode('utf-8'))
+    return digest.hexdigest()
+
+def _render_source_timeline(source, timeline, path_base, formats, dpi):
+    plt = _pyplot()
+    plt.figure(figsize=(12, 6))
+    timeline.plot(kind='line', marker='.', linestyle='-')
+    plt.title(f'Sentiment Over Time: {source.title()}', fontsize=16)
+    plt.xlabel('Date', fontsize=12)
+    plt.ylabel('Avg VADER Sentiment (3-Month Rolling)', fontsize=12)
+    plt.ylim(-1, 1) # Keep y-axis consistent across all plots
+    plt.axhline(y=0, color='black', linestyle='--', linewidth=0.8)
+    plt.grid(True, which='both', linestyle='--', linewidth=0.5)
+    plt.tight_layout()
+    for fmt in formats:
+        plt.savefig(f'{path_base}.{fmt}', dpi=dpi)
+    plt.close()
+
+def _render_regional_comparison(region, pivot_df, path_base, formats, dpi):
+    plt = _pyplot()
+    plt.figure(figsize=(14, 7))
+    pivot_df.plot(ax=plt.gca(), marker='o', linestyle='--', markersize=4)
+
+    plt.title(f'Sentiment Comparison in {region}', fontsize=16)
+    plt.xlabel('Date', fontsize=12)
+    plt.ylabel('Avg VADER Sentiment (3-Month Rolling)', fontsize=12)
+    plt.ylim(-1, 1)
+    plt.axhline(y=0, color='black', linestyle='--', linewidth=0.8)
+    plt.grid(True, which='both', linestyle='--', linewidth=0.5)
+    plt.legend(title='Source')
+    plt.tight_layout()
+    for fmt in formats:
+        plt.savefig(f'{path_base}.{fmt}', dpi=dpi)
+    plt.close()
+
+_RENDERERS = {
+    'source_timeline': _render_source_timeline,
+    'regional_comparison': _render_regional_comparison,
+}
+
+def _render_task(task):
+    kind, key, data, path_base, formats, dpi = task
+    _RENDERERS[kind](key, data, path_base, formats, dpi)
+    return path_base
+
+def render_charts(tasks, manifest_folder, n_jobs=1, formats=('png',), dpi=None):
+    """
+    Renders (kind, key, data, path_base) chart tasks, in a process pool when n_jobs > 1.
+    A chart is skipped when its data, format and DPI hash matches the previous render recorded
+    in the folder's manifest and its files still exist. Returns (rendered, skipped) counts.
+    """
+    manifest_path = os.path.join(manifest_folder, RENDER_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    todo = []
+    hashes = {}
+    for kind, key, data, path_base in tasks:
+        data_hash = _data_hash(data, {'kind': kind, 'key': key, 'formats': list(formats), 'dpi': dpi})
+        name = os.path.basename(path_base)
+        hashes[name] = data_hash
+        files_exist = all(os.path.exists(f'{path_base}.{fmt}') for fmt in formats)
+        if manifest.get(name) == data_hash and files_exist:
+            continue
+        todo.append((kind, key, data, path_base, tuple(formats), dpi))
+
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs == 1 or len(todo) <= 1:
+        for task in todo:
+            _render_task(task)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=utils.process_context()) as executor:
+            list(executor.map(_render_task, todo))
+
+    manifest.update(hashes)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return len(todo), len(tasks) - len(todo)
+
+def plot_sentiment_over_time_per_source(df, output_folder, timelines=None, n_jobs=1, formats=('png',), dpi=None):
+    logger.info("Generating individual sentiment timelines for each source...")
     source_timelines_folder = os.path.join(output_folder, 'source_timelines')
     os.makedirs(source_timelines_folder, exist_ok=True)
 
+    if timelines is None:
+        timelines = timeline_matrix(df)
     all_sources = df['source'].unique()
-    
+
+    tasks = []
     for source in all_sources:
-        plt.figure(figsize=(12, 6))
-        source_df = df[df['source'] == source].copy()
-        
-        timeline = source_df.set_index('date_published')['vader_sentiment'].resample('3M').mean()
-        
+        timeline = timelines[source]
+
         if timeline.dropna().empty:
-            print(f"Skipping plot for {source} due to insufficient data.")
-            plt.close()
+            logger.info(f"Skipping plot for {source} due to insufficient data.")
             continue
 
-        timeline.plot(kind='line', marker='.', linestyle='-')
-        plt.title(f'Sentiment Over Time: {source.title()}', fontsize=16)
-        plt.xlabel('Date', fontsize=12)
-        plt.ylabel('Avg VADER Sentiment (3-Month Rolling)', fontsize=12)
-        plt.ylim(-1, 1) # Keep y-axis consistent across all plots
-        plt.axhline(y=0, color='black', linestyle='--', linewidth=0.8)
-        plt.grid(True, which='both', linestyle='--', linewidth=0.5)
-        plt.tight_layout()
-        
-        plt.savefig(os.path.join(source_timelines_folder, f'{source}_timeline.png'))
-        plt.close()
-    print(f"Individual timelines saved to '{source_timelines_folder}'.")
-
-def plot_regional_comparison_timelines(df, output_folder):
-    print("Generating regional comparison sentiment timelines...")
+        timeline = timeline.loc[timeline.first_valid_index():timeline.last_valid_index()]
+        path_base = os.path.join(source_timelines_folder, f'{source}_timeline')
+        tasks.append(('source_timeline', source, timeline, path_base))
+
+    rendered, skipped = render_charts(tasks, source_timelines_folder, n_jobs=n_jobs, formats=formats, dpi=dpi)
+    logger.info(f"Individual timelines saved to '{source_timelines_folder}' ({rendered} rendered, {skipped} unchanged).")
+
+def plot_regional_comparison_timelines(df, output_folder, timelines=None, n_jobs=1, formats=('png',), dpi=None):
+    logger.info("Generating regional comparison sentiment timelines...")
     regional_folder = os.path.join(output_folder, 'regional_comparisons')
     os.makedirs(regional_folder, exist_ok=True)
-    
-    source_counts_by_region = df.groupby('region')['source'].nunique()
-    regions_to_compare = source_counts_by_region[source_counts_by_region > 1].index.tolist()
-
-    for region in regions_to_compare:
-        plt.figure(figsize=(14, 7))
-        region_df = df[df['region'] == region]
-        
-        
-        pivot_df = region_df.pivot_table(
-            index=pd.Grouper(key='date_published', freq='3M'), # Quarterly aggregation
-            columns='source',
-            values='vader_sentiment',
-            aggfunc='mean'
-        )
-
-        if pivot_df.dropna(how='all').empty:
-            print(f"Skipping comparison plot for {region} due to insufficient data.")
-            plt.close()
+
+    if timelines is None:
+        timelines = timeline_matrix(df)
+    sources_by_region = df.groupby('region', observed=True)['source'].unique()
+
+    tasks = []
+    for region, sources in sources_by_region.items():
+        if len(sources) <= 1:
+            continue
+
+        # Quarterly aggregation, only the periods in which at least one of the region's sources published
+        pivot_df = timelines[sorted(sources)].dropna(how='all')
+        pivot_df.columns.name = 'source'
+
+        if pivot_df.empty:
+            logger.info(f"Skipping comparison plot for {region} due to insufficient data.")
             continue
-            
-        pivot_df.plot(ax=plt.gca(), marker='o', linestyle='--', markersize=4)
-        
-        plt.title(f'Sentiment Comparison in {region}', fontsize=16)
-        plt.xlabel('Date', fontsize=12)
-        plt.ylabel('Avg VADER Sentiment (3-Month Rolling)', fontsize=12)
-        plt.ylim(-1, 1)
-        plt.axhline(y=0, color='black', linestyle='--', linewidth=0.8)
-        plt.grid(True, which='both', linestyle='--', linewidth=0.5)
-        plt.legend(title='Source')
-        plt.tight_layout()
-        
-        plt.savefig(os.path.join(regional_folder, f'{region}_comparison.png'))
-        plt.close()
-    print(f"Regional comparisons saved to '{regional_folder}'.")
\ No newline at end of file
+
+        path_base = os.path.join(regional_folder, f'{region}_comparison')
+        tasks.append(('regional_comparison', region, pivot_df, path_base))
+
+    rendered, skipped = render_charts(tasks, regional_folder, n_jobs=n_jobs, formats=formats, dpi=dpi)
+    logger.info(f"Regional comparisons saved to '{regional_folder}' ({rendered} rendered, {skipped} unchanged).")
+
+def plot_timelines(df, output_folder, n_jobs=1, formats=('png',), dpi=None):
+    """Per-source and regional timelines from one shared groupby. Reports the total render time."""
+    start = time.perf_counter()
+    timelines = timeline_matrix(df)
+    plot_sentiment_over_time_per_source(df, output_folder, timelines, n_jobs=n_jobs, formats=formats, dpi=dpi)
+    plot_regional_comparison_timelines(df, output_folder, timelines, n_jobs=n_jobs, formats=formats, dpi=dpi)
+    logger.info(f"Timeline plots generated in {time.perf_counter() - start:.2f}s.")